@@ -40,6 +40,7 @@ from .agents import Agent
 import itertools
 import random
 from collections import defaultdict
+from collections.abc import Sequence
 
 # ______________________________________________________________________________
 
@@ -921,6 +922,102 @@ class FolKB(KB):
     def fetch_rules_for_goal(self, goal):
         return self.clauses
 
+    def __contains__(self, sentence):
+        return sentence in self.clauses
+
+
+class ClauseView(Sequence):
+    """A read-only, always up to date sequence of the clauses of an
+    IndexedFolKB. It has no append or remove: clauses are added and removed
+    with tell and retract. Like a list it can be concatenated with one.
+    """
+
+    def __init__(self, table):
+        self._table = table
+
+    def __len__(self):
+        return len(self._table)
+
+    def __contains__(self, sentence):
+        return sentence in self._table
+
+    def __iter__(self):
+        # over a copy, so the KB can change while its clauses are iterated
+        return iter(list(self._table))
+
+    def __getitem__(self, i):
+        return list(self._table)[i]
+
+    def __add__(self, other):
+        return list(self._table) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self._table)
+
+    def __repr__(self):
+        return repr(list(self._table))
+
+
+class IndexedFolKB(FolKB):
+    """A FolKB that indexes its clauses, a drop-in replacement for FolKB.
+    Clauses are kept in a hash table, so testing whether a ground atom is
+    in the KB and retracting it are O(1), and they are grouped by the
+    predicate of their conclusion, so fetch_rules_for_goal only hands
+    fol_bc_ask the clauses that could unify with the goal.
+    A clause told twice is stored once. clauses is a read-only ClauseView,
+    so the KB can only be changed with tell and retract.
+    >>> kb0 = IndexedFolKB([expr('Farmer(Mac)'), expr('Rabbit(Pete)'),
+    ...                     expr('(Rabbit(r) & Farmer(f)) ==> Hates(f, r)')])
+    >>> expr('Rabbit(Pete)') in kb0
+    True
+    >>> kb0.retract(expr('Rabbit(Pete)'))
+    >>> kb0.retract(expr('Rabbit(Pete)'))
+    >>> kb0.ask(expr('Hates(Mac, x)'))
+    False
+    """
+
+    def __init__(self, initial_clauses=[]):
+        self.table = {}
+        self.index = defaultdict(dict)
+        self.clauses = ClauseView(self.table)
+        for clause in initial_clauses:
+            self.tell(clause)
+
+    @staticmethod
+    def predicate(sentence):
+        """The predicate of the conclusion of a definite clause"""
+        if sentence.op == '==>':
+            return sentence.args[1].op
+        return sentence.op
+
+    def tell(self, sentence):
+        if sentence in self.table:
+            return
+        if not is_definite_clause(sentence):
+            raise Exception("Not a definite clause: {}".format(sentence))
+        self.table[sentence] = None
+        self.index[self.predicate(sentence)][sentence] = None
+
+    def retract(self, sentence):
+        if sentence in self.table:
+            del self.table[sentence]
+            del self.index[self.predicate(sentence)][sentence]
+
+    def fetch_rules_for_goal(self, goal):
+        if is_variable(goal):
+            return list(self.table)
+        return list(self.index.get(goal.op, ()))
+
+    def facts(self, predicate):
+        """All the clauses concluding predicate, e.g. every On(x, y) atom"""
+        return list(self.index.get(predicate, ()))
+
+    def __contains__(self, sentence):
+        return sentence in self.table
+
+    def __len__(self):
+        return len(self.table)
+
 
 def fol_fc_ask(KB, alpha):
     """A simple forward-chaining algorithm. [Figure 9.3]"""
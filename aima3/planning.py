@@ -1,10 +1,13 @@
 """Planning (Chapters 10-11)
 """
 
+import copy
 import itertools
+import time
+from collections import namedtuple
 from .search import Node
 from .utils import Expr, expr, first, FIFOQueue
-from .logic import FolKB
+from .logic import FolKB, IndexedFolKB
 
 
 class PDDL:
@@ -15,7 +18,7 @@ class PDDL:
     """
 
     def __init__(self, initial_state, actions, goal_test):
-        self.kb = FolKB(initial_state)
+        self.kb = IndexedFolKB(initial_state)
         self.actions = actions
         self.goal_test_func = goal_test
 
@@ -76,11 +79,11 @@ class Action:
         """Checks if the precondition is satisfied in the current state"""
         # check for positive clauses
         for clause in self.precond_pos:
-            if self.substitute(clause, args) not in kb.clauses:
+            if self.substitute(clause, args) not in kb:
                 return False
         # check for negative clauses
         for clause in self.precond_neg:
-            if self.substitute(clause, args) in kb.clauses:
+            if self.substitute(clause, args) in kb:
                 return False
         return True
 
@@ -241,18 +244,464 @@ def have_cake_and_eat_cake_too():
     return PDDL(init, [eat_cake, bake_cake], goal_test)
 
 
+MASK64 = (1 << 64) - 1
+
+
+def fingerprint_mix(x):
+    """Scrambles an int into 64 bits (splitmix64), for order independent XOR fingerprints"""
+    x = (x + 0x9E3779B97F4A7C15) & MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+    return x ^ (x >> 31)
+
+
+def fingerprint(ids):
+    """XOR fingerprint of a set of ids"""
+    result = 0
+    for i in ids:
+        result ^= fingerprint_mix(i)
+    return result
+
+
+class SymbolTable:
+    """
+    Interns the ground fluents and ground actions of a planning problem.
+    Every Expr is given a dense integer id the first time it is seen, so the
+    planning graph can key its links and mutexes on ints instead of hashing
+    Expr objects on every lookup.
+    """
+
+    def __init__(self):
+        self.fluents = []
+        self.actions = []
+        self.fluent_ids = {}
+        self.action_ids = {}
+        self.persistence_ids = {}
+        self.persisted = {}
+
+    def fluent(self, clause):
+        """Returns the id of a ground fluent, interning it if needed"""
+        fid = self.fluent_ids.get(clause)
+        if fid is None:
+            fid = self.fluent_ids[clause] = len(self.fluents)
+            self.fluents.append(clause)
+        return fid
+
+    def action(self, action):
+        """Returns the id of a ground action, interning it if needed"""
+        aid = self.action_ids.get(action)
+        if aid is None:
+            aid = self.action_ids[action] = len(self.actions)
+            self.actions.append(action)
+        return aid
+
+    def persistence(self, fid, negated=False):
+        """Returns the id of the no-op action keeping the fluent fid as it is"""
+        aid = self.persistence_ids.get((fid, negated))
+        if aid is None:
+            clause = self.fluents[fid]
+            if negated:
+                clause = Expr('not' + clause.op, clause.args)
+            aid = self.persistence_ids[(fid, negated)] = self.action(Expr('Persistence', clause))
+            self.persisted[aid] = (fid, negated)
+        return aid
+
+
+class MutexRelation:
+    """
+    Symmetric mutex relation over ids of a SymbolTable.
+    Every id owns a bitset row (a Python int) of the ids it is mutex with,
+    so testing a pair is a shift and a mask, and checking that a whole set
+    of ids is pairwise non-mutex takes one AND per member.
+    An id is never considered mutex with itself.
+    The number of pairs and a fingerprint of them are kept up to date, so two
+    relations can be compared in constant time.
+    """
+
+    def __init__(self):
+        self.rows = {}
+        self.pairs = 0
+        self.fingerprint = 0
+
+    def add(self, a, b):
+        """Marks a and b as mutex"""
+        if a == b:
+            return
+        row = self.rows.get(a, 0)
+        if (row >> b) & 1:
+            return
+        self.rows[a] = row | (1 << b)
+        self.rows[b] = self.rows.get(b, 0) | (1 << a)
+        self.pairs += 1
+        self.fingerprint ^= fingerprint_mix(min(a, b) << 32 | max(a, b))
+
+    def is_mutex(self, a, b):
+        return bool((self.rows.get(a, 0) >> b) & 1)
+
+    def row(self, a):
+        """The bitset of the ids mutex with a"""
+        return self.rows.get(a, 0)
+
+    def mutex_with(self, a):
+        """Returns the ids that are mutex with a"""
+        row = self.rows.get(a, 0)
+        ids = []
+        while row:
+            low = row & -row
+            ids.append(low.bit_length() - 1)
+            row ^= low
+        return ids
+
+    def non_mutex(self, ids):
+        """Checks that no two of the given ids are mutex"""
+        mask = 0
+        for a in ids:
+            mask |= 1 << a
+        rows = self.rows
+        for a in ids:
+            if a in rows and rows[a] & mask:
+                return False
+        return True
+
+    def copy(self):
+        relation = MutexRelation()
+        relation.rows = dict(self.rows)
+        relation.pairs = self.pairs
+        relation.fingerprint = self.fingerprint
+        return relation
+
+    @property
+    def key(self):
+        """Equal for equal relations and, but for fingerprint collisions, only for them"""
+        return self.pairs, self.fingerprint
+
+    def __contains__(self, pair):
+        a, b = pair
+        return self.is_mutex(a, b)
+
+    def __iter__(self):
+        """Yields every mutex pair once, as (smaller id, larger id)"""
+        for a in self.rows:
+            for b in self.mutex_with(a):
+                if a < b:
+                    yield a, b
+
+    def __len__(self):
+        return self.pairs
+
+
+class NogoodTable:
+    """
+    Memo of the goal sets that can not be achieved at a level of the planning
+    graph (the nogoods of Graphplan). Levels are counted from the initial
+    level, so entries stay valid while the graph grows, and a stored goal set
+    also rules out every superset of it. Goal sets are sets of ids; negative
+    goals should be encoded so they differ from positive ones.
+    """
+
+    def __init__(self):
+        self.exact = {}
+        self.by_smallest = {}
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, level, goals):
+        goals = frozenset(goals)
+        stored = self.exact.setdefault(level, set())
+        if goals in stored:
+            return
+        stored.add(goals)
+        if goals:
+            self.by_smallest.setdefault(level, {}).setdefault(min(goals), []).append(goals)
+
+    def is_nogood(self, level, goals):
+        """Checks if goals, or a subset of them, is a nogood at level"""
+        goals = frozenset(goals)
+        if goals in self.exact.get(level, ()):
+            self.hits += 1
+            return True
+        # A stored subset has its smallest id among the goals
+        by_smallest = self.by_smallest.get(level, {})
+        for goal in goals:
+            for nogood in by_smallest.get(goal, ()):
+                if nogood <= goals:
+                    self.hits += 1
+                    return True
+        self.misses += 1
+        return False
+
+    def count(self, level):
+        return len(self.exact.get(level, ()))
+
+    def __contains__(self, item):
+        level, goals = item
+        return self.is_nogood(level, goals)
+
+    def __len__(self):
+        return sum(len(stored) for stored in self.exact.values())
+
+
+GroundAction = namedtuple('GroundAction',
+                          'id, expr, precond_pos, precond_neg, effect_add, effect_rem')
+
+
+class Grounder:
+    """
+    Grounds action schemas against the facts true at a level.
+    Positive preconditions are joined against an index from
+    (predicate, argument position, value) to the facts holding there, so only
+    bindings that can satisfy all of them are generated. Typed PDDL parameters
+    arrive as unary preconditions and prune the bindings the same way.
+    Ground actions are cached, and since the facts of a planning graph only
+    grow, every level joins just the facts that are new to it and adds the
+    actions they enable to the ones already found.
+    Parameters which are not lowercase symbols are constants. With
+    distinct_args, as with the permutations used before, two parameters
+    never bind to the same object.
+    """
+
+    def __init__(self, actions, symbols, objects, distinct_args=True):
+        self.actions = actions
+        self.symbols = symbols
+        self.objects = list(objects)
+        self.distinct_args = distinct_args
+        self.ground = {}
+        self.known = set()
+        self.enabled = []
+        self.by_predicate = {}
+        self.by_argument = {}
+
+    def __call__(self, facts, negated=()):
+        """
+        Returns the ground actions applicable at a level with the positive
+        facts facts and the negative facts negated (both fluent ids).
+        A negative precondition holds if its fluent is absent from facts,
+        as in Action.check_precond, or may have been deleted (in negated).
+        """
+        facts = set(facts)
+        if not self.known <= facts:
+            # Not a later level of the same graph, nothing can be reused
+            self.reset()
+
+        delta = facts - self.known
+        first = not self.known
+        self._index(delta)
+        self.known |= delta
+
+        seen = set()
+        for schema in self.actions:
+            for args in self._bindings(schema, delta, first):
+                action = self._ground_action(schema, args)
+                if action.id not in seen:
+                    seen.add(action.id)
+                    self.enabled.append(action)
+
+        negated = set(negated)
+        return [action for action in self.enabled
+                if all(clause not in facts or clause in negated for clause in action.precond_neg)]
+
+    def reachable(self, facts):
+        """
+        Grounds every action reachable from the facts facts (fluent ids)
+        when delete effects and negative preconditions are ignored
+        :return: the ground actions, in the order they were found
+        """
+        facts = set(facts)
+        while True:
+            self(facts)
+            reached = {fid for action in self.enabled for fid in action.effect_add}
+            if reached <= facts:
+                return list(self.enabled)
+            facts |= reached
+
+    def copy(self):
+        """
+        A grounder of the same actions and symbols, sharing the cache of
+        ground actions but not the facts seen, so it can ground from other
+        facts without resetting this one
+        """
+        grounder = copy.copy(self)
+        grounder.reset()
+        return grounder
+
+    def reset(self):
+        """Forgets the facts seen so far, keeping the cache of ground actions"""
+        self.known = set()
+        self.enabled = []
+        self.by_predicate = {}
+        self.by_argument = {}
+
+    def _index(self, delta):
+        fluents = self.symbols.fluents
+        for fid in delta:
+            clause = fluents[fid]
+            self.by_predicate.setdefault((clause.op, len(clause.args)), []).append(fid)
+            for position, value in enumerate(clause.args):
+                self.by_argument.setdefault((clause.op, position, value), []).append(fid)
+
+    def _bindings(self, schema, delta, first):
+        """
+        Yields every argument tuple of schema enabled by a fact of delta.
+        Semi-naive join: the i-th precondition is matched against delta,
+        the ones before it against the older facts and the ones after it
+        against all facts, so every binding is produced exactly once.
+        """
+        variables = [arg for arg in schema.args if arg.op.islower()]
+        preconds = schema.precond_pos
+        if not preconds:
+            if first:
+                yield from self._complete(schema, variables, {})
+            return
+
+        for i in range(len(preconds)):
+            sources = ['old'] * i + ['delta'] + ['all'] * (len(preconds) - i - 1)
+            pending = list(zip(preconds, sources))
+            yield from self._join(schema, variables, pending, {}, delta)
+
+    def _join(self, schema, variables, pending, binding, delta):
+        if not pending:
+            yield from self._complete(schema, variables, binding)
+            return
+
+        # Match the precondition with the fewest candidate facts first
+        best = None
+        for num, (clause, source) in enumerate(pending):
+            candidates = self._candidates(clause, variables, binding)
+            if best is None or len(candidates) < len(best[2]):
+                best = (num, clause, candidates, source)
+                if not candidates:
+                    return
+        num, clause, candidates, source = best
+        rest = pending[:num] + pending[num+1:]
+
+        fluents = self.symbols.fluents
+        for fid in candidates:
+            in_delta = fid in delta
+            if (source == 'delta' and not in_delta) or (source == 'old' and in_delta):
+                continue
+            new_binding = self._unify(clause, fluents[fid], variables, binding)
+            if new_binding is not None:
+                yield from self._join(schema, variables, rest, new_binding, delta)
+
+    def _candidates(self, clause, variables, binding):
+        candidates = self.by_predicate.get((clause.op, len(clause.args)), [])
+        for position, arg in enumerate(clause.args):
+            value = binding.get(arg, arg) if arg in variables else arg
+            if value in variables:
+                continue
+            bound = self.by_argument.get((clause.op, position, value), [])
+            if len(bound) < len(candidates):
+                candidates = bound
+        return candidates
+
+    @staticmethod
+    def _unify(clause, fact, variables, binding):
+        new_binding = binding
+        for arg, value in zip(clause.args, fact.args):
+            if arg in variables:
+                bound = new_binding.get(arg)
+                if bound is None:
+                    if new_binding is binding:
+                        new_binding = dict(binding)
+                    new_binding[arg] = value
+                elif bound != value:
+                    return None
+            elif arg != value:
+                return None
+        return new_binding
+
+    def _complete(self, schema, variables, binding):
+        """Binds the variables no precondition mentions to every object"""
+        free = [var for var in variables if var not in binding]
+        for values in itertools.product(self.objects, repeat=len(free)):
+            full = dict(binding)
+            full.update(zip(free, values))
+            if self.distinct_args and len(set(full.values())) < len(full):
+                continue
+            yield tuple(full.get(arg, arg) for arg in schema.args)
+
+    def _ground_action(self, schema, args):
+        symbols = self.symbols
+        aid = symbols.action(schema.substitute(Expr(schema.name, *schema.args), args))
+        action = self.ground.get(aid)
+        if action is None:
+            action = self.ground[aid] = GroundAction(
+                aid, symbols.actions[aid],
+                tuple(symbols.fluent(schema.substitute(clause, args)) for clause in schema.precond_pos),
+                tuple(symbols.fluent(schema.substitute(clause, args)) for clause in schema.precond_neg),
+                tuple(symbols.fluent(schema.substitute(clause, args)) for clause in schema.effect_add),
+                tuple(symbols.fluent(schema.substitute(clause, args)) for clause in schema.effect_rem))
+        return action
+
+
+class FixedGrounder(Grounder):
+    """
+    Grounder over a fixed list of ground actions instead of action schemas,
+    such as the actions left after pruning a problem (see preprocess.py).
+    An action is enabled once all its positive preconditions have been seen
+    and, as with Grounder, a later level of the same graph only looks at the
+    facts that are new to it.
+    """
+
+    def __init__(self, ground_actions, symbols):
+        self.actions = []
+        self.symbols = symbols
+        self.objects = []
+        self.distinct_args = True
+        self.ground = {action.id: action for action in ground_actions}
+        self.consumers = {}
+        self.pre_counts = {}
+        for action in ground_actions:
+            precond_pos = set(action.precond_pos)
+            self.pre_counts[action.id] = len(precond_pos)
+            for fid in precond_pos:
+                self.consumers.setdefault(fid, []).append(action)
+        self.reset()
+
+    def __call__(self, facts, negated=()):
+        facts = set(facts)
+        if not self.known <= facts:
+            self.reset()
+
+        missing = self.missing
+        for fid in facts - self.known:
+            for action in self.consumers.get(fid, ()):
+                missing[action.id] -= 1
+                if not missing[action.id]:
+                    self.enabled.append(action)
+        self.known = facts
+
+        negated = set(negated)
+        return [action for action in self.enabled
+                if all(clause not in facts or clause in negated for clause in action.precond_neg)]
+
+    def reset(self):
+        self.known = set()
+        self.missing = dict(self.pre_counts)
+        self.enabled = [action for action in self.ground.values() if not self.pre_counts[action.id]]
+
+
 class Level():
     """
     Contains the state of the planning problem
     and exhaustive list of actions which use the
     states as pre-condition.
+    States and actions are stored as ids of the problem's SymbolTable.
+    fact_mutex holds the mutexes of the (positive) facts of the level, found
+    by the level before it.
     """
 
-    def __init__(self, poskb, negkb):
+    def __init__(self, poskb, negkb, symbols=None, fact_mutex=None):
         self.poskb = poskb
+        self.symbols = symbols if symbols is not None else SymbolTable()
         # Current state
-        self.current_state_pos = poskb.clauses
-        self.current_state_neg = negkb.clauses
+        self.current_state_pos = [self.symbols.fluent(clause) for clause in poskb.clauses]
+        self.current_state_neg = [self.symbols.fluent(clause) for clause in negkb.clauses]
+        self.fact_mutex = fact_mutex if fact_mutex is not None else MutexRelation()
+        # Compared instead of the fact lists to find the fixed point of the graph
+        self.facts_key = (len(self.current_state_pos), fingerprint(self.current_state_pos),
+                          len(self.current_state_neg), fingerprint(self.current_state_neg),
+                          self.fact_mutex.key)
         # Current action to current state link
         self.current_action_links_pos = {}
         self.current_action_links_neg = {}
@@ -264,10 +713,24 @@ class Level():
         # Next state to current action link
         self.next_state_links_pos = {}
         self.next_state_links_neg = {}
-        self.mutex = []
-
-    def __call__(self, actions, objects):
-        self.build(actions, objects)
+        # Mutexes between actions, those of fixed_mutex hold at every level,
+        # and between the positive states they lead to
+        self.fixed_mutex = MutexRelation()
+        self.mutex = MutexRelation()
+        self.state_mutex = MutexRelation()
+        # Ids of the ground (non persistence) actions of the level
+        self.ground_actions = []
+
+    @property
+    def actions_key(self):
+        """Counts and fingerprints of the actions and their mutexes, once the level is built"""
+        return (len(self.next_action_links), len(self.ground_actions),
+                self.fixed_mutex.key, self.mutex.key)
+
+    def __call__(self, actions, objects, grounder=None, previous=None):
+        if previous is not None and grounder is not None and self.extend(previous, grounder):
+            return
+        self.build(actions, objects, grounder)
         self.find_mutex()
 
     def find_mutex(self):
@@ -277,8 +740,7 @@ class Level():
             if negeff in self.next_state_links_neg:
                 for a in self.next_state_links_pos[poseff]:
                     for b in self.next_state_links_neg[negeff]:
-                        if set([a, b]) not in self.mutex:
-                            self.mutex.append(set([a, b]))
+                        self.fixed_mutex.add(a, b)
 
         # Interference
         for posprecond in self.current_state_links_pos:
@@ -286,16 +748,14 @@ class Level():
             if negeff in self.next_state_links_neg:
                 for a in self.current_state_links_pos[posprecond]:
                     for b in self.next_state_links_neg[negeff]:
-                        if set([a, b]) not in self.mutex:
-                            self.mutex.append(set([a, b]))
+                        self.fixed_mutex.add(a, b)
 
         for negprecond in self.current_state_links_neg:
             poseff = negprecond
             if poseff in self.next_state_links_pos:
                 for a in self.next_state_links_pos[poseff]:
                     for b in self.current_state_links_neg[negprecond]:
-                        if set([a, b]) not in self.mutex:
-                            self.mutex.append(set([a, b]))
+                        self.fixed_mutex.add(a, b)
 
         # Competing needs
         for posprecond in self.current_state_links_pos:
@@ -303,93 +763,249 @@ class Level():
             if negprecond in self.current_state_links_neg:
                 for a in self.current_state_links_pos[posprecond]:
                     for b in self.current_state_links_neg[negprecond]:
-                        if set([a, b]) not in self.mutex:
-                            self.mutex.append(set([a, b]))
-
-        # Inconsistent support
-        state_mutex = []
-        for pair in self.mutex:
-            next_state_0 = self.next_action_links[list(pair)[0]]
-            if len(pair) == 2:
-                next_state_1 = self.next_action_links[list(pair)[1]]
-            else:
-                next_state_1 = self.next_action_links[list(pair)[0]]
-            if (len(next_state_0) == 1) and (len(next_state_1) == 1):
-                state_mutex.append(set([next_state_0[0], next_state_1[0]]))
+                        self.fixed_mutex.add(a, b)
+
+        self.find_competing_needs()
+        self.find_state_mutex()
+
+    def find_competing_needs(self):
+        """
+        Competing needs: actions are mutex if a positive precondition of one is
+        mutex with a positive precondition of the other. Unlike the mutexes of
+        fixed_mutex these depend on the level, so self.mutex is rebuilt from
+        fixed_mutex with them.
+        """
+        self.mutex = self.fixed_mutex.copy()
+        consumers = {}
+        for clause in self.fact_mutex.rows:
+            mask = 0
+            for action in self.current_state_links_pos.get(clause, ()):
+                mask |= 1 << action
+            consumers[clause] = mask
+
+        for clause, mask in consumers.items():
+            others = 0
+            for other in self.fact_mutex.mutex_with(clause):
+                others |= consumers[other]
+            while mask and others:
+                low = mask & -mask
+                a = low.bit_length() - 1
+                mask ^= low
+                row = others
+                while row:
+                    high = row & -row
+                    self.mutex.add(a, high.bit_length() - 1)
+                    row ^= high
+
+    def find_state_mutex(self, candidates=None):
+        """
+        Inconsistent support: facts p and q of the next level are mutex iff
+        every action adding p is mutex with every action adding q. Negative
+        facts get no mutexes. A fact pair not mutex at a level stays so at the
+        next one, as long as the actions and their mutexes only grow, so an
+        incrementally built level passes the mutexes of its own facts as
+        candidates and only those and the pairs with a new fact are tested.
+        """
+        links = self.next_state_links_pos
+        supporters = {}
+        common = {}
+        for clause, actions in links.items():
+            mask = 0
+            row = -1
+            for action in actions:
+                mask |= 1 << action
+                row &= self.mutex.row(action)
+            supporters[clause] = mask
+            if row:
+                # The actions mutex with every supporter of clause
+                common[clause] = row
+
+        self.state_mutex = MutexRelation()
+        if candidates is None:
+            pairs = ((p, q) for p in common for q in links if q > p)
+        else:
+            old = set(self.current_state_pos)
+            new = [clause for clause in links if clause not in old]
+            pairs = itertools.chain(candidates, ((p, q) for p in new for q in links))
+        for p, q in pairs:
+            if p in common and q in common and not supporters[q] & ~common[p]:
+                self.state_mutex.add(p, q)
 
-        self.mutex = self.mutex+state_mutex
+    def build(self, actions, objects, grounder=None):
 
-    def build(self, actions, objects):
+        symbols = self.symbols
 
         # Add persistence actions for positive states
         for clause in self.current_state_pos:
-            self.current_action_links_pos[Expr('Persistence', clause)] = [clause]
-            self.next_action_links[Expr('Persistence', clause)] = [clause]
-            self.current_state_links_pos[clause] = [Expr('Persistence', clause)]
-            self.next_state_links_pos[clause] = [Expr('Persistence', clause)]
+            noop = symbols.persistence(clause)
+            self.current_action_links_pos[noop] = [clause]
+            self.next_action_links[noop] = [clause]
+            self.current_state_links_pos[clause] = [noop]
+            self.next_state_links_pos[clause] = [noop]
 
         # Add persistence actions for negative states
         for clause in self.current_state_neg:
-            not_expr = Expr('not'+clause.op, clause.args)
-            self.current_action_links_neg[Expr('Persistence', not_expr)] = [clause]
-            self.next_action_links[Expr('Persistence', not_expr)] = [clause]
-            self.current_state_links_neg[clause] = [Expr('Persistence', not_expr)]
-            self.next_state_links_neg[clause] = [Expr('Persistence', not_expr)]
-
-        for a in actions:
-            num_args = len(a.args)
-            possible_args = tuple(itertools.permutations(objects, num_args))
-
-            for arg in possible_args:
-                if a.check_precond(self.poskb, arg):
-                    for num, symbol in enumerate(a.args):
-                        if not symbol.op.islower():
-                            arg = list(arg)
-                            arg[num] = symbol
-                            arg = tuple(arg)
-
-                    new_action = a.substitute(Expr(a.name, *a.args), arg)
-                    self.current_action_links_pos[new_action] = []
-                    self.current_action_links_neg[new_action] = []
-
-                    for clause in a.precond_pos:
-                        new_clause = a.substitute(clause, arg)
-                        self.current_action_links_pos[new_action].append(new_clause)
-                        if new_clause in self.current_state_links_pos:
-                            self.current_state_links_pos[new_clause].append(new_action)
-                        else:
-                            self.current_state_links_pos[new_clause] = [new_action]
-
-                    for clause in a.precond_neg:
-                        new_clause = a.substitute(clause, arg)
-                        self.current_action_links_neg[new_action].append(new_clause)
-                        if new_clause in self.current_state_links_neg:
-                            self.current_state_links_neg[new_clause].append(new_action)
-                        else:
-                            self.current_state_links_neg[new_clause] = [new_action]
-
-                    self.next_action_links[new_action] = []
-                    for clause in a.effect_add:
-                        new_clause = a.substitute(clause, arg)
-                        self.next_action_links[new_action].append(new_clause)
-                        if new_clause in self.next_state_links_pos:
-                            self.next_state_links_pos[new_clause].append(new_action)
-                        else:
-                            self.next_state_links_pos[new_clause] = [new_action]
-
-                    for clause in a.effect_rem:
-                        new_clause = a.substitute(clause, arg)
-                        self.next_action_links[new_action].append(new_clause)
-                        if new_clause in self.next_state_links_neg:
-                            self.next_state_links_neg[new_clause].append(new_action)
-                        else:
-                            self.next_state_links_neg[new_clause] = [new_action]
+            noop = symbols.persistence(clause, negated=True)
+            self.current_action_links_neg[noop] = [clause]
+            self.next_action_links[noop] = [clause]
+            self.current_state_links_neg[clause] = [noop]
+            self.next_state_links_neg[clause] = [noop]
+
+        if grounder is None:
+            grounder = Grounder(actions, symbols, objects)
+
+        for action in grounder(self.current_state_pos, self.current_state_neg):
+            new_action = action.id
+            self.ground_actions.append(new_action)
+            self.current_action_links_pos[new_action] = list(action.precond_pos)
+            self.current_action_links_neg[new_action] = list(action.precond_neg)
+
+            for new_clause in action.precond_pos:
+                if new_clause in self.current_state_links_pos:
+                    self.current_state_links_pos[new_clause].append(new_action)
+                else:
+                    self.current_state_links_pos[new_clause] = [new_action]
+
+            for new_clause in action.precond_neg:
+                if new_clause in self.current_state_links_neg:
+                    self.current_state_links_neg[new_clause].append(new_action)
+                else:
+                    self.current_state_links_neg[new_clause] = [new_action]
+
+            self.next_action_links[new_action] = list(action.effect_add + action.effect_rem)
+            for new_clause in action.effect_add:
+                if new_clause in self.next_state_links_pos:
+                    self.next_state_links_pos[new_clause].append(new_action)
+                else:
+                    self.next_state_links_pos[new_clause] = [new_action]
+
+            for new_clause in action.effect_rem:
+                if new_clause in self.next_state_links_neg:
+                    self.next_state_links_neg[new_clause].append(new_action)
+                else:
+                    self.next_state_links_neg[new_clause] = [new_action]
+
+    def extend(self, previous, grounder):
+        """
+        Builds the level incrementally from the previous, already built, level.
+        The links and mutexes of the previous level are carried forward and only
+        the facts and actions new to this level are linked. Mutexes depend only
+        on the pair of actions involved, so only pairs with a new action are
+        tested. Returns False, leaving the level untouched, if the level does
+        not contain the previous one (an action got disabled by a negative
+        precondition), in which case it has to be built from scratch.
+        """
+        symbols = self.symbols
+        state_pos = set(self.current_state_pos)
+        state_neg = set(self.current_state_neg)
+        if not (state_pos.issuperset(previous.current_state_pos) and
+                state_neg.issuperset(previous.current_state_neg)):
+            return False
+
+        enabled = grounder(self.current_state_pos, self.current_state_neg)
+        old_actions = set(previous.ground_actions)
+        if len(old_actions.intersection(action.id for action in enabled)) != len(old_actions):
+            return False
+
+        self.current_action_links_pos = dict(previous.current_action_links_pos)
+        self.current_action_links_neg = dict(previous.current_action_links_neg)
+        self.current_state_links_pos = dict(previous.current_state_links_pos)
+        self.current_state_links_neg = dict(previous.current_state_links_neg)
+        self.next_action_links = dict(previous.next_action_links)
+        self.next_state_links_pos = dict(previous.next_state_links_pos)
+        self.next_state_links_neg = dict(previous.next_state_links_neg)
+        self.fixed_mutex = previous.fixed_mutex.copy()
+        self.ground_actions = list(previous.ground_actions)
+
+        # Lists still shared with the previous level are copied before appending
+        copied = {}
+
+        def link(links, key, value, first=False):
+            owned = copied.setdefault(id(links), set())
+            if key not in owned:
+                links[key] = list(links.get(key, ()))
+                owned.add(key)
+            if first:
+                links[key].insert(0, value)
+            else:
+                links[key].append(value)
+
+        new_actions = []
+        for clause in state_pos.difference(previous.current_state_pos):
+            noop = symbols.persistence(clause)
+            self.current_action_links_pos[noop] = [clause]
+            self.next_action_links[noop] = [clause]
+            link(self.current_state_links_pos, clause, noop, first=True)
+            link(self.next_state_links_pos, clause, noop, first=True)
+            new_actions.append(noop)
+
+        for clause in state_neg.difference(previous.current_state_neg):
+            noop = symbols.persistence(clause, negated=True)
+            self.current_action_links_neg[noop] = [clause]
+            self.next_action_links[noop] = [clause]
+            link(self.current_state_links_neg, clause, noop, first=True)
+            link(self.next_state_links_neg, clause, noop, first=True)
+            new_actions.append(noop)
+
+        for action in enabled:
+            if action.id in old_actions:
+                continue
+            new_action = action.id
+            self.ground_actions.append(new_action)
+            self.current_action_links_pos[new_action] = list(action.precond_pos)
+            self.current_action_links_neg[new_action] = list(action.precond_neg)
+            self.next_action_links[new_action] = list(action.effect_add + action.effect_rem)
+            for new_clause in action.precond_pos:
+                link(self.current_state_links_pos, new_clause, new_action)
+            for new_clause in action.precond_neg:
+                link(self.current_state_links_neg, new_clause, new_action)
+            for new_clause in action.effect_add:
+                link(self.next_state_links_pos, new_clause, new_action)
+            for new_clause in action.effect_rem:
+                link(self.next_state_links_neg, new_clause, new_action)
+            new_actions.append(new_action)
+
+        self._find_new_mutex(new_actions, grounder)
+        self.find_competing_needs()
+        self.find_state_mutex(self.fact_mutex)
+        return True
+
+    def _find_new_mutex(self, new_actions, grounder):
+        """Adds the fixed mutexes (same rules as find_mutex) of pairs with an action of new_actions"""
+        empty = ()
+        for a in new_actions:
+            if a in self.symbols.persisted:
+                clause, negated = self.symbols.persisted[a]
+                effect_add, effect_rem = (empty, (clause,)) if negated else ((clause,), empty)
+            else:
+                effect_add, effect_rem = grounder.ground[a].effect_add, grounder.ground[a].effect_rem
+
+            others = []
+            for clause in effect_add:
+                # Inconsistent effects and interference with negative preconditions
+                others += self.next_state_links_neg.get(clause, empty)
+                others += self.current_state_links_neg.get(clause, empty)
+            for clause in effect_rem:
+                # Inconsistent effects and interference with positive preconditions
+                others += self.next_state_links_pos.get(clause, empty)
+                others += self.current_state_links_pos.get(clause, empty)
+            for clause in self.current_action_links_pos.get(a, empty):
+                # Interference and competing needs
+                others += self.next_state_links_neg.get(clause, empty)
+                others += self.current_state_links_neg.get(clause, empty)
+            for clause in self.current_action_links_neg.get(a, empty):
+                others += self.next_state_links_pos.get(clause, empty)
+                others += self.current_state_links_pos.get(clause, empty)
+
+            for b in others:
+                self.fixed_mutex.add(a, b)
 
     def perform_actions(self):
-        new_kb_pos = FolKB(list(set(self.next_state_links_pos.keys())))
-        new_kb_neg = FolKB(list(set(self.next_state_links_neg.keys())))
+        fluents = self.symbols.fluents
+        new_kb_pos = IndexedFolKB([fluents[clause] for clause in self.next_state_links_pos])
+        new_kb_neg = IndexedFolKB([fluents[clause] for clause in self.next_state_links_neg])
 
-        return Level(new_kb_pos, new_kb_neg)
+        return Level(new_kb_pos, new_kb_neg, self.symbols, self.state_mutex)
 
 
 class Graph:
@@ -398,25 +1014,52 @@ class Graph:
     Used in graph planning algorithm to extract a solution
     """
 
-    def __init__(self, pddl, negkb):
+    def __init__(self, pddl, negkb, distinct_args=True, incremental=True, grounder=None):
+        """
+        :param grounder: optional Grounder of the same problem, whose symbols
+        and ground actions are reused
+        """
         self.pddl = pddl
-        self.levels = [Level(pddl.kb, negkb)]
+        self.incremental = incremental
+        self.symbols = grounder.symbols if grounder is not None else SymbolTable()
+        self.levels = [Level(pddl.kb, negkb, self.symbols)]
         self.objects = set(arg for clause in pddl.kb.clauses + negkb.clauses for arg in clause.args)
+        if grounder is None:
+            grounder = Grounder(pddl.actions, self.symbols, self.objects, distinct_args)
+        self.grounder = grounder
+        # Index of the first level the graph stays the same after, once found
+        self.leveloff = None
 
     def __call__(self):
         self.expand_graph()
 
     def expand_graph(self):
         last_level = self.levels[-1]
-        last_level(self.pddl.actions, self.objects)
+        previous = self.levels[-2] if self.incremental and len(self.levels) > 1 else None
+        last_level(self.pddl.actions, self.objects, self.grounder, previous)
         self.levels.append(last_level.perform_actions())
+        if self.leveloff is None and self.same_levels(-1, -2):
+            self.leveloff = len(self.levels) - 2
+
+    def same_levels(self, i, j):
+        """
+        Checks in constant time if the levels i and j, relative to the last
+        level (i = j + 1), have the same facts and fact mutexes, and the
+        levels before them the same actions and action mutexes.
+        """
+        levels = self.levels
+        if len(levels) < 1 - j:
+            return False
+        return (levels[i].facts_key == levels[j].facts_key and
+                levels[i - 1].actions_key == levels[j - 1].actions_key)
+
+    def goal_ids(self, goals):
+        """Interns a list of goal clauses, returning their fluent ids"""
+        return [self.symbols.fluent(goal) for goal in goals]
 
     def non_mutex_goals(self, goals, index):
-        goal_perm = itertools.combinations(goals, 2)
-        for g in goal_perm:
-            if set(g) in self.levels[index].mutex:
-                return False
-        return True
+        """Checks that no two of the positive goals goals are mutex at levels[index]"""
+        return self.levels[index].fact_mutex.non_mutex(goals)
 
 
 class GraphPlan:
@@ -426,115 +1069,258 @@ class GraphPlan:
     Returns solution for the planning problem
     """
 
-    def __init__(self, pddl, negkb):
-        self.graph = Graph(pddl, negkb)
-        self.nogoods = []
-        self.solution = []
+    def __init__(self, pddl, negkb, grounder=None):
+        self.graph = Graph(pddl, negkb, grounder=grounder)
+        self.nogoods = NogoodTable()
+        self.search = None
         self.pos = None
+        # (number of levels, nogoods at the level-off level) after the last failed extraction
+        self.leveloff_nogoods = None
 
-    def check_leveloff(self, depth=2):
-
-        pos_check = all(set(self.graph.levels[-i].current_state_pos) ==
-                       set(self.graph.levels[-(i+1)].current_state_pos)
-                        for i in range(1, depth + 1))
-        neg_check = all(set(self.graph.levels[-i].current_state_neg) ==
-                        set(self.graph.levels[-(i+1)].current_state_neg)
-                        for i in range(1, depth))
+    def __getstate__(self):
+        # a paused search holds generators, which cannot be pickled; it is
+        # dropped and the next extraction starts over with the nogoods kept
+        state = dict(self.__dict__)
+        state['search'] = None
+        return state
 
-        if pos_check and neg_check:
-            return True
+    def check_leveloff(self, depth=2):
+        """Checks if the last depth + 1 levels are all the same, in O(depth)"""
+        return all(self.graph.same_levels(-i, -(i + 1)) for i in range(1, depth + 1))
 
-    def extract_solution(self, goals_pos, goals_neg, index):
-        level = self.graph.levels[index]
-        if not self.graph.non_mutex_goals(goals_pos+goals_neg, index):
-            self.nogoods.append((level, goals_pos, goals_neg))
+    def exhausted(self):
+        """
+        Graphplan's termination test, to call after extraction failed at the
+        last level. Once the graph has leveled off at level n, the problem has
+        no solution if a failed extraction added no nogood at level n.
+        """
+        n = self.graph.leveloff
+        if n is None:
             return False
+        stage, count = len(self.graph.levels), self.nogoods.count(n)
+        previous = self.leveloff_nogoods
+        if previous is not None and previous[0] == stage:
+            return False  # this stage was already counted
+        self.leveloff_nogoods = (stage, count)
+        return previous is not None and previous[1] == count
+
+    @staticmethod
+    def goal_set(goals_pos, goals_neg):
+        """The ids of the goals as a nogood key, negative goals encoded as -(id + 1)"""
+        return frozenset(goals_pos).union(-goal - 1 for goal in goals_neg)
+
+    @staticmethod
+    def action_sets(level, goals_pos, goals_neg):
+        """
+        Yields, lazily, the sets of actions of level that achieve all the goals
+        with no two actions mutex. Goals get a supporter one at a time, most
+        constrained goal first, and goals already achieved by a chosen action
+        are skipped. A supporter mutex with an action chosen before is pruned
+        right away, and supporters achieving more of the goals are tried first.
+        """
+        supporters = ([level.next_state_links_pos[goal] for goal in goals_pos] +
+                      [level.next_state_links_neg[goal] for goal in goals_neg])
+        supporter_sets = [set(actions) for actions in supporters]
+        coverage = {}
+        for actions in supporter_sets:
+            for action in actions:
+                coverage[action] = coverage.get(action, 0) + 1
+
+        order = sorted(range(len(supporters)), key=lambda goal: len(supporters[goal]))
+        ranked = [sorted(supporters[goal], key=lambda action: -coverage[action]) for goal in order]
+        mutex = level.mutex
+        seen = set()
+
+        def options(k):
+            if supporter_sets[order[k]] & chosen_set:
+                return iter((None,))  # Already achieved, nothing to choose
+            return iter(ranked[k])
+
+        # Depth first over the goals with an explicit stack of option iterators
+        chosen = []
+        chosen_set = set()
+        chosen_mask = 0
+        stack = [options(0)] if order else []
+        if not order:
+            yield []
+        while stack:
+            k = len(stack) - 1
+            if len(chosen) > k:
+                # Undo the choice made for goal k before trying the next one
+                action = chosen.pop()
+                if action is not None:
+                    chosen_set.discard(action)
+                    chosen_mask ^= 1 << action
+            for action in stack[k]:
+                if action is None or not mutex.row(action) & chosen_mask:
+                    break
+            else:
+                stack.pop()
+                continue
+
+            chosen.append(action)
+            if action is not None:
+                chosen_set.add(action)
+                chosen_mask |= 1 << action
+            if k + 1 < len(order):
+                stack.append(options(k + 1))
+                continue
+            action_set = frozenset(chosen_set)
+            if action_set not in seen:
+                seen.add(action_set)
+                yield [action for action in chosen if action is not None]
+
+    def extract_solution(self, goals_pos, goals_neg, index=-1, max_nodes=None, timeout=None):
+        """
+        Searches the graph, backward from goals at levels[index], for a plan.
+        Returns a Plan, False if there is none, or None if max_nodes action
+        sets were tried or timeout seconds passed first. In that case calling
+        again with the same goals resumes the search where it stopped.
+        """
+        depth = len(self.graph.levels) + index
+        goals = (depth, self.goal_set(goals_pos, goals_neg))
+        if self.search is None or self.search.key != goals or self.search.status != 'paused':
+            self.search = SolutionSearch(self, goals_pos, goals_neg, depth)
+        return self.search.run(max_nodes, timeout)
 
-        level = self.graph.levels[index-1]
 
-        # Create all combinations of actions that satisfy the goal
-        actions = []
-        for goal in goals_pos:
-            actions.append(level.next_state_links_pos[goal])
+class Plan:
+    """
+    A solution extracted from the planning graph.
+    steps holds one (level index, actions) pair per step, in execution order,
+    where the actions are Exprs performed together from that level.
+    """
 
-        for goal in goals_neg:
-            actions.append(level.next_state_links_neg[goal])
+    def __init__(self, steps):
+        self.steps = steps
 
-        all_actions = list(itertools.product(*actions))
+    @property
+    def actions(self):
+        return [actions for _, actions in self.steps]
 
-        # Filter out the action combinations which contain mutexes
-        non_mutex_actions = []
-        for action_tuple in all_actions:
-            action_pairs = itertools.combinations(list(set(action_tuple)), 2)
-            non_mutex_actions.append(list(set(action_tuple)))
-            for pair in action_pairs:
-                if set(pair) in level.mutex:
-                    non_mutex_actions.pop(-1)
-                    break
+    def __iter__(self):
+        return iter(self.actions)
 
-        if not non_mutex_actions:
-            return False
+    def __len__(self):
+        return len(self.steps)
 
-        # Recursion
-        for action_list in non_mutex_actions:
-            if [action_list, index] not in self.solution:
-                if len(self.solution) > 1:
-                    if self.solution[-1][1] == index:
-                        self.solution.pop()
-                self.solution.append([action_list, index])
-
-                new_goals_pos = []
-                new_goals_neg = []
-                for act in set(action_list):
-                    if act in level.current_action_links_pos:
-                        new_goals_pos = new_goals_pos + level.current_action_links_pos[act]
-                new_goals_pos = list(set(new_goals_pos))
-
-                for act in set(action_list):
-                    if act in level.current_action_links_neg:
-                        new_goals_neg = new_goals_neg + level.current_action_links_neg[act]
-                new_goals_neg = list(set(new_goals_neg))
-
-                if abs(index)+1 == len(self.graph.levels):
-                    if all(goal in self.graph.levels[0].current_state_pos for goal in new_goals_pos):
-                        return True
-                    else:
-                        return False
-                elif (level, new_goals_pos, new_goals_neg) in self.nogoods:
-                    return False
-                else:
-                    success = self.extract_solution(new_goals_pos, new_goals_neg, index-1)
-                    if success and index == -1:
-                        break
-                    elif success and index != -1:
-                        return True
-                    else:
-                        self.solution.pop()
+    def __bool__(self):
+        return True
 
+    def __repr__(self):
+        return repr(self.actions)
 
 
+class SolutionSearch:
+    """
+    Backward search of GraphPlan for a plan achieving goals at level depth,
+    run on an explicit stack so it does not depend on the recursion limit and
+    can be paused and resumed. Each frame holds the goals of a level and the
+    action sets still to try for them; failed goal sets become nogoods.
+    status is 'paused' until the search is 'solved' or 'failed'.
+    """
 
-        if index == -1:
-            # Level-Order multiple solutions
-            solution = []
-            for item in self.solution:
-                if item[1] == -1:
-                    solution.append([])
-                    solution[-1].append(item[0])
-                else:
-                    solution[-1].append(item[0])
+    class Frame:
+        def __init__(self, depth, goals_pos, goals_neg, candidates):
+            self.depth = depth
+            self.goals_pos = goals_pos
+            self.goals_neg = goals_neg
+            self.candidates = candidates
+            self.chosen = None
+
+    def __init__(self, graphplan, goals_pos, goals_neg, depth):
+        self.graphplan = graphplan
+        self.key = (depth, graphplan.goal_set(goals_pos, goals_neg))
+        self.stack = []
+        self.nodes = 0
+        self.plan = None
+        self.status = 'paused'
+        if depth == 0:
+            # The goals have to hold in the initial state already
+            initial_state = set(graphplan.graph.levels[0].current_state_pos)
+            if set(goals_pos) <= initial_state and initial_state.isdisjoint(goals_neg):
+                self.plan = Plan([])
+                self.status = 'solved'
+            else:
+                self.status = 'failed'
+            return
+        frame = self._frame(depth, list(goals_pos), list(goals_neg))
+        if frame is None:
+            self.status = 'failed'
+        else:
+            self.stack.append(frame)
+
+    def _frame(self, depth, goals_pos, goals_neg):
+        """A frame for the goals at level depth, or None if they are mutex"""
+        graph = self.graphplan.graph
+        # Only positive facts have mutexes
+        if not graph.non_mutex_goals(goals_pos, depth):
+            self.graphplan.nogoods.add(depth, self.graphplan.goal_set(goals_pos, goals_neg))
+            return None
+        level = graph.levels[depth - 1]
+        return self.Frame(depth, goals_pos, goals_neg,
+                          self.graphplan.action_sets(level, goals_pos, goals_neg))
+
+    def run(self, max_nodes=None, timeout=None):
+        """Searches until done or out of budget. Returns a Plan, False or None (paused)"""
+        if self.status == 'solved':
+            return self.plan
+        if self.status == 'failed':
+            return False
 
-            for num, item in enumerate(solution):
-                item.reverse()
-                solution[num] = item
+        graphplan = self.graphplan
+        graph = graphplan.graph
+        nogoods = graphplan.nogoods
+        initial_state = set(graph.levels[0].current_state_pos)
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        budget = None if max_nodes is None else self.nodes + max_nodes
 
-            return solution
+        while self.stack:
+            if ((budget is not None and self.nodes >= budget) or
+                    (deadline is not None and time.perf_counter() >= deadline)):
+                return None
+
+            frame = self.stack[-1]
+            action_list = next(frame.candidates, None)
+            if action_list is None:
+                # Every way of achieving the goals failed
+                nogoods.add(frame.depth, graphplan.goal_set(frame.goals_pos, frame.goals_neg))
+                self.stack.pop()
+                continue
+            self.nodes += 1
+            frame.chosen = action_list
+
+            level = graph.levels[frame.depth - 1]
+            new_goals_pos = set()
+            new_goals_neg = set()
+            for act in action_list:
+                new_goals_pos.update(level.current_action_links_pos.get(act, ()))
+                new_goals_neg.update(level.current_action_links_neg.get(act, ()))
+
+            if frame.depth == 1:
+                if (new_goals_pos <= initial_state and
+                        new_goals_neg.isdisjoint(initial_state)):
+                    return self._solved()
+            elif not nogoods.is_nogood(frame.depth - 1,
+                                       graphplan.goal_set(new_goals_pos, new_goals_neg)):
+                child = self._frame(frame.depth - 1, list(new_goals_pos), list(new_goals_neg))
+                if child is not None:
+                    self.stack.append(child)
+
+        self.status = 'failed'
         return False
 
+    def _solved(self):
+        actions = self.graphplan.graph.symbols.actions
+        self.plan = Plan([(frame.depth - 1, [actions[act] for act in frame.chosen])
+                          for frame in reversed(self.stack)])
+        self.status = 'solved'
+        return self.plan
+
 
 def spare_tire_graphplan():
     pddl = spare_tire()
-    negkb = FolKB([expr('At(Flat, Trunk)')])
+    negkb = IndexedFolKB([expr('At(Flat, Trunk)')])
     graphplan = GraphPlan(pddl, negkb)
 
     def goal_test(kb, goals):
@@ -543,11 +1329,13 @@ def spare_tire_graphplan():
     # Not sure
     goals_pos = [expr('At(Spare, Axle)'), expr('At(Flat, Ground)')]
     goals_neg = []
+    goal_ids_pos = graphplan.graph.goal_ids(goals_pos)
+    goal_ids_neg = graphplan.graph.goal_ids(goals_neg)
 
     while True:
         if (goal_test(graphplan.graph.levels[-1].poskb, goals_pos) and
-                graphplan.graph.non_mutex_goals(goals_pos+goals_neg, -1)):
-            solution = graphplan.extract_solution(goals_pos, goals_neg, -1)
+                graphplan.graph.non_mutex_goals(goal_ids_pos, -1)):
+            solution = graphplan.extract_solution(goal_ids_pos, goal_ids_neg, -1)
             if solution:
                 return solution
         graphplan.graph.expand_graph()
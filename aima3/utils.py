@@ -8,6 +8,8 @@ import os.path
 import random
 import math
 import functools
+import heapq
+import itertools
 from itertools import chain, combinations
 
 
@@ -749,37 +751,50 @@ class PriorityQueue(Queue):
     """A queue in which the minimum (or maximum) element (as determined by f and
     order) is returned first. If order is min, the item with minimum f(x) is
     returned first; if order is max, then it is the item with maximum f(x).
-    Also supports dict-like lookup."""
+    Also supports dict-like lookup.
+    Items are kept in a binary heap and indexed by a dict, so append and pop
+    take O(log n) and lookup and deletion O(1). Deleted items stay in the heap,
+    marked, until they reach its top. Items with the same f come out first in
+    first out, and each item is held at most once: appending one equal to an
+    item already queued replaces it."""
 
     def __init__(self, order=min, f=lambda x: x):
-        self.A = []
+        self.heap = []
+        self.entries = {}
         self.order = order
         self.f = f
+        self.counter = itertools.count()
 
     def append(self, item):
-        bisect.insort(self.A, (self.f(item), item))
+        if item in self.entries:
+            del self[item]
+        value = self.f(item)
+        entry = [value if self.order == min else -value, next(self.counter), item, True]
+        self.entries[item] = entry
+        heapq.heappush(self.heap, entry)
 
     def __len__(self):
-        return len(self.A)
+        return len(self.entries)
 
     def pop(self):
-        if self.order == min:
-            return self.A.pop(0)[1]
-        else:
-            return self.A.pop()[1]
+        while self.heap:
+            _, _, item, live = heapq.heappop(self.heap)
+            if live:
+                del self.entries[item]
+                return item
+        raise IndexError('pop from an empty priority queue')
 
     def __contains__(self, item):
-        return any(item == pair[1] for pair in self.A)
+        return item in self.entries
 
     def __getitem__(self, key):
-        for _, item in self.A:
-            if item == key:
-                return item
+        entry = self.entries.get(key)
+        return entry[2] if entry is not None else None
 
     def __delitem__(self, key):
-        for i, (value, item) in enumerate(self.A):
-            if item == key:
-                self.A.pop(i)
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            entry[3] = False
 
 
 # ______________________________________________________________________________
@@ -0,0 +1,203 @@
+"""
+Parallel solving of problem suites over a process pool.
+
+    from batch import BatchStats, solve_batch
+
+    stats = BatchStats()
+    for result in solve_batch(pairs, timeout=60, deadline=3600, stats=stats):
+        print(result['problem'], result['status'])
+    print(stats.summary())
+
+Each worker keeps its own DomainCache, so a domain is parsed once per worker
+no matter how many of its problems the worker solves. Results are yielded in
+completion order as dictionaries in the format of graphplan.solve_problem.
+If a worker dies, for example killed by the OS when memory runs out, the
+problems in flight are reported as errors and the pool is started again.
+"""
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from engine import DomainCache
+from graphplan import solve_problem
+from problem_cache import ProblemCache
+
+# problems submitted ahead of the ones running, per worker
+QUEUE_DEPTH = 4
+
+_domains = None
+_cache = None
+
+
+def _init_worker(cache_dir=None):
+    global _domains, _cache
+    _domains = DomainCache()
+    _cache = ProblemCache(cache_dir) if cache_dir is not None else None
+
+
+def _solve(domain_file, problem_file, timeout, memory, max_nodes, snapshots, planner, deadline):
+    """Runs in a worker, deadline is an absolute time.time() or None"""
+    if deadline is not None:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return _cancelled(domain_file, problem_file)
+        timeout = remaining if timeout is None else min(timeout, remaining)
+    result = solve_problem(domain_file, problem_file, timeout, memory, max_nodes, _domains, _cache, snapshots,
+                           planner)
+    result['worker'] = os.getpid()
+    return result
+
+
+class BatchStats:
+    """Running totals over the results of a batch, overall and per domain"""
+
+    def __init__(self):
+        self.count = 0
+        self.statuses = defaultdict(int)
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.plan_lengths = []
+        self.domains = defaultdict(lambda: defaultdict(int))
+        self.started = time.perf_counter()
+        self.wall_time = 0.0
+
+    def add(self, result):
+        self.count += 1
+        self.statuses[result['status']] += 1
+        self.domains[result['domain']][result['status']] += 1
+        self.total_time += result.get('time', 0.0)
+        self.max_time = max(self.max_time, result.get('time', 0.0))
+        if 'plan_length' in result:
+            self.plan_lengths.append(result['plan_length'])
+        self.wall_time = time.perf_counter() - self.started
+
+    def summary(self):
+        return {
+            'problems': self.count,
+            'statuses': dict(self.statuses),
+            'wall_time': self.wall_time,
+            'cpu_time': self.total_time,
+            'mean_time': self.total_time / self.count if self.count else 0.0,
+            'max_time': self.max_time,
+            'mean_plan_length': (sum(self.plan_lengths) / len(self.plan_lengths)
+                                 if self.plan_lengths else None),
+            'domains': {domain: dict(statuses) for domain, statuses in self.domains.items()},
+        }
+
+
+def solve_batch(pairs, workers=None, timeout=None, memory=None, max_nodes=None, deadline=None, stats=None,
+                cache_dir=None, snapshots=None, planner='graphplan'):
+    """
+    Solves (domain, problem) pairs in parallel, yielding results as they finish
+    :param pairs: iterable of (domain file, problem file), consumed lazily
+    :param workers: number of processes, os.cpu_count() if None
+    :param timeout: seconds per problem, None for no limit
+    :param memory: bytes per problem, None for no limit
+    :param max_nodes: search nodes per extraction, None for no limit
+    :param deadline: seconds for the whole batch. Problems still running when
+    it passes are stopped by their time limit and the ones not started are
+    reported as cancelled
+    :param stats: optional BatchStats updated with every result
+    :param cache_dir: optional ProblemCache directory shared by the workers
+    :param snapshots: optional directory of graph snapshots to resume from and save to
+    :param planner: 'graphplan', 'sat', 'greedy' or 'astar', see GraphPlanVis.solve
+    """
+    workers = workers or os.cpu_count() or 1
+    stop_at = None if deadline is None else time.time() + deadline
+
+    def new_executor():
+        return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cache_dir,))
+
+    for result in _run(new_executor, iter(pairs), workers, (timeout, memory, max_nodes, snapshots, planner, stop_at)):
+        if stats is not None:
+            stats.add(result)
+        yield result
+
+
+def _cancelled(domain_file, problem_file):
+    return {'domain': domain_file, 'problem': problem_file, 'status': 'cancelled', 'time': 0.0}
+
+
+def _failed(domain_file, problem_file, error):
+    return {'domain': domain_file, 'problem': problem_file, 'status': 'error',
+            'error': '%s: %s' % (type(error).__name__, error)}
+
+
+def _run(new_executor, pairs, workers, arguments):
+    """
+    Keeps a bounded queue of problems submitted to an executor and yields
+    their results as they complete, cancelling what is left once the deadline
+    passes. The executor is made by new_executor, and made again if one of its
+    workers dies. The problems in flight then are suspects: they are run
+    again one at a time, and the one that kills its worker while running alone
+    is reported as an error
+    """
+    stop_at = arguments[-1]
+    pending = {}
+    suspects = []
+    # pairs taken from pairs but not submitted, because the pool broke meanwhile
+    unsubmitted = []
+    executor = new_executor()
+    alone = None
+
+    def submit():
+        nonlocal alone
+        while len(pending) < (1 if suspects else workers * QUEUE_DEPTH):
+            suspect = bool(suspects)
+            if suspect:
+                pair = suspects.pop()
+            elif unsubmitted:
+                pair = unsubmitted.pop()
+            else:
+                pair = next(pairs, None)
+            if pair is None:
+                return
+            try:
+                future = executor.submit(_solve, pair[0], pair[1], *arguments)
+            except BrokenProcessPool:
+                # the futures already pending fail too, which restarts the pool
+                (suspects if suspect else unsubmitted).append(pair)
+                return
+            pending[future] = pair
+            if suspect:
+                alone = future
+                return
+
+    try:
+        submit()
+        while pending:
+            before_deadline = stop_at is not None and time.time() < stop_at
+            done, _ = wait(pending, return_when=FIRST_COMPLETED,
+                           timeout=stop_at - time.time() if before_deadline else None)
+            broken = False
+            for future in done:
+                domain_file, problem_file = pending.pop(future)
+                try:
+                    yield future.result()
+                except BrokenProcessPool as e:
+                    broken = True
+                    if future is alone:
+                        yield _failed(domain_file, problem_file, e)
+                    else:
+                        suspects.append((domain_file, problem_file))
+                except Exception as e:
+                    yield _failed(domain_file, problem_file, e)
+            if broken:
+                # a worker died and took the pool down, with every problem in flight
+                suspects.extend(pending.pop(future) for future in list(pending))
+                executor.shutdown()
+                executor = new_executor()
+            if stop_at is not None and time.time() >= stop_at:
+                # problems still running stop at their own time limit
+                for future in list(pending):
+                    if future.cancel():
+                        yield _cancelled(*pending.pop(future))
+                for domain_file, problem_file in suspects + unsubmitted + list(pairs):
+                    yield _cancelled(domain_file, problem_file)
+                del suspects[:], unsubmitted[:]
+            else:
+                submit()
+    finally:
+        executor.shutdown()
@@ -0,0 +1,275 @@
+"""
+Headless benchmark for the Graphplan engine.
+
+Solves every domain/problem pair under examples/ (and optionally generated
+blocksworld and gripper instances of growing size) and writes a JSON report
+with wall time, graph statistics and the time and peak memory spent in each
+phase: parse, ground, expand and extract.
+
+    python benchmark.py -o results.json --blocks 4 6 8 --balls 2 3
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from engine import GraphPlanVis
+from aima3.planning import FixedGrounder, Graph, GraphPlan, Grounder
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'examples')
+PHASES = ('parse', 'ground', 'expand', 'extract')
+
+
+class PhaseProfiler:
+    """
+    Times the solver phases by wrapping the methods that implement them for the
+    duration of a with block. Phases nest (grounding happens inside expansion),
+    and each phase is only charged for the time not spent in a nested one.
+    Peak memory is tracked with tracemalloc when memory is True.
+    """
+
+    # every grounder class overriding __call__ needs its own hook
+    hooks = [(Grounder, '__call__', 'ground'),
+             (FixedGrounder, '__call__', 'ground'),
+             (Graph, 'expand_graph', 'expand'),
+             (GraphPlan, 'extract_solution', 'extract')]
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.time = dict.fromkeys(PHASES, 0.0)
+        self.peak = dict.fromkeys(PHASES, 0)
+        self.calls = dict.fromkeys(PHASES, 0)
+        self._stack = []
+        self._originals = []
+
+    def __enter__(self):
+        for cls, name, phase in self.hooks:
+            original = getattr(cls, name)
+            self._originals.append((cls, name, original))
+            setattr(cls, name, self._wrap(original, phase))
+        if self.memory:
+            tracemalloc.start()
+        return self
+
+    def __exit__(self, *exc):
+        for cls, name, original in self._originals:
+            setattr(cls, name, original)
+        self._originals = []
+        if self.memory:
+            tracemalloc.stop()
+
+    def _wrap(self, function, phase):
+        profiler = self
+
+        def wrapper(*args, **kwargs):
+            with profiler.phase(phase):
+                return function(*args, **kwargs)
+        return wrapper
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def _enter(self, name):
+        now = time.perf_counter()
+        if self._stack:
+            parent = self._stack[-1]
+            self.time[parent[0]] += now - parent[1]
+            if self.memory:
+                parent[2] = max(parent[2], tracemalloc.get_traced_memory()[1])
+        if self.memory:
+            tracemalloc.reset_peak()
+        self.calls[name] += 1
+        self._stack.append([name, now, 0])
+
+    def _exit(self):
+        name, started, peak = self._stack.pop()
+        now = time.perf_counter()
+        self.time[name] += now - started
+        if self.memory:
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            self.peak[name] = max(self.peak[name], peak)
+        if self._stack:
+            parent = self._stack[-1]
+            parent[1] = now
+            parent[2] = max(parent[2], peak)
+
+
+class _Phase:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._enter(self.name)
+
+    def __exit__(self, *exc):
+        self.profiler._exit()
+
+
+def run_problem(domain_file, problem_file, timeout=None, memory=False):
+    """
+    Parses and solves a single problem under a PhaseProfiler
+    :param timeout: seconds allowed for solving, None for no limit
+    :param memory: also record peak memory per phase (slows the run down)
+    :return: dictionary with the status, plan length, stats and phases
+    """
+    result = {'domain': domain_file, 'problem': problem_file}
+    gp = GraphPlanVis()
+    profiler = PhaseProfiler(memory)
+    started = time.perf_counter()
+    try:
+        with profiler:
+            with profiler.phase('parse'):
+                gp.create_problem(domain_file, problem_file)
+            solution = gp.solve(timeout=timeout)
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = '%s: %s' % (type(e).__name__, e)
+        return result
+    result['wall_time'] = time.perf_counter() - started
+
+    if solution is None:
+        result['status'] = 'timeout'
+    elif solution:
+        result['status'] = 'solved'
+        result['plan_length'] = sum(len(step) for step in gp.plan_steps(solution))
+        result['makespan'] = len(solution)
+    else:
+        result['status'] = 'unsolvable'
+    result.update(gp.stats())
+    result['phases'] = {name: {'time': profiler.time[name], 'calls': profiler.calls[name]}
+                        for name in PHASES}
+    if memory:
+        for name in PHASES:
+            result['phases'][name]['peak_memory'] = profiler.peak[name]
+    return result
+
+
+def bundled_problems(examples_dir=EXAMPLES_DIR):
+    """Yields (domain, problem) paths for every example shipped with the repo"""
+    for domain_file in sorted(glob.glob(os.path.join(examples_dir, '*', 'domain.pddl'))):
+        directory = os.path.dirname(domain_file)
+        for problem_file in sorted(glob.glob(os.path.join(directory, 'p*.pddl'))):
+            yield domain_file, problem_file
+
+
+def blocksworld_problem(n, seed=0):
+    """
+    Random blocksworld problem with n blocks, stacked into random towers
+    both in the initial state and in the goal
+    """
+    rng = random.Random(seed)
+    blocks = ['B%d' % i for i in range(n)]
+
+    def towers():
+        shuffled = blocks[:]
+        rng.shuffle(shuffled)
+        result = []
+        for block in shuffled:
+            if result and rng.random() < 0.6:
+                result[rng.randrange(len(result))].append(block)
+            else:
+                result.append([block])
+        return result
+
+    init = ['(HANDEMPTY)']
+    for tower in towers():
+        init.append('(ONTABLE %s)' % tower[0])
+        init.extend('(ON %s %s)' % (upper, lower) for lower, upper in zip(tower, tower[1:]))
+        init.append('(CLEAR %s)' % tower[-1])
+    goal = ['(ON %s %s)' % (upper, lower)
+            for tower in towers() for lower, upper in zip(tower, tower[1:])]
+    return ('(define (problem BLOCKS-%d-%d)\n(:domain BLOCKS)\n(:objects %s - block)\n'
+            '(:init %s)\n(:goal (and %s))\n)\n' % (n, seed, ' '.join(blocks), ' '.join(init), ' '.join(goal)))
+
+
+def gripper_problem(n):
+    """Gripper problem moving n balls from rooma to roomb"""
+    balls = ['ball%d' % i for i in range(1, n + 1)]
+    init = ['(at-robby rooma)', '(free left)', '(free right)'] + ['(at %s rooma)' % b for b in balls]
+    goal = ['(at %s roomb)' % b for b in balls]
+    return ('(define (problem gripper-x-%d)\n(:domain gripper-typed)\n(:requirements :typing)\n'
+            '(:objects rooma roomb - room %s - ball)\n(:init %s)\n(:goal (and %s)))\n'
+            % (n, ' '.join(balls), ' '.join(init), ' '.join(goal)))
+
+
+def generated_problems(directory, blocks=(), balls=(), seed=0):
+    """
+    Writes the generated problems into directory
+    :return: list of (domain, problem) paths, smallest first
+    """
+    pairs = []
+    for n in blocks:
+        path = os.path.join(directory, 'blocksworld-%d.pddl' % n)
+        with open(path, 'w') as f:
+            f.write(blocksworld_problem(n, seed))
+        pairs.append((os.path.join(EXAMPLES_DIR, 'blocksworld', 'domain.pddl'), path))
+    for n in balls:
+        path = os.path.join(directory, 'gripper-%d.pddl' % n)
+        with open(path, 'w') as f:
+            f.write(gripper_problem(n))
+        pairs.append((os.path.join(EXAMPLES_DIR, 'gripper', 'domain.pddl'), path))
+    return pairs
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Graphplan engine')
+    parser.add_argument('-o', '--output', help='JSON file to write, stdout if omitted')
+    parser.add_argument('--timeout', type=float, default=60, help='seconds per problem')
+    parser.add_argument('--blocks', type=int, nargs='*', default=[], help='generated blocksworld sizes')
+    parser.add_argument('--balls', type=int, nargs='*', default=[], help='generated gripper sizes')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the generated blocksworld problems')
+    parser.add_argument('--no-examples', action='store_true', help='skip the bundled examples')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc pass')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        pairs = [] if args.no_examples else list(bundled_problems())
+        pairs += generated_problems(directory, args.blocks, args.balls, args.seed)
+
+        results = []
+        for domain_file, problem_file in pairs:
+            # times come from a plain run, tracemalloc slows everything down
+            result = run_problem(domain_file, problem_file, args.timeout)
+            if not args.no_memory and result['status'] in ('solved', 'unsolvable'):
+                traced = run_problem(domain_file, problem_file, args.timeout, memory=True)
+                for name in PHASES:
+                    result['phases'][name]['peak_memory'] = traced.get('phases', {}).get(name, {}).get('peak_memory')
+            if problem_file.startswith(directory):
+                result['problem'] = os.path.basename(problem_file)
+            results.append(result)
+            print('%-60s %-10s %8.3fs' % (os.path.relpath(problem_file, EXAMPLES_DIR)
+                                          if not problem_file.startswith(directory) else result['problem'],
+                                          result['status'], result.get('wall_time', 0)), file=sys.stderr)
+
+    report = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'timeout': args.timeout,
+        'seed': args.seed,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == '__main__':
+    main()
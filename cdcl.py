@@ -0,0 +1,406 @@
+"""
+A conflict driven clause learning SAT solver.
+
+Clauses are added as lists of non zero ints, as in DIMACS: v for a variable
+and -v for its negation. The search is iterative, with two watched literals
+per clause, first UIP learning with clause minimization, VSIDS branching
+with phase saving, Luby restarts and deletion of learned clauses by their
+literal block distance. Variable activities live in a NumPy array, so the
+branching variable is picked and rescaled without a Python loop.
+
+Binary clauses, most of the clauses of planning encodings, are kept apart as
+implication lists and propagated without visiting a clause.
+
+The solver is incremental: clauses and variables can be added between calls
+to solve, learned clauses are kept, and solve takes assumptions, literals
+that hold for that call only.
+
+    solver = Solver()
+    a, b = solver.new_var(), solver.new_var()
+    solver.add_clause([a, b])
+    solver.add_clause([-a])
+    solver.solve()        # True, solver.value(b) is True
+    solver.solve([-b])    # False
+"""
+import time
+
+import numpy as np
+
+RESTART_BASE = 100
+# activities are rescaled past this, to stay within floats
+RESCALE_LIMIT = 1e100
+
+
+def luby(y, x):
+    """The x-th (from 0) term of the Luby sequence scaled by y: 1 1 2 1 1 2 4 ..."""
+    size, seq = 1, 0
+    while size < x + 1:
+        seq += 1
+        size = 2 * size + 1
+    while size - 1 != x:
+        size = (size - 1) >> 1
+        seq -= 1
+        x = x % size
+    return y ** seq
+
+
+class Solver:
+    """
+    Internally literals are 2 * v for v and 2 * v + 1 for -v, so a literal's
+    negation is lit ^ 1 and values, watches and the like are lists indexed by
+    literal or variable. Variable 0 is not used.
+    The reason of an implied variable is the index of its clause, ~lit if it
+    was implied by a binary clause with lit, now false, or -1 if it was not
+    implied.
+    """
+
+    def __init__(self, decay=0.95):
+        self.num_vars = 0
+        # per literal: 1 true, 0 false, -1 unassigned
+        self.values = [-1, -1]
+        self.watches = [[], []]
+        # literals implied when the literal gets false, by binary clauses
+        self.binary = [[], []]
+        # per variable
+        self.level = [0]
+        self.reason = [-1]
+        self.phase = [False]
+        self.seen = [False]
+        self.activity = np.zeros(64)
+        self.free = np.zeros(64, dtype=bool)
+
+        self.clauses = []
+        # learned clause index -> literal block distance
+        self.learnts = {}
+        self.max_learnts = 2000
+        self.trail = []
+        self.trail_lim = []
+        self.qhead = 0
+        self.increment = 1.0
+        self.decay = decay
+        self.ok = True
+        self.model = None
+
+        self.conflicts = 0
+        self.decisions = 0
+        self.propagations = 0
+
+    def new_var(self):
+        """Returns a new variable, a positive int"""
+        self.num_vars += 1
+        v = self.num_vars
+        self.values += (-1, -1)
+        self.watches += ([], [])
+        self.binary += ([], [])
+        self.level.append(0)
+        self.reason.append(-1)
+        self.phase.append(False)
+        self.seen.append(False)
+        if v >= len(self.activity):
+            capacity = 2 * len(self.activity)
+            activity = np.zeros(capacity)
+            activity[:v] = self.activity[:v]
+            free = np.zeros(capacity, dtype=bool)
+            free[:v] = self.free[:v]
+            self.activity, self.free = activity, free
+        self.free[v] = True
+        return v
+
+    def add_clause(self, literals):
+        """
+        Adds a clause, between calls to solve
+        :return: False if the clauses are now unsatisfiable
+        """
+        if not self.ok:
+            return False
+        self._cancel_until(0)
+        values = self.values
+        clause = []
+        for literal in set(literals):
+            lit = 2 * literal if literal > 0 else -2 * literal + 1
+            if values[lit] == 1 or lit ^ 1 in clause:
+                return True
+            if values[lit] == -1 and lit not in clause:
+                clause.append(lit)
+        if not clause:
+            self.ok = False
+        elif len(clause) == 1:
+            self._assign(clause[0], -1)
+            self.ok = self._propagate() is None
+        else:
+            self._attach(clause)
+        return self.ok
+
+    def value(self, v):
+        """The value of variable v in the last model found"""
+        return self.model[v]
+
+    @property
+    def num_clauses(self):
+        return len(self.clauses) - self.clauses.count(None)
+
+    def solve(self, assumptions=(), max_conflicts=None, deadline=None):
+        """
+        :param assumptions: literals assumed true for this call only
+        :param max_conflicts: conflicts allowed in this call, None for no limit
+        :param deadline: time.monotonic() to give up at, None for no limit
+        :return: True if satisfiable, with the model in self.model (a list of
+        bools indexed by variable), False if not, or None if the budget ran out
+        """
+        self.model = None
+        if not self.ok:
+            return False
+        assumptions = [2 * a if a > 0 else -2 * a + 1 for a in assumptions]
+        stop_at = None if max_conflicts is None else self.conflicts + max_conflicts
+        restarts = 0
+        while True:
+            result = self._search(luby(2, restarts) * RESTART_BASE, assumptions, stop_at, deadline)
+            restarts += 1
+            if result is not None:
+                self._cancel_until(0)
+                return result
+            self._cancel_until(0)
+            if ((stop_at is not None and self.conflicts >= stop_at) or
+                    (deadline is not None and time.monotonic() >= deadline)):
+                return None
+            if len(self.learnts) >= self.max_learnts:
+                self._reduce_learnts()
+
+    def _search(self, restart_after, assumptions, stop_at, deadline):
+        """Runs until a result, or None after restart_after conflicts or past the budget"""
+        values = self.values
+        trail_lim = self.trail_lim
+        conflicts = 0
+        while True:
+            conflict = self._propagate()
+            if conflict is not None:
+                self.conflicts += 1
+                conflicts += 1
+                if not trail_lim:
+                    self.ok = False
+                    return False
+                learnt, backtrack, lbd = self._analyze(conflict)
+                self._cancel_until(backtrack)
+                if len(learnt) == 1:
+                    self._assign(learnt[0], -1)
+                elif len(learnt) == 2:
+                    self._attach(learnt)
+                    self._assign(learnt[0], ~learnt[1])
+                else:
+                    self.learnts[len(self.clauses)] = lbd
+                    self._assign(learnt[0], self._attach(learnt))
+                self.increment /= self.decay
+                if conflicts >= restart_after or (stop_at is not None and self.conflicts >= stop_at):
+                    return None
+                if deadline is not None and not self.conflicts & 0xff and time.monotonic() >= deadline:
+                    return None
+                continue
+
+            decision = 0
+            while len(trail_lim) < len(assumptions):
+                lit = assumptions[len(trail_lim)]
+                if values[lit] == 1:
+                    # already holds, open an empty level to keep levels and assumptions aligned
+                    trail_lim.append(len(self.trail))
+                elif values[lit] == 0:
+                    return False
+                else:
+                    decision = lit
+                    break
+            if not decision:
+                decision = self._pick_branch()
+                if not decision:
+                    self.model = [values[2 * v] == 1 for v in range(self.num_vars + 1)]
+                    return True
+            self.decisions += 1
+            trail_lim.append(len(self.trail))
+            self._assign(decision, -1)
+
+    def _attach(self, clause):
+        """Adds a clause of two literals or more, returns its index or None if binary"""
+        if len(clause) == 2:
+            self.binary[clause[0]].append(clause[1])
+            self.binary[clause[1]].append(clause[0])
+            return None
+        index = len(self.clauses)
+        self.clauses.append(clause)
+        self.watches[clause[0]].append(index)
+        self.watches[clause[1]].append(index)
+        return index
+
+    def _assign(self, lit, reason):
+        self.values[lit] = 1
+        self.values[lit ^ 1] = 0
+        v = lit >> 1
+        self.level[v] = len(self.trail_lim)
+        self.reason[v] = reason
+        self.free[v] = False
+        self.trail.append(lit)
+
+    def _cancel_until(self, level):
+        if len(self.trail_lim) <= level:
+            return
+        start = self.trail_lim[level]
+        values, phase, reason = self.values, self.phase, self.reason
+        unassigned = self.trail[start:]
+        for lit in unassigned:
+            values[lit] = values[lit ^ 1] = -1
+            v = lit >> 1
+            phase[v] = not lit & 1
+            reason[v] = -1
+        self.free[np.fromiter((lit >> 1 for lit in unassigned), dtype=np.int64, count=len(unassigned))] = True
+        del self.trail[start:]
+        del self.trail_lim[level:]
+        self.qhead = len(self.trail)
+
+    def _propagate(self):
+        """Propagates the trail, returns a conflicting clause (list of literals) or None"""
+        values, watches, binary, clauses, trail = self.values, self.watches, self.binary, self.clauses, self.trail
+        level, reason, free = self.level, self.reason, self.free
+        while self.qhead < len(trail):
+            false_lit = trail[self.qhead] ^ 1
+            self.qhead += 1
+            self.propagations += 1
+            current = len(self.trail_lim)
+
+            for lit in binary[false_lit]:
+                value = values[lit]
+                if value == 1:
+                    continue
+                if value == 0:
+                    self.qhead = len(trail)
+                    return [lit, false_lit]
+                values[lit] = 1
+                values[lit ^ 1] = 0
+                v = lit >> 1
+                level[v] = current
+                reason[v] = ~false_lit
+                free[v] = False
+                trail.append(lit)
+
+            watching = watches[false_lit]
+            i = j = 0
+            end = len(watching)
+            while i < end:
+                index = watching[i]
+                i += 1
+                clause = clauses[index]
+                if clause is None:
+                    # deleted, drop the watch
+                    continue
+                if clause[0] == false_lit:
+                    clause[0], clause[1] = clause[1], false_lit
+                first = clause[0]
+                if values[first] == 1:
+                    watching[j] = index
+                    j += 1
+                    continue
+                for k in range(2, len(clause)):
+                    if values[clause[k]] != 0:
+                        clause[1], clause[k] = clause[k], false_lit
+                        watches[clause[1]].append(index)
+                        break
+                else:
+                    watching[j] = index
+                    j += 1
+                    if values[first] == 0:
+                        while i < end:
+                            watching[j] = watching[i]
+                            j += 1
+                            i += 1
+                        del watching[j:]
+                        self.qhead = len(trail)
+                        return clause
+                    values[first] = 1
+                    values[first ^ 1] = 0
+                    v = first >> 1
+                    level[v] = current
+                    reason[v] = index
+                    free[v] = False
+                    trail.append(first)
+            del watching[j:]
+        return None
+
+    def _reason(self, v):
+        """The clause that implied v, with v's literal first"""
+        r = self.reason[v]
+        if r >= 0:
+            return self.clauses[r]
+        lit = 2 * v if self.values[2 * v] == 1 else 2 * v + 1
+        return [lit, ~r]
+
+    def _analyze(self, conflict):
+        """
+        First UIP conflict analysis
+        :return: (learned clause with the asserting literal first and a literal
+        of the backtrack level second, backtrack level, literal block distance)
+        """
+        seen, level, reason, trail = self.seen, self.level, self.reason, self.trail
+        current = len(self.trail_lim)
+        learnt = [0]
+        pending = 0
+        index = len(trail) - 1
+        clause = conflict
+        start = 0
+        while True:
+            for k in range(start, len(clause)):
+                q = clause[k]
+                v = q >> 1
+                if not seen[v] and level[v] > 0:
+                    seen[v] = True
+                    self._bump(v)
+                    if level[v] >= current:
+                        pending += 1
+                    else:
+                        learnt.append(q)
+            while not seen[trail[index] >> 1]:
+                index -= 1
+            lit = trail[index]
+            index -= 1
+            seen[lit >> 1] = False
+            pending -= 1
+            if not pending:
+                break
+            # the implied literal is first in its reason
+            clause = self._reason(lit >> 1)
+            start = 1
+        learnt[0] = lit ^ 1
+
+        # drop the literals implied by the rest of the clause
+        minimized = [learnt[0]]
+        for q in learnt[1:]:
+            if reason[q >> 1] == -1 or any(not seen[x >> 1] and level[x >> 1] > 0
+                                           for x in self._reason(q >> 1)[1:]):
+                minimized.append(q)
+        for q in learnt[1:]:
+            seen[q >> 1] = False
+
+        if len(minimized) == 1:
+            return minimized, 0, 1
+        deepest = max(range(1, len(minimized)), key=lambda k: level[minimized[k] >> 1])
+        minimized[1], minimized[deepest] = minimized[deepest], minimized[1]
+        lbd = len(set(level[q >> 1] for q in minimized))
+        return minimized, level[minimized[1] >> 1], lbd
+
+    def _bump(self, v):
+        self.activity[v] += self.increment
+        if self.activity[v] > RESCALE_LIMIT:
+            self.activity *= 1 / RESCALE_LIMIT
+            self.increment /= RESCALE_LIMIT
+
+    def _pick_branch(self):
+        """The free variable of highest activity, in its saved phase, 0 if all are assigned"""
+        n = self.num_vars + 1
+        scores = np.where(self.free[:n], self.activity[:n], -1.0)
+        v = int(scores.argmax())
+        if scores[v] < 0:
+            return 0
+        return 2 * v if self.phase[v] else 2 * v + 1
+
+    def _reduce_learnts(self):
+        """At level 0, deletes the worse half of the learned clauses, keeping the glue ones"""
+        candidates = sorted((lbd, len(self.clauses[index]), index) for index, lbd in self.learnts.items() if lbd > 2)
+        for _, _, index in candidates[len(candidates) // 2:]:
+            self.clauses[index] = None
+            del self.learnts[index]
+        self.max_learnts = int(self.max_learnts * 1.1)
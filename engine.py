@@ -1,112 +1,19 @@
-import pddlpy
+import functools
+import itertools
+import os
+import time
+import numpy as np
+import pddl_reader
+import preprocess
+import snapshot
+from satplan import SATPlanner
 from aima3.planning import *
-import matplotlib.pyplot as plt
-import networkx as nx
+from forward import ForwardPlanner
+from heuristics import GroundTask
+# networkx and matplotlib are imported where the graph is drawn, so the
+# solver can run headless without paying for the plotting stack
 
 
-class MyGraphPlan:
-    """
-    Class for formulation GraphPlan algorithm
-    Constructs a graph of state and action space
-    Returns solution for the planning problem
-    """
-
-    def __init__(self, pddl, negkb):
-        self.graph = Graph(pddl, negkb)
-        self.nogoods = []
-        self.solution = []
-        self.pos = None
-
-    def check_leveloff(self):
-        first_check = (set(self.graph.levels[-1].current_state_pos) ==
-                       set(self.graph.levels[-2].current_state_pos))
-        second_check = (set(self.graph.levels[-1].current_state_neg) ==
-                        set(self.graph.levels[-2].current_state_neg))
-
-        if first_check and second_check:
-            return True
-
-    def extract_solution(self, goals_pos, goals_neg, index):
-        level = self.graph.levels[index]
-        if not self.graph.non_mutex_goals(goals_pos+goals_neg, index):
-            self.nogoods.append((level, goals_pos, goals_neg))
-            return False
-
-        level = self.graph.levels[index-1]
-
-        # Create all combinations of actions that satisfy the goal
-        actions = []
-        for goal in goals_pos:
-            actions.append(level.next_state_links_pos[goal])
-
-        for goal in goals_neg:
-            actions.append(level.next_state_links_neg[goal])
-
-        all_actions = list(itertools.product(*actions))
-
-        # Filter out the action combinations which contain mutexes
-        non_mutex_actions = []
-        for action_tuple in all_actions:
-            action_pairs = itertools.combinations(list(set(action_tuple)), 2)
-            non_mutex_actions.append(list(set(action_tuple)))
-            for pair in action_pairs:
-                if set(pair) in level.mutex:
-                    non_mutex_actions.pop(-1)
-                    break
-
-        if not non_mutex_actions:
-            return False
-
-        # Recursion
-        for action_list in non_mutex_actions:
-            if [action_list, index] not in self.solution:
-                self.solution.append([action_list, index])
-
-                new_goals_pos = []
-                new_goals_neg = []
-                for act in set(action_list):
-                    if act in level.current_action_links_pos:
-                        new_goals_pos = new_goals_pos + level.current_action_links_pos[act]
-
-                for act in set(action_list):
-                    if act in level.current_action_links_neg:
-                        new_goals_neg = new_goals_neg + level.current_action_links_neg[act]
-
-                if abs(index)+1 == len(self.graph.levels):
-                    if all(goal in self.graph.levels[0].current_state_pos for goal in new_goals_pos):
-                        return True
-                    else:
-                        return False
-                elif (level, new_goals_pos, new_goals_neg) in self.nogoods:
-                    return False
-                else:
-                    success = self.extract_solution(new_goals_pos, new_goals_neg, index-1)
-                    if success and index == -1:
-                        break
-                    elif success and index != -1:
-                        return True
-                    else:
-                        self.solution.pop()
-
-
-
-        if index == -1:
-            # Level-Order multiple solutions
-            solution = []
-            for item in self.solution:
-                if item[1] == -1:
-                    solution.append([])
-                    solution[-1].append(item[0])
-                else:
-                    solution[-1].append(item[0])
-
-            for num, item in enumerate(solution):
-                item.reverse()
-                solution[num] = item
-
-            return solution
-        return False
-
 class MyAction(Action):
     def __init__(self, action, precond, effect, obj):
         super().__init__(action, precond, effect)
@@ -115,87 +22,218 @@ class GraphPlanVis:
     def __init__(self):
         self.domprob = None
         self.pddl = None
-        self.negkb = FolKB([])
+        self.goals = []
+        self.negkb = IndexedFolKB([])
         self.graphplan = None
-        self.nx_graph = nx.DiGraph()
+        self.nx_graph = None
+        self._nx_source = None
+        self.view = None
+        self._view_source = None
+        self.pos = {}
+        # the columns (level, "action" or "state") drawn, and which nodes drawn are no-ops
+        self._columns = set()
+        self._drawn_no_ops = []
         self.is_ready = False
         self.draw_no_op = True
         self.draw_previous = True
         self.show_no_op_at_solution = False
+        self.planner = 'graphplan'
+        self.forward = None
+        self.sat = None
 
     def visualize(self, ax=None, draw_list=None, alpha=1, for_qt=True):
 
-        self.nx_graph = nx.DiGraph()
         self._create_nx_graph()
         self.draw_graph(ax=ax, draw_list=draw_list, alpha=alpha)
         if for_qt:
             return ax
         else:
+            import matplotlib.pyplot as plt
             plt.show()
 
-    def create_problem(self, domain_file_path, problem_file_path):
-
-        self.domprob = pddlpy.DomainProblem(domain_file_path, problem_file_path)
+    def create_problem(self, domain_file_path, problem_file_path, domains=None, cache=None, prune=True):
+        """
+        Parses a domain and problem and builds the first level of the graph
+        :param domains: optional DomainCache to reuse domains parsed before
+        :param cache: optional ProblemCache to load the compiled problem from,
+        which then decides on pruning
+        :param prune: prune the problem before building the graph, see compile_problem
+        """
+        if cache is not None:
+            compiled = cache.get(domain_file_path, problem_file_path, domains)
+        else:
+            compiled = compile_problem(domain_file_path, problem_file_path, domains, prune=prune)
 
-        self.pddl = to_pddl_aima_obj(self.domprob)
+        self.domprob = compiled.domprob
+        self.pddl = compiled.pddl
+        self.goals = compiled.goals
         # self.pddl = three_block_tower()
-        self.negkb = FolKB([])
-        self.graphplan = GraphPlan(self.pddl, self.negkb)
-        self.nx_graph = nx.DiGraph()
-        self.max_depth_checking = 5 # will expand at most n equal levels
+        self.negkb = IndexedFolKB([])
+        self.graphplan = GraphPlan(self.pddl, self.negkb, compiled.grounder)
+        self.forward = None
+        self.sat = None
+        self.nx_graph = None
+        self.max_depth_checking = None # if set, will expand at most n levels past the fixed point
         self.is_ready = True
 
 
 
+    def save_snapshot(self, path, compress=True):
+        """
+        Saves the planning graph as expanded so far, with its nogoods
+        :param path: file to write, see snapshot.py for the format
+        """
+        snapshot.save_snapshot(snapshot.Snapshot(self.graphplan, self.goals, self.max_depth_checking),
+                               path, compress)
+
+    def load_snapshot(self, path):
+        """
+        Replaces the problem with a graph saved by save_snapshot,
+        which can then be expanded and solved further
+        """
+        saved = snapshot.load_snapshot(path)
+        self.domprob = None
+        self.graphplan = saved.graphplan
+        self.pddl = saved.graphplan.graph.pddl
+        self.goals = saved.goals
+        self.negkb = IndexedFolKB([])
+        self.forward = None
+        self.sat = None
+        self.nx_graph = None
+        self.max_depth_checking = saved.max_depth_checking
+        self.is_ready = True
+
     def expand_level(self):
         self.graphplan.graph.expand_graph()
 
-    def solve(self, with_expanding=True):
+    def solve(self, with_expanding=True, max_nodes=None, timeout=None, planner=None):
+        """
+        Tries to extract a plan, expanding the graph as needed if with_expanding.
+        max_nodes bounds each extraction and timeout (seconds) the whole call.
+        Returns a Plan, [] if there is no solution, or None if the budget ran
+        out; solving again then resumes where it stopped.
+        Without a solution, expanding stops once the graph has leveled off and
+        an extraction finds no new nogood at the level-off level, or right at
+        the fixed point if the goals are missing or mutex there.
+        :param planner: self.planner if None. 'graphplan'; 'sat' to encode the
+        graph into SAT instead (see satplan.py), where max_nodes bounds the
+        conflicts per horizon; or 'greedy' or 'astar' to search forward from
+        the initial state (see forward.py), where max_nodes bounds the states
+        expanded and solving again starts over
+        """
+        planner = planner or self.planner
+        if planner == 'sat':
+            if self.sat is None:
+                graph = self.graphplan.graph
+                self.sat = SATPlanner(self.graphplan, graph.goal_ids(self.goals))
+            return self.sat.solve(with_expanding, max_nodes, timeout, self.max_depth_checking)
+        if planner != 'graphplan':
+            return self._solve_forward(planner, max_nodes, timeout)
+        deadline = None if timeout is None else time.monotonic() + timeout
 
         # [expr('On(A, B)'), expr('On(B, C)')]
-        goals_pos = [parse_pddl2expr(i) for i in list(self.domprob.goals())]
+        goals_pos = self.graphplan.graph.goal_ids(self.goals)
+        # negative goals are rejected when the problem is read
         goals_neg = []
+        graph = self.graphplan.graph
 
         while True:
-            self.graphplan.solution = []
-            if (self.pddl.goal_test_func(self.graphplan.graph.levels[-1].poskb)and
-                    self.graphplan.graph.non_mutex_goals(goals_pos + goals_neg, -1)):
-                solution = self.graphplan.extract_solution(goals_pos, goals_neg, -1)
+            if (self.pddl.goal_test_func(graph.levels[-1].poskb)and
+                    graph.non_mutex_goals(goals_pos, -1)):
+                if deadline is not None:
+                    timeout = max(0, deadline - time.monotonic())
+                solution = self.graphplan.extract_solution(goals_pos, goals_neg, -1,
+                                                           max_nodes=max_nodes, timeout=timeout)
+                if solution is None:
+                    return None
                 if solution:
                     break
-
+                if self.graphplan.exhausted():
+                    return []
+            elif graph.leveloff is not None:
+                # the goals will not show up, non mutex, in later levels either
+                return []
 
             if not with_expanding:
                 return []
+            if (self.max_depth_checking is not None and graph.leveloff is not None and
+                    len(graph.levels) - 1 - graph.leveloff >= self.max_depth_checking):
+                return []
 
-            self.graphplan.graph.expand_graph()
-            if len(self.graphplan.graph.levels) >= self.max_depth_checking:
-                    if self.graphplan.check_leveloff(depth=self.max_depth_checking):
-                        solution = []
-                        break
+            graph.expand_graph()
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
 
 
         return solution
 
-    def _create_nx_graph(self):
+    def _solve_forward(self, search, max_nodes=None, timeout=None):
+        if self.forward is None or self.forward.search != search:
+            graph = self.graphplan.graph
+            task = self.forward.task if self.forward is not None else GroundTask(graph.pddl, self.goals, graph.grounder)
+            self.forward = ForwardPlanner(task, search)
+        return self.forward.solve(max_nodes, timeout)
+
+    def stats(self):
         """
-        create a networkx graph for visualization
-        :param graphplan: an aima3 graphplan object
-        :return: networkx graph
+        Size of the planning graph and of the search so far
+        :return: dictionary of counters
         """
-        self.nx_graph = nx.DiGraph()
-        levels = self.graphplan.graph.levels
+        graphplan = self.graphplan
+        graph = graphplan.graph
+        return {
+            'levels': len(graph.levels) - 1,
+            'fluents': len(graph.symbols.fluents),
+            'ground_actions': len(graph.grounder.ground),
+            'action_mutexes': sum(len(level.mutex) for level in graph.levels),
+            'state_mutexes': sum(len(level.state_mutex) for level in graph.levels),
+            'nogoods': len(graphplan.nogoods),
+            'nogood_hits': graphplan.nogoods.hits,
+            'nogood_misses': graphplan.nogoods.misses,
+            'search_nodes': graphplan.search.nodes if graphplan.search else 0,
+            'expanded_states': self.forward.expanded if self.forward is not None else 0,
+            'sat_conflicts': self.sat.solver.conflicts if self.sat is not None else 0,
+        }
 
-        for i in range(len(levels)):
+    @staticmethod
+    def plan_steps(solution):
+        """
+        The actions of a plan as strings, step by step, without the no-ops
+        :param solution: Plan returned by solve
+        :return: list of lists of action names
+        """
+        return [[str(action) for action in actions if action.op != 'Persistence']
+                for actions in solution.actions]
+
+    def _create_nx_graph(self):
+        """
+        Brings the networkx graph up to date with the planning graph.
+        The networkx graph only grows: the levels already in it are skipped,
+        so the cost depends on the levels built since the last call. It is
+        made anew only for a new planning graph (a new problem, reset or a
+        loaded snapshot).
+        """
+        import networkx as nx
+        graph = self.graphplan.graph
+        if self.nx_graph is None or self._nx_source is not graph:
+            self.nx_graph = nx.DiGraph()
+            self._nx_source = graph
+            self._nx_levels = 0
+            # (level num, node type, id) -> node key, and (is action, id) -> label
+            self._node_keys = {}
+            self._display_names = {}
+        levels = graph.levels
+
+        for i in range(self._nx_levels, len(levels)):
             self._add_level_to_nx_graph(levels[i], i + 1)
+        # the last level has no actions until the next expansion, it is added again then
+        self._nx_levels = len(levels) - 1
 
     def _add_level_to_nx_graph(self, level, level_num):
         """
-
+        Adds the nodes and edges of a level, from the ids in its links
         :type level: Level
-        :param level: Layer object
-        :param nx_graph:
-        :return:
+        :param level_num: the index of the level plus one
         """
         # add current state nodes if they dont exist
         if level_num == 1:
@@ -223,116 +261,216 @@ class GraphPlanVis:
         for state, links in level.next_state_links_neg.items():
             self._create_nx_graph_links(state, "neg_state", links, "action", level_num)
 
-    def _create_nx_graph_links(self, node_name, node_type, links, links_type, level_num, **kwargs):
+    def _create_nx_graph_links(self, node_id, node_type, links, links_type, level_num):
         """
         Helper function to create the nx graph. Is used for transforming
         level.()_links_() to the nx_graph
-        :param node_name: name of the method for the node
+        :param node_id: SymbolTable id of the node
         :param node_type: type of the node ("action", "pos_state", "neg_state")
-        :param links: an array of links from the function
+        :param links: ids linked to the node
         :param links_type: their type
         :param level_num: the index of the level currently working on
-        :param kwargs: ?
         """
-        action_node_name = self._add_node(node_type, node_name, level_num)
+        action_node_name = self._add_node(node_type, node_id, level_num)
         if node_type == "action":
             level_num -= 1
 
+        nodes = self.nx_graph.nodes
         for link in links:
-            link_node_name = self._create_node_name(links_type, link, level_num)
-            if link_node_name not in self.nx_graph.nodes:
+            link_node_name = self._node_key(links_type, link, level_num)
+            if link_node_name not in nodes:
                 self._add_node(links_type, link, level_num)
-            self._add_edge(link_node_name, action_node_name, level_num)
+            self.nx_graph.add_edge(link_node_name, action_node_name)
 
-    def _add_node(self, node_type, state_name, level_num, **kwargs):
+    def _add_node(self, node_type, node_id, level_num):
         """
-        :param node_type:
-        :param state_name:
-        :param kwargs:
+        :param node_type: "action", "pos_state" or "neg_state"
+        :param node_id: SymbolTable id of the action or fluent
         :return: the hash name of the node
         """
-        node_name = self._create_node_name(node_type, state_name, level_num)
-        name_change = str(state_name).replace("Persistence","P")
-
-        self.nx_graph.add_node(node_name, name=state_name, node_type=node_type,
-                          level_num=level_num,display_name=name_change)
+        node_name = self._node_key(node_type, node_id, level_num)
+        if node_name not in self.nx_graph.nodes:
+            symbols = self._nx_source.symbols
+            name = symbols.actions[node_id] if node_type == "action" else symbols.fluents[node_id]
+            self.nx_graph.add_node(node_name, name=name, node_type=node_type, level_num=level_num,
+                                   display_name=self._display_name(node_type, node_id))
         return node_name
 
-    def _add_edge(self, node1, node2, level_num, **kwargs):
-        self.nx_graph.add_edge(node1, node2)
+    def _node_key(self, node_type, node_id, level_num):
+        """The key of a node in nx_graph, formatted once per node"""
+        key = (level_num, node_type, node_id)
+        node_name = self._node_keys.get(key)
+        if node_name is None:
+            node_name = self._node_keys[key] = \
+                f"{level_num}_{self._display_name(node_type, node_id)}_{node_type}"
+        return node_name
 
-    def _create_node_name(self, node_type, name, level_num):
-        name_change = str(name).replace("Persistence","P")
-        return f"{level_num}_{name_change}_{node_type}"
+    def _display_name(self, node_type, node_id):
+        kind = node_type == "action"
+        display_name = self._display_names.get((kind, node_id))
+        if display_name is None:
+            symbols = self._nx_source.symbols
+            name = symbols.actions[node_id] if kind else symbols.fluents[node_id]
+            display_name = self._display_names[(kind, node_id)] = str(name).replace("Persistence", "P")
+        return display_name
 
     def draw_graph(self, ax=None, draw_list=None, alpha=1, keep_old_layout=False):
-
-        if not draw_list:
-            draw_list = self.nx_graph.nodes.keys()
-        max_level = len(self.graphplan.graph.levels)
-
-        nodes_to_draw = [node for node in self.nx_graph.nodes
-                         if self.is_to_draw(self.nx_graph.nodes[node]) and node in draw_list]
-        edges_to_draw = [edge for edge in self.nx_graph.edges if edge[0] in nodes_to_draw and edge[1] in nodes_to_draw]
-        labels_to_draw = {node: self.nx_graph.nodes[node]["display_name"] for node in self.nx_graph.nodes
-                          if node in nodes_to_draw}
-        # iterate over nodes
+        """
+        Draws the graph through a GraphView (see graph_view.py). The levels
+        already drawn on ax keep their artists and positions, only the nodes
+        added to nx_graph since are laid out and drawn
+        :param draw_list: nodes to show, the others are hidden. All if None
+        :param alpha: alpha of the nodes shown
+        :param keep_old_layout: only restyle the graph already drawn, if any
+        """
+        if ax is None:
+            import matplotlib.pyplot as plt
+            ax = plt.gca()
+        if not keep_old_layout or not self._view_is_current(ax):
+            self._draw_view(ax)
+
+        view = self.view
+        visible = self._no_op_visibility()
+        if draw_list:
+            shown = np.zeros(len(visible), dtype=bool)
+            shown[view.indexes(draw_list)] = True
+            visible &= shown
+        view.set_visible(visible)
+        view.set_color()
+        view.set_alpha(alpha)
+        view.update()
+
+    def _view_is_current(self, ax):
+        return (self.view is not None and self.view.ax is ax and self.view.is_drawn() and
+                self._view_source is self._nx_source)
+
+    def _no_op_visibility(self):
+        if self.draw_no_op:
+            return np.ones(len(self._drawn_no_ops), dtype=bool)
+        return ~np.array(self._drawn_no_ops, dtype=bool)
+
+    def _draw_view(self, ax):
+        from graph_view import GraphView
+        nodes = self.nx_graph.nodes
+        redraw = not self._view_is_current(ax)
+        start = 0 if redraw else len(self.view.nodes)
+        new_nodes = list(itertools.islice(nodes, start, None))
+        if not redraw and not new_nodes:
+            return
+
+        # group the new nodes by level
         nodes_array = []
-        for node in self.nx_graph.nodes:
-            node_level = self.nx_graph.nodes[node]["level_num"]
+        for node in new_nodes:
+            data = nodes[node]
+            node_level = data["level_num"]
 
             # add new level when discovered
-            if len(nodes_array) <= node_level:
+            while len(nodes_array) <= node_level:
                 nodes_array.append({"action": [], "state": []})
-
-            # if node is to draw append it to the array
-            if node in nodes_to_draw:
-                if self.nx_graph.nodes[node]["node_type"] == "action":
-                    nodes_array[node_level]["action"].append(node)
-                else:
-                    nodes_array[node_level]["state"].append(node)
-
-        if not keep_old_layout:
-            pos = self.graphplan_layout(nodes_array, max_level)
+            nodes_array[node_level]["action" if data["node_type"] == "action" else "state"].append(node)
+
+        columns = [(level_index, node_type) for level_index in range(len(nodes_array))
+                   for node_type, column in nodes_array[level_index].items() if column]
+        if not redraw and any(column in self._columns for column in columns):
+            # a level drawn before got new nodes, the whole graph is laid out again
+            self.view.remove()
+            return self._draw_view(ax)
+
+        pos = self.graphplan_layout(nodes_array)
+        types = [nodes[node]["node_type"] for node in new_nodes]
+        labels = [nodes[node]["display_name"] for node in new_nodes]
+        no_ops = ["Persistence" in str(nodes[node]["name"]) for node in new_nodes]
+        if redraw:
             self.pos = pos
+            self._columns = set(columns)
+            self._drawn_no_ops = no_ops
+            self._view_source = self._nx_source
+            if self.view is None or self.view.ax is not ax:
+                self.view = GraphView(ax)
+            self.view.draw(new_nodes, types, pos, self.nx_graph.edges, labels)
         else:
-            pos = self.pos
-        # nx.draw_networkx_nodes(self.nx_graph, pos, nodes_to_draw)
-        self._draw_nx_nodes(nodes_array,pos, ax=ax, alpha=alpha)
-        nx.draw_networkx_edges(self.nx_graph, pos, edges_to_draw, ax=ax, alpha=alpha)
-        label_pos = {label:(posi[0],posi[1]+0.01) for label, posi in pos.items()}
-        nx.draw_networkx_labels(self.nx_graph, label_pos, labels=labels_to_draw,ax=ax, alpha=alpha)
-        # nx.draw(self.nx_graph, pos, node_size=300, node_color='#ffaaaa', with_labels=True)
-        # plt.show()
+            self.pos.update(pos)
+            self._columns.update(columns)
+            self._drawn_no_ops.extend(no_ops)
+            # the edges of the new nodes, each once
+            new = set(new_nodes)
+            edges = [(p, node) for node in new_nodes for p in self.nx_graph.pred[node]]
+            edges += [(node, s) for node in new_nodes for s in self.nx_graph.succ[node] if s not in new]
+            self.view.add(new_nodes, types, pos, edges, labels)
+
+    def highlight_nodes(self, nodes, color=None, alpha=1, others_alpha=None):
+        """
+        Restyles nodes of the graph drawn last, in place
+        :param color: new color of the nodes, None to keep theirs
+        :param others_alpha: if not None, the alpha of every other node
+        """
+        if self.view is None or not self.view.is_drawn():
+            return
+        if others_alpha is not None:
+            self.view.set_alpha(others_alpha)
+        self.view.set_alpha(alpha, nodes)
+        if color is not None:
+            self.view.set_color(color, nodes)
+        self.view.update()
+
+    def clear_highlights(self):
+        """Gives every node drawn back its color and full alpha"""
+        if self.view is None or not self.view.is_drawn():
+            return
+        self.view.set_color()
+        self.view.set_alpha(1)
+        self.view.update()
+
+    def update_no_op_visibility(self):
+        """Shows or hides the no-ops drawn, following draw_no_op, without redrawing"""
+        if self.view is None or not self.view.is_drawn():
+            return
+        self.view.set_visible(self._no_op_visibility())
+        self.view.update()
+
+    def node_at(self, x, y):
+        """The visible node drawn nearest to (x, y), None if nothing is drawn"""
+        if self.view is None or not self.view.is_drawn():
+            return None
+        return self.view.node_at(x, y)
 
     def get_solution_nx_nodes(self, solution):
         all_nodes_set = set()
-        reverse_nx = self.nx_graph.reverse()
+        if not solution:
+            return []
 
-        for level in range(len(solution[0])):
-            solution_level = solution[0][level]
+        action_ids = self._nx_source.symbols.action_ids
+        for level, solution_level in solution.steps:
             for action in solution_level:
 
                 # add actions
-                nx_graph_name = self._create_node_name("action", action, level+1)
+                nx_graph_name = self._node_key("action", action_ids[action], level+1)
+                if nx_graph_name not in self.nx_graph:
+                    continue
                 all_nodes_set.add(nx_graph_name)
 
                 # get everying connected to the action
-                all_nodes_set.update(nx.neighbors(self.nx_graph, nx_graph_name))
-                all_nodes_set.update(nx.neighbors(reverse_nx, nx_graph_name))
+                all_nodes_set.update(self.nx_graph.successors(nx_graph_name))
+                all_nodes_set.update(self.nx_graph.predecessors(nx_graph_name))
 
         return list(all_nodes_set)
 
 
     def get_nx_node_mutexes(self, ax, nx_node):
-        level = self.nx_graph.nodes[nx_node]["level_num"]
-        nx_nodes_options = [node for node in self.nx_graph.nodes.keys()
-                            if self.nx_graph.nodes[node]["node_type"] == "action" and
-                            self.nx_graph.nodes[node]["level_num"] == level]
+        node_data = self.nx_graph.nodes[nx_node]
+        if node_data["node_type"] != "action":
+            return []
+
+        level_num = node_data["level_num"]
+        current_level = self.graphplan.graph.levels[level_num-1]
+        action_ids = current_level.symbols.action_ids
+        if node_data["name"] not in action_ids:
+            return []
 
         mutexs = []
-        for nx_nodes_option in nx_nodes_options:
-            if self.is_nx_graph_mutex(nx_node, nx_nodes_option):
+        for mutex in current_level.mutex.mutex_with(action_ids[node_data["name"]]):
+            nx_nodes_option = self._node_key("action", mutex, level_num)
+            if nx_nodes_option in self.nx_graph.nodes:
                 mutexs.append(nx_nodes_option)
 
         return mutexs
@@ -346,37 +484,17 @@ class GraphPlanVis:
             return False
 
         current_level = self.graphplan.graph.levels[node_1_data["level_num"]-1]
+        action_ids = current_level.symbols.action_ids
+        if node_1_data["name"] not in action_ids or node_2_data["name"] not in action_ids:
+            return False
 
-        for mut in current_level.mutex:
-            if len(mut) != 2:
-                continue
-            mut = list(mut)
-
-            if ((node_1_data["name"] == mut[0] and node_2_data["name"] == mut[1]) or
-                (node_1_data["name"] == mut[1] and node_2_data["name"] == mut[0])):
-                return True
-
-        return False
-
-
-    def _draw_nx_nodes(self, nodes_array, pos, ax=None, alpha=1):
-        for node_array in nodes_array:
-
-            pos_state_nodes = [node for node in node_array["state"]
-                               if self.nx_graph.nodes[node]["node_type"] == "pos_state"]
-            neg_state_nodes = [node for node in node_array["state"]
-                               if self.nx_graph.nodes[node]["node_type"] == "neg_state"]
-
-            nx.draw_networkx_nodes(self.nx_graph, pos, pos_state_nodes,node_color="green",ax=ax,alpha=alpha)
-            nx.draw_networkx_nodes(self.nx_graph, pos, neg_state_nodes, node_color="red",ax=ax,alpha=alpha)
-
-            # draw action nodes
-            nx.draw_networkx_nodes(self.nx_graph, pos, node_array["action"],node_shape="s",ax=ax,alpha=alpha)
+        return current_level.mutex.is_mutex(action_ids[node_1_data["name"]], action_ids[node_2_data["name"]])
 
     @staticmethod
-    def graphplan_layout(nodes_array, max_level):
+    def graphplan_layout(nodes_array):
         """
-        create a graphplan positioning for the nodes
+        create a graphplan positioning for the nodes. Levels are one unit apart,
+        so the positions of a level do not depend on how many levels follow it
         :param nodes_array: an array of the form
         [
         {
@@ -384,7 +502,6 @@ class GraphPlanVis:
         "state":["node5", "node6", ...]
         },...
         ]
-        :param max_level the number of level in the graph
         :return: position dictionary like any networkx layout functions
         """
         pos = {}
@@ -395,31 +512,22 @@ class GraphPlanVis:
                     node = nodes[node_index]
 
                     if node_type == "action":
-                        pos[node] = ((level_index-0.5)/max_level, node_index/len(nodes_array[level_index][node_type]))
+                        pos[node] = (level_index-0.5, node_index/len(nodes_array[level_index][node_type]))
                     else:
-                        pos[node] = ((level_index)/max_level, node_index/len(nodes_array[level_index][node_type]))
+                        pos[node] = (level_index, node_index/len(nodes_array[level_index][node_type]))
 
         return pos
 
-    def format_solution(self, solution_array):
-        if not solution_array:
+    def format_solution(self, solution):
+        if solution is None:
+            return "The search ran out of time before finishing, solve again to resume it."
+        if not solution:
             return "No solution found!"
         solution_string = "Solution found and is of the following:\n"
-        level = 1
-        solution_array = solution_array[0]
-        for solution_level in solution_array:
-            solution_string += f"{level}:"
-            for action in solution_level:
-                if not self.show_no_op_at_solution:
-                    if "Persistence" in str(action):
-                        continue
-
-                solution_string += str(action)
-                solution_string += ", "
-            solution_string = solution_string[:-2]
-            solution_string += "\n"
-
-            level += 1
+        for level, solution_level in solution.steps:
+            actions = [str(action) for action in solution_level
+                       if self.show_no_op_at_solution or "Persistence" not in str(action)]
+            solution_string += f"{level + 1}:" + ", ".join(actions) + "\n"
 
         return solution_string
 
@@ -435,32 +543,151 @@ class GraphPlanVis:
         return True
 
 # ------parser-----------------------------------------------------------------------------------
-def to_pddl_aima_obj(domprob):
+def load_domain_problem(domain_file_path, problem_file_path, domain=None):
+    """
+    Parses a domain and problem with pddl_reader, falling back on pddlpy for
+    PDDL outside of the reader's subset
+    :param domain: already parsed pddl_reader Domain to use instead of the domain file
+    :return: pddl_reader or pddlpy DomainProblem
+    """
+    try:
+        return pddl_reader.DomainProblem(domain or domain_file_path, problem_file_path)
+    except pddl_reader.UnsupportedGoal:
+        raise
+    except pddl_reader.UnsupportedPDDL:
+        import pddlpy
+        return pddlpy.DomainProblem(domain_file_path, problem_file_path)
+
+
+class DomainCache:
+    """
+    Parsed domains and their aima3 actions by file, so solving many problems
+    of the same domain parses it only once. A domain is parsed again if its
+    file was modified.
+    """
+
+    def __init__(self):
+        self.domains = {}
+
+    def load(self, domain_file_path, problem_file_path):
+        """
+        :return: the DomainProblem and the list of aima3 actions
+        """
+        key = (os.path.abspath(domain_file_path), os.path.getmtime(domain_file_path))
+        if key not in self.domains:
+            domprob = load_domain_problem(domain_file_path, problem_file_path)
+            if not isinstance(domprob.domain, pddl_reader.Domain):
+                return domprob, None  # read by pddlpy, which cannot parse it separately
+            self.domains[key] = (domprob.domain, parse_pddl2actions(domprob))
+            return domprob, self.domains[key][1]
+        domain, actions = self.domains[key]
+        return load_domain_problem(domain_file_path, problem_file_path, domain), actions
+
+    def __len__(self):
+        return len(self.domains)
+
+
+class CompiledProblem:
+    """
+    What create_problem needs from a domain and problem file: the PDDL object,
+    the goal clauses and optionally a Grounder that already holds the ground
+    actions. domprob is None when it was loaded from a ProblemCache.
+    A pruned problem has no static facts left to ground its action schemas
+    with, so it can only be built into a graph with its grounder.
+    """
+
+    def __init__(self, pddl, goals, grounder=None, domprob=None):
+        self.pddl = pddl
+        self.goals = goals
+        self.grounder = grounder
+        self.domprob = domprob
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['domprob'] = None
+        return state
+
+
+def compile_problem(domain_file_path, problem_file_path, domains=None, ground=False, prune=True):
+    """
+    Parses and converts a domain and problem
+    :param domains: optional DomainCache to reuse domains parsed before
+    :param ground: also ground every action reachable from the initial state
+    :param prune: drop the static facts and the unreachable and irrelevant
+    actions (see preprocess.py), which grounds the problem too
+    :return: CompiledProblem
+    """
+    if domains is not None:
+        domprob, actions = domains.load(domain_file_path, problem_file_path)
+    else:
+        domprob, actions = load_domain_problem(domain_file_path, problem_file_path), None
+    pddl = to_pddl_aima_obj(domprob, actions)
+    if prune:
+        pruned = preprocess.prune(pddl, pddl.goal_test_func.required)
+        pddl = PDDL(pruned.init, pddl.actions, GoalTest(pruned.goals))
+        return CompiledProblem(pddl, pruned.goals, pruned.grounder, domprob)
+    grounder = ground_reachable(pddl) if ground else None
+    return CompiledProblem(pddl, pddl.goal_test_func.required, grounder, domprob)
+
+
+def ground_reachable(pddl):
+    """
+    Grounds every action reachable from the initial state, ignoring the delete
+    effects and negative preconditions
+    :return: Grounder whose SymbolTable and cache hold the ground actions,
+    for a GraphPlan of the same problem to start from
+    """
+    graph = Graph(pddl, IndexedFolKB([]))
+    graph.grounder.reachable(graph.levels[0].current_state_pos)
+    graph.grounder.reset()
+    return graph.grounder
+
+
+def to_pddl_aima_obj(domprob, actions=None):
     """
     create a PDDL object to insert to the GraphPlan object.
-    :param domprob:  pddlpy object outputted from DomainProblem
+    :param domprob:  DomainProblem from pddl_reader or pddlpy
+    :param actions: the domain's actions if already converted
     :return: PDDL object
     """
     # Creat init of plan
     inits = []
     for init in list(domprob.initialstate()):
         inits.append(parse_pddl2expr(init))
-    for obj_name, obj_type in domprob.domain.objects.items():
-        inits.append(parse_pddl2expr((obj_type,obj_name)))
-    for obj_name, obj_type in domprob.problem.objects.items():
-        inits.append(parse_pddl2expr((obj_type,obj_name)))
+    # an object is of its declared type and of every supertype of it
+    supertypes = getattr(domprob.domain, 'types', None) or {}
+    for objects in (domprob.domain.objects, domprob.problem.objects):
+        for obj_name, obj_type in objects.items():
+            seen = set()
+            while obj_type is not None and obj_type not in seen:
+                seen.add(obj_type)
+                inits.append(parse_pddl2expr((obj_type, obj_name)))
+                obj_type = supertypes.get(obj_type)
+
+    required = [parse_pddl2expr(q) for q in domprob.goals()]
+
+    if actions is None:
+        actions = parse_pddl2actions(domprob)
+    return PDDL(inits, actions, GoalTest(required))
+    # Create the actions
+
 
-    def goal_test(kb):
-        required = [expr(i) for i in list(domprob.goals())]
+class GoalTest:
+    """
+    Goal test of the PDDL objects, true if the kb holds every required clause.
+    A class rather than a closure so compiled problems can be pickled.
+    """
+
+    def __init__(self, required):
         # required = [expr('on(a, b)'), expr('on(b, c)')]
-        return all([parse_pddl2expr(q) in kb.clauses for q in required])
+        self.required = required
 
-    return PDDL(inits, parse_pddl2actions(domprob), goal_test)
-    # Create the actions
+    def __call__(self, kb):
+        return all(q in kb for q in self.required)
 
 def parse_pddl2actions(domprob):
     """
-    from pddlpy object return a list of Action classes from aima3
+    from a DomainProblem return a list of Action classes from aima3
     :param domprob:
     :return:
     """
@@ -468,7 +695,8 @@ def parse_pddl2actions(domprob):
     for operator_name, operator in domprob.domain.operators.items():
 
         precond_pos = [parse_pddl2expr(i) for i in operator.precondition_pos]
-        precond_pos += [parse_pddl2expr((obj_type,obj_name)) for obj_name, obj_type in operator.variable_list.items()]
+        precond_pos += [parse_pddl2expr((obj_type,obj_name)) for obj_name, obj_type in operator.variable_list.items()
+                        if obj_type is not None]
         precond_neg = [parse_pddl2expr(i) for i in operator.precondition_neg]
         effect_add = [parse_pddl2expr(i) for i in operator.effect_pos]
         effect_rem = [parse_pddl2expr(i) for i in operator.effect_neg]
@@ -481,33 +709,29 @@ def parse_pddl2actions(domprob):
 
 def parse_pddl2expr(pddl_atom):
     """
-
-    :param pddl_tuple: given a tuple of the form ("name", "value","value2)
-                       will return aima3 expr() of the tuple
+    Converts a pddl atom to an aima3 Expr, without going through eval
+    :param pddl_atom: pddlpy Atom or tuple of the form ("name", "value", "value2"),
+                      will return the Expr name(value, value2)
     :return:
     """
-    pddl_list = list(eval(string_handler(pddl_atom)))
-    expresion = str(pddl_list.pop(0))
-    expresion += parse_list(pddl_list)
-    return expr(expresion)
+    pddl_atom = getattr(pddl_atom, 'predicate', pddl_atom)
+    return _tuple2expr(tuple(pddl_atom))
 
-def parse_action_name(operator):
 
+@functools.lru_cache(maxsize=1 << 16)
+def _tuple2expr(pddl_tuple):
+    # the same atoms come back for every problem of a domain, so the Exprs are
+    # cached on the raw tuple and shared
+    return Expr(string_handler(pddl_tuple[0]), *[Expr(string_handler(arg)) for arg in pddl_tuple[1:]])
 
-    expresion = string_handler(operator.operator_name)
-    expresion += parse_list(list(operator.variable_list.keys()))
-    return expr(expresion)
 
-def parse_list(value_list):
-    expresion = "("
-    for word in value_list:
-        expresion += string_handler(word)
-        expresion += ", " if word != value_list[-1] else ""
+def parse_action_name(operator):
+    return Expr(string_handler(operator.operator_name),
+                *[Expr(string_handler(variable)) for variable in operator.variable_list])
 
-    expresion += ")"
-    return expresion
 
 def string_handler(string_type_object):
+    """Sanitizes a pddl name, dropping - and ? and lowering the case"""
     string_type_object = str(string_type_object)
     string_type_object = string_type_object.replace("-", "")
     string_type_object = string_type_object.replace("?", "")
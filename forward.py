@@ -0,0 +1,94 @@
+"""
+Forward state space planning, an alternative to extracting plans from the
+planning graph.
+
+The problem is grounded once into a heuristics.GroundTask, whose states are
+frozensets of fluent ids, and searched from the initial state with greedy best
+first search or A* from aima3.search, guided by the relaxed planning graph
+heuristics. Duplicate states are detected by the explored set and the
+frontier of the search, both hashed on the state. This scales to problems
+where Graphplan's backward search explodes, at the cost of plans that are
+sequential and, with greedy search, not the shortest.
+
+    planner = ForwardPlanner(GroundTask(pddl, goals, grounder))
+    plan = planner.solve(timeout=60)
+"""
+import time
+
+from aima3.search import astar_search, best_first_graph_search
+from heuristics import PlanningProblem
+
+SEARCHES = ('greedy', 'astar')
+# A* only finds the shortest plans with an admissible heuristic
+DEFAULT_HEURISTICS = {'greedy': 'add', 'astar': 'max'}
+
+
+class SearchLimit(Exception):
+    """The node or time budget of a search ran out"""
+    pass
+
+
+class BoundedProblem(PlanningProblem):
+    """
+    PlanningProblem counting the states expanded, which raises SearchLimit
+    past max_nodes of them or after deadline (a time.monotonic() value)
+    """
+
+    def __init__(self, task, heuristic='add', rpg=None, max_nodes=None, deadline=None):
+        super().__init__(task, heuristic, rpg)
+        self.max_nodes = max_nodes
+        self.deadline = deadline
+        self.expanded = 0
+
+    def actions(self, state):
+        self.expanded += 1
+        if self.max_nodes is not None and self.expanded > self.max_nodes:
+            raise SearchLimit()
+        # the clock is read every 256 expansions only
+        if self.deadline is not None and not self.expanded & 0xff and time.monotonic() >= self.deadline:
+            raise SearchLimit()
+        return super().actions(state)
+
+
+class ForwardPlanner:
+    """
+    :param task: GroundTask of the problem
+    :param search: 'greedy' for greedy best first search on h, 'astar' for A*
+    :param heuristic: 'add', 'max' or 'set_level', see heuristics.py, or
+    None for DEFAULT_HEURISTICS[search]. A* finds the shortest plans with the
+    admissible 'max' and 'set_level'
+    """
+
+    def __init__(self, task, search='greedy', heuristic=None):
+        if search not in SEARCHES:
+            raise ValueError('search must be one of %s, not %r' % (', '.join(SEARCHES), search))
+        self.task = task
+        self.search = search
+        self.heuristic = heuristic or DEFAULT_HEURISTICS[search]
+        self.problem = None
+
+    @property
+    def expanded(self):
+        return self.problem.expanded if self.problem is not None else 0
+
+    def solve(self, max_nodes=None, timeout=None):
+        """
+        Searches from the initial state, from scratch on every call
+        :param max_nodes: states to expand at most, None for no limit
+        :param timeout: seconds, None for no limit
+        :return: a Plan of one action per step, [] if there is no solution,
+        or None if the budget ran out
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        rpg = self.problem.rpg if self.problem is not None else None
+        problem = self.problem = BoundedProblem(self.task, self.heuristic, rpg, max_nodes, deadline)
+        try:
+            if self.search == 'astar':
+                node = astar_search(problem)
+            else:
+                node = best_first_graph_search(problem, problem.h)
+        except SearchLimit:
+            return None
+        if node is None:
+            return []
+        return problem.plan(node)
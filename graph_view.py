@@ -0,0 +1,413 @@
+"""
+Matplotlib rendering of the planning graph.
+
+All the nodes of a type are one PathCollection and all the edges are one
+LineCollection, built from NumPy coordinate arrays, so the canvas holds a
+handful of artists (and the labels) however large the graph gets.
+Highlights, alphas and hidden nodes are per node arrays pushed into the
+existing artists by update, without clearing the axes. A new level is
+appended to them by add, leaving the nodes already drawn in place. Clicks are
+mapped to nodes through a GridIndex of the layout, built again on the first
+click after nodes were added.
+
+update also keeps the artists down to what can be seen. It runs again
+whenever the limits of the axes change (zoom and pan of the navigation
+toolbar) or the figure is resized, and
+* only hands the nodes and edges inside the view to the collections,
+* only shows the labels of nodes at least LABEL_MIN_PIXELS apart from their
+  neighbours, creating the label artists when first shown,
+* collapses the nodes of a type in a level into one glyph labeled with their
+  count once they get closer than AGGREGATE_PIXELS.
+
+    view = GraphView(ax)
+    view.draw(nodes, node_types, pos, edges, labels)
+    view.set_alpha(0.2)
+    view.set_alpha(1, solution_nodes)
+    view.update()
+"""
+import numpy as np
+from matplotlib.collections import LineCollection
+from matplotlib.colors import to_rgba, to_rgba_array
+
+# marker and color of each node type, as networkx drew them
+NODE_STYLES = {
+    "pos_state": ("o", "green"),
+    "neg_state": ("o", "red"),
+    "action": ("s", "#1f78b4"),
+}
+NODE_SIZE = 300
+EDGE_COLOR = "black"
+FONT_SIZE = 12
+# labels sit this much above their node
+LABEL_OFFSET = 0.01
+# smallest gap, in pixels, between the nodes of a level that still get labels
+LABEL_MIN_PIXELS = FONT_SIZE
+# below this gap in pixels, the nodes of a level are drawn as one glyph
+AGGREGATE_PIXELS = 3
+AGGREGATE_SIZE = 400
+# part of the view added on every side when culling, so nodes on the border are whole
+VIEW_MARGIN = 0.05
+
+
+class GridIndex:
+    """
+    Uniform grid over points, for nearest point queries that look at a few
+    cells around the query instead of every point
+    :param points: array of shape (n, 2)
+    """
+
+    def __init__(self, points):
+        self.points = points = np.asarray(points, dtype=float).reshape(-1, 2)
+        n = len(points)
+        # about one point per cell
+        side = max(1, int(np.ceil(np.sqrt(n))))
+        self.shape = (side, side)
+        if n:
+            self.low = points.min(axis=0)
+            extent = points.max(axis=0) - self.low
+        else:
+            self.low = np.zeros(2)
+            extent = np.zeros(2)
+        self.cell = np.where(extent > 0, extent / side, 1.0)
+
+        cells = self._cells(points)
+        flat = cells[:, 0] * side + cells[:, 1]
+        # the points of cell c are order[start[c]:start[c + 1]]
+        self.order = np.argsort(flat, kind="stable")
+        self.start = np.searchsorted(flat[self.order], np.arange(side * side + 1))
+
+    def _cells(self, points):
+        cells = np.floor((points - self.low) / self.cell).astype(np.intp)
+        return np.clip(cells, 0, np.array(self.shape) - 1)
+
+    def nearest(self, x, y, mask=None):
+        """
+        :param mask: optional bool array, only the points it is True for count
+        :return: index of the point nearest to (x, y), or None if there is none
+        """
+        query = np.array([x, y], dtype=float)
+        cx, cy = self._cells(query[None])[0]
+        side = self.shape[0]
+        best, best_distance = None, np.inf
+        for radius in range(side):
+            candidates = []
+            for i in range(max(cx - radius, 0), min(cx + radius, side - 1) + 1):
+                ring = range(max(cy - radius, 0), min(cy + radius, side - 1) + 1)
+                if abs(i - cx) != radius:
+                    # inner columns only have the two cells at the top and bottom of the ring
+                    ring = [j for j in (cy - radius, cy + radius) if 0 <= j < side]
+                for j in ring:
+                    c = i * side + j
+                    candidates.append(self.order[self.start[c]:self.start[c + 1]])
+            if candidates:
+                candidates = np.concatenate(candidates)
+                if mask is not None:
+                    candidates = candidates[mask[candidates]]
+                if len(candidates):
+                    distances = ((self.points[candidates] - query) ** 2).sum(axis=1)
+                    k = distances.argmin()
+                    if distances[k] < best_distance:
+                        best, best_distance = int(candidates[k]), distances[k]
+            # points in cells farther than the ring are at least this far
+            if best is not None and np.sqrt(best_distance) <= radius * self.cell.min():
+                break
+        return best
+
+
+class GraphView:
+    """
+    :param ax: the matplotlib axes to draw on
+    """
+
+    def __init__(self, ax):
+        self.ax = ax
+        self.nodes = []
+        self.index = {}
+        self.collections = []
+        self.edge_collection = None
+        self.aggregate_collection = None
+        self.texts = []
+        self.aggregate_texts = []
+        self.grid = None
+        self._callbacks = []
+
+    def draw(self, nodes, node_types, pos, edges, labels):
+        """
+        Replaces what the view drew before with a new graph, see add for the
+        parameters
+        """
+        self.remove()
+        ax = self.ax
+        self.nodes = []
+        self.index = {}
+        self.positions = np.zeros((0, 2))
+        self.labels = []
+        self.base_colors = np.zeros((0, 4))
+        self.colors = np.zeros((0, 4))
+        self.alphas = np.ones(0)
+        self.visible = np.ones(0, dtype=bool)
+        # visible and not collapsed, as of the last update
+        self.shown = np.ones(0, dtype=bool)
+        # created by update when first shown
+        self.texts = []
+        self.label_shown = np.zeros(0, dtype=bool)
+        self.label_alphas = np.ones(0)
+
+        self.collections = []
+        for node_type, (marker, color) in NODE_STYLES.items():
+            collection = ax.scatter(np.zeros(0), np.zeros(0), s=NODE_SIZE, marker=marker, zorder=2)
+            self.collections.append([collection, np.zeros(0, dtype=np.intp)])
+        self.edges = np.zeros((0, 2), dtype=np.intp)
+        self.edge_collection = LineCollection([], colors=EDGE_COLOR, linewidths=1.0, zorder=1)
+        ax.add_collection(self.edge_collection)
+        self.edge_rgba = to_rgba_array(EDGE_COLOR)
+
+        # the nodes of a level and type, which collapse into one glyph
+        self.groups = {}
+        self.group = np.zeros(0, dtype=np.intp)
+        self.group_sizes = np.zeros(0, dtype=np.intp)
+        self.group_positions = np.zeros((0, 2))
+        self.group_low = np.zeros(0)
+        self.group_high = np.zeros(0)
+        self.group_gaps = np.zeros(0)
+        self.group_colors = np.zeros((0, 4))
+        self.aggregate_collection = ax.scatter(np.zeros(0), np.zeros(0), s=AGGREGATE_SIZE, marker="D", zorder=2)
+        self.aggregate_texts = []
+
+        ax.tick_params(axis="both", which="both", bottom=False, left=False, labelbottom=False, labelleft=False)
+        self._callbacks = [
+            (ax.callbacks.disconnect, ax.callbacks.connect("xlim_changed", self._on_view_change)),
+            (ax.callbacks.disconnect, ax.callbacks.connect("ylim_changed", self._on_view_change)),
+            (ax.figure.canvas.mpl_disconnect, ax.figure.canvas.mpl_connect("resize_event", self._on_view_change)),
+        ]
+        self.add(nodes, node_types, pos, edges, labels)
+
+    def add(self, nodes, node_types, pos, edges, labels):
+        """
+        Adds nodes to the graph drawn, such as the ones of a new level. Only
+        the new nodes are looked at, the ones already drawn keep their place.
+        :param nodes: new node keys, in drawing order
+        :param node_types: the type of every new node, a key of NODE_STYLES
+        :param pos: dictionary from node key to (x, y), for the new nodes at least
+        :param edges: pairs of node keys, the new edges. Edges between nodes
+        that are not drawn are skipped
+        :param labels: the label of every new node
+        """
+        start = len(self.nodes)
+        nodes = list(nodes)
+        n = len(nodes)
+        index = self.index
+        for i, node in enumerate(nodes, start):
+            index[node] = i
+        self.nodes.extend(nodes)
+        positions = np.array([pos[node] for node in nodes], dtype=float).reshape(n, 2)
+        self.positions = np.concatenate([self.positions, positions])
+        self.labels.extend(labels)
+        types = np.array(node_types, dtype=object)
+
+        base_colors = np.zeros((n, 4))
+        for entry, (node_type, (marker, color)) in zip(self.collections, NODE_STYLES.items()):
+            members = np.flatnonzero(types == node_type)
+            base_colors[members] = to_rgba(color)
+            entry[1] = np.concatenate([entry[1], members + start])
+        self.base_colors = np.concatenate([self.base_colors, base_colors])
+        self.colors = np.concatenate([self.colors, base_colors])
+        self.alphas = np.concatenate([self.alphas, np.ones(n)])
+        self.visible = np.concatenate([self.visible, np.ones(n, dtype=bool)])
+        self.shown = np.concatenate([self.shown, np.zeros(n, dtype=bool)])
+        self.texts.extend([None] * n)
+        self.label_shown = np.concatenate([self.label_shown, np.zeros(n, dtype=bool)])
+        self.label_alphas = np.concatenate([self.label_alphas, np.ones(n)])
+
+        edges = np.array([(index[a], index[b]) for a, b in edges if a in index and b in index],
+                         dtype=np.intp).reshape(-1, 2)
+        self.edges = np.concatenate([self.edges, edges])
+        self._group_levels(positions, types, start)
+        # built again by node_at when needed
+        self.grid = None
+
+        if n:
+            self.ax.update_datalim(positions)
+            self.ax.autoscale_view()
+
+    def _group_levels(self, positions, types, start):
+        """
+        Adds new nodes to the groups of their level (x position) and type, the
+        glyphs they collapse into, and records the gap between the nodes of
+        every group
+        """
+        groups = self.groups
+        old = len(groups)
+        group = np.array([groups.setdefault((x, t), len(groups)) for x, t in zip(positions[:, 0], types)],
+                         dtype=np.intp)
+        self.group = np.concatenate([self.group, group])
+        g = len(groups)
+        added = g - old
+        if added:
+            keys = list(groups)[old:]
+            self.group_sizes = np.concatenate([self.group_sizes, np.zeros(added, dtype=np.intp)])
+            self.group_positions = np.concatenate([self.group_positions, np.zeros((added, 2))])
+            self.group_positions[old:, 0] = [x for x, _ in keys]
+            self.group_low = np.concatenate([self.group_low, np.full(added, np.inf)])
+            self.group_high = np.concatenate([self.group_high, np.full(added, -np.inf)])
+            self.group_colors = np.concatenate([self.group_colors,
+                                                np.array([to_rgba(NODE_STYLES[t][1]) for _, t in keys])])
+            self.aggregate_texts.extend(self.ax.text(x, 0, "", size=FONT_SIZE, ha="center", va="center",
+                                                     clip_on=True, zorder=3, visible=False)
+                                        for x, _ in keys)
+
+        # the y of a group is the middle of its nodes
+        sums = self.group_positions[:, 1] * self.group_sizes
+        np.add.at(sums, group, positions[:, 1])
+        np.add.at(self.group_sizes, group, 1)
+        self.group_positions[:, 1] = sums / np.maximum(self.group_sizes, 1)
+        np.minimum.at(self.group_low, group, positions[:, 1])
+        np.maximum.at(self.group_high, group, positions[:, 1])
+        # a single node is never collapsed
+        self.group_gaps = np.where(self.group_sizes > 1,
+                                   (self.group_high - self.group_low) / np.maximum(self.group_sizes - 1, 1), np.inf)
+        for i in np.unique(group):
+            self.aggregate_texts[i].set_y(self.group_positions[i, 1])
+
+    def _on_view_change(self, *args):
+        if self.is_drawn():
+            self.update()
+
+    def is_drawn(self):
+        """False once the axes were cleared or nothing was drawn yet"""
+        return self.edge_collection is not None and self.edge_collection.axes is self.ax
+
+    def remove(self):
+        """Removes the artists of the view from the axes, if still there"""
+        for disconnect, cid in self._callbacks:
+            disconnect(cid)
+        self._callbacks = []
+        if self.is_drawn():
+            for collection, _ in self.collections:
+                collection.remove()
+            self.edge_collection.remove()
+            self.aggregate_collection.remove()
+            for text in self.texts + self.aggregate_texts:
+                if text is not None:
+                    text.remove()
+        self.collections = []
+        self.edge_collection = None
+        self.aggregate_collection = None
+        self.texts = []
+        self.aggregate_texts = []
+
+    def indexes(self, nodes=None):
+        """Positions of the given node keys in the view, all of them if None"""
+        if nodes is None:
+            return slice(None)
+        index = self.index
+        return np.array([index[node] for node in nodes if node in index], dtype=np.intp)
+
+    def node_at(self, x, y):
+        """
+        The node drawn on its own nearest to (x, y) in data coordinates, as of
+        the last update. None if there is none
+        """
+        if not self.nodes:
+            return None
+        if self.grid is None:
+            self.grid = GridIndex(self.positions)
+        # nodes collapsed into a level glyph are not drawn on their own
+        i = self.grid.nearest(x, y, self.shown)
+        return None if i is None else self.nodes[i]
+
+    def set_alpha(self, alpha, nodes=None):
+        self.alphas[self.indexes(nodes)] = alpha
+
+    def set_color(self, color=None, nodes=None):
+        """Colors the nodes, or gives them back their own color if color is None"""
+        members = self.indexes(nodes)
+        if color is None:
+            self.colors[members] = self.base_colors[members]
+        else:
+            self.colors[members] = to_rgba(color)
+
+    def set_visible(self, visible):
+        """
+        :param visible: a bool for every node of the view, in its order. An
+        edge is drawn only if both its nodes are
+        """
+        self.visible[:] = visible
+
+    def _view_bounds(self):
+        (x0, y0), (x1, y1) = self.ax.viewLim.get_points()
+        dx, dy = (x1 - x0) * VIEW_MARGIN, (y1 - y0) * VIEW_MARGIN
+        return min(x0, x1) - abs(dx), max(x0, x1) + abs(dx), min(y0, y1) - abs(dy), max(y0, y1) + abs(dy)
+
+    def update(self):
+        """Pushes the colors, alphas and visibility of what is in view into the artists"""
+        bounds = x0, x1, y0, y1 = self._view_bounds()
+        px, py = self.positions[:, 0], self.positions[:, 1]
+        in_view = (px >= x0) & (px <= x1) & (py >= y0) & (py <= y1)
+
+        # gaps between the nodes of every level, in pixels
+        corners = self.ax.transData.transform([(0, 0), (0, 1)])
+        pixels_per_y = abs(corners[1, 1] - corners[0, 1])
+        group_pixels = self.group_gaps * pixels_per_y
+        collapsed = (group_pixels < AGGREGATE_PIXELS)[self.group]
+        shown = self.shown = self.visible & ~collapsed
+        drawn = shown & in_view
+
+        rgba = self.colors.copy()
+        rgba[:, 3] *= self.alphas
+        for collection, members in self.collections:
+            members = members[drawn[members]]
+            collection.set_offsets(self.positions[members].reshape(-1, 2))
+            collection.set_facecolor(rgba[members])
+            collection.set_edgecolor(rgba[members])
+
+        if len(self.edges):
+            a, b = self.edges[:, 0], self.edges[:, 1]
+            # an edge is in view if its bounding box meets the view
+            edges = self.edges[shown[a] & shown[b] &
+                               (np.minimum(px[a], px[b]) <= x1) & (np.maximum(px[a], px[b]) >= x0) &
+                               (np.minimum(py[a], py[b]) <= y1) & (np.maximum(py[a], py[b]) >= y0)]
+            edge_colors = np.repeat(self.edge_rgba, len(edges), axis=0)
+            edge_colors[:, 3] *= np.minimum(self.alphas[edges[:, 0]], self.alphas[edges[:, 1]])
+            self.edge_collection.set_segments(self.positions[edges])
+            self.edge_collection.set_color(edge_colors)
+
+        self._update_aggregates(collapsed, bounds)
+        self._update_labels(drawn & (group_pixels >= LABEL_MIN_PIXELS)[self.group])
+
+    def _update_aggregates(self, collapsed, bounds):
+        g = len(self.group_sizes)
+        members = self.visible & collapsed
+        counts = np.bincount(self.group[members], minlength=g)
+        alphas = np.zeros(g)
+        np.maximum.at(alphas, self.group[members], self.alphas[members])
+        x0, x1, y0, y1 = bounds
+        gx, gy = self.group_positions[:, 0], self.group_positions[:, 1]
+        drawn = np.flatnonzero((counts > 0) & (gx >= x0) & (gx <= x1) & (gy >= y0) & (gy <= y1))
+
+        rgba = self.group_colors[drawn].copy()
+        rgba[:, 3] *= alphas[drawn]
+        self.aggregate_collection.set_offsets(self.group_positions[drawn].reshape(-1, 2))
+        self.aggregate_collection.set_facecolor(rgba)
+        self.aggregate_collection.set_edgecolor(rgba)
+        drawn = set(drawn.tolist())
+        for i, text in enumerate(self.aggregate_texts):
+            if i in drawn:
+                text.set_text(str(counts[i]))
+                text.set_alpha(alphas[i])
+            text.set_visible(i in drawn)
+
+    def _update_labels(self, labeled):
+        """Shows the labels of the labeled nodes, only touching the ones that changed"""
+        for i in np.flatnonzero((labeled != self.label_shown) | (labeled & (self.alphas != self.label_alphas))):
+            text = self.texts[i]
+            if text is None:
+                if not labeled[i]:
+                    continue
+                x, y = self.positions[i]
+                text = self.texts[i] = self.ax.text(x, y + LABEL_OFFSET, self.labels[i], size=FONT_SIZE,
+                                                    ha="center", va="center", clip_on=True, zorder=3)
+            text.set_alpha(self.alphas[i])
+            text.set_visible(bool(labeled[i]))
+        self.label_shown = labeled.copy()
+        self.label_alphas = self.alphas.copy()
@@ -0,0 +1,263 @@
+"""
+Headless command line front end for the Graphplan engine.
+
+    python -m graphplan solve domain.pddl problem*.pddl
+    python -m graphplan solve domain.pddl @problems.txt --timeout 30 --memory 2048
+    find suite -name 'p*.pddl' | python -m graphplan solve domain.pddl - --jobs 0
+
+Every problem is reported as a single JSON line on stdout as soon as it
+finishes. Problems are solved in this process one after the other, or over a
+pool of --jobs processes (see batch.py). Neither Qt nor matplotlib is
+imported. The exit status is 0 when every problem was solved or proven
+unsolvable, and 1 otherwise.
+"""
+import argparse
+import gc
+import json
+import os
+import signal
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows, memory limits are skipped
+    resource = None
+
+from engine import DomainCache, GraphPlanVis
+from problem_cache import ProblemCache, content_key
+import snapshot
+
+# seconds the hard time limit allows past the cooperative one in solve
+HARD_LIMIT_GRACE = 1.0
+
+
+class ProblemTimeout(Exception):
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise ProblemTimeout()
+
+
+def _address_space():
+    """Current virtual memory size of this process in bytes, None if unknown"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class Limits:
+    """
+    Time and memory limits for a single problem, used as a with block.
+    The time limit is enforced with SIGALRM as a backstop for the cooperative
+    timeout of GraphPlanVis.solve, which cannot interrupt a long expansion.
+    The memory limit caps the address space to what is in use on entry plus
+    memory bytes, so going over it raises MemoryError.
+    """
+
+    def __init__(self, timeout=None, memory=None):
+        self.timeout = timeout
+        self.memory = memory
+        self._handler = None
+        self._rlimit = None
+
+    def __enter__(self):
+        if self.timeout is not None and hasattr(signal, 'setitimer'):
+            self._handler = signal.signal(signal.SIGALRM, _raise_timeout)
+            signal.setitimer(signal.ITIMER_REAL, self.timeout + HARD_LIMIT_GRACE)
+        if self.memory is not None and resource is not None:
+            in_use = _address_space()
+            if in_use is not None:
+                self._rlimit = resource.getrlimit(resource.RLIMIT_AS)
+                soft, hard = self._rlimit
+                limit = in_use + self.memory
+                if hard != resource.RLIM_INFINITY:
+                    limit = min(limit, hard)
+                resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+        return self
+
+    def __exit__(self, *exc):
+        if self._handler is not None:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, self._handler)
+            self._handler = None
+        if self._rlimit is not None:
+            resource.setrlimit(resource.RLIMIT_AS, self._rlimit)
+            self._rlimit = None
+
+
+def _resume(gp, snapshot_path):
+    """
+    Loads the snapshot at snapshot_path into gp, if there is one. A snapshot
+    that can not be loaded is deleted, so the graph solved instead replaces it
+    :return: True if gp was loaded
+    """
+    if snapshot_path is None or not os.path.exists(snapshot_path):
+        return False
+    try:
+        gp.load_snapshot(snapshot_path)
+    except snapshot.SnapshotError:
+        try:
+            os.remove(snapshot_path)
+        except OSError:
+            pass
+        return False
+    return True
+
+
+def solve_problem(domain_file, problem_file, timeout=None, memory=None, max_nodes=None, domains=None,
+                  cache=None, snapshots=None, planner='graphplan'):
+    """
+    Parses and solves one problem within the given limits
+    :param timeout: seconds for parsing and solving, None for no limit
+    :param memory: bytes of memory the problem may allocate, None for no limit
+    :param max_nodes: search nodes allowed per extraction, None for no limit
+    :param domains: optional DomainCache shared between calls
+    :param cache: optional ProblemCache to load compiled problems from
+    :param snapshots: optional directory of graph snapshots. The graph is
+    resumed from the problem's snapshot there, if any, and saved back to it
+    unless solving ran out of memory
+    :param planner: 'graphplan', 'sat', 'greedy' or 'astar', see GraphPlanVis.solve
+    :return: dictionary with the status, the plan and the graph stats.
+    status is one of solved, unsolvable, timeout, memory or error
+    """
+    result = {'domain': domain_file, 'problem': problem_file}
+    gp = GraphPlanVis()
+    started = time.perf_counter()
+    try:
+        with Limits(timeout, memory):
+            snapshot_path = None
+            if snapshots is not None:
+                salt = snapshot.MAGIC + bytes([snapshot.FORMAT_VERSION])
+                snapshot_path = os.path.join(snapshots, content_key(domain_file, problem_file, salt) + '.gps')
+            if _resume(gp, snapshot_path):
+                result['resumed_levels'] = len(gp.graphplan.graph.levels) - 1
+            else:
+                gp.create_problem(domain_file, problem_file, domains, cache)
+            remaining = None if timeout is None else max(0, timeout - (time.perf_counter() - started))
+            solution = gp.solve(max_nodes=max_nodes, timeout=remaining, planner=planner)
+    except ProblemTimeout:
+        solution = None
+        snapshot_path = None  # interrupted anywhere, the graph may be inconsistent
+    except MemoryError:
+        gp = None
+        gc.collect()
+        result['status'] = 'memory'
+        result['time'] = time.perf_counter() - started
+        return result
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = '%s: %s' % (type(e).__name__, e)
+        result['time'] = time.perf_counter() - started
+        return result
+    result['time'] = time.perf_counter() - started
+    if snapshot_path is not None:
+        os.makedirs(snapshots, exist_ok=True)
+        gp.save_snapshot(snapshot_path)
+
+    if solution is None:
+        result['status'] = 'timeout'
+    elif solution:
+        result['status'] = 'solved'
+        result['plan'] = gp.plan_steps(solution)
+        result['plan_length'] = sum(len(step) for step in result['plan'])
+    else:
+        result['status'] = 'unsolvable'
+    if gp.graphplan is not None:
+        result.update(gp.stats())
+    return result
+
+
+def problem_files(paths):
+    """
+    Yields the problem files named on the command line. A path of - reads
+    more paths from stdin, one per line, so suites of any size can be piped in.
+    """
+    for path in paths:
+        if path == '-':
+            for line in sys.stdin:
+                line = line.strip()
+                if line:
+                    yield line
+        else:
+            yield path
+
+
+def solve_command(args):
+    timeout = args.timeout
+    memory = args.memory * 1024 * 1024 if args.memory is not None else None
+    if args.jobs is not None:
+        from batch import solve_batch
+        pairs = ((args.domain, problem_file) for problem_file in problem_files(args.problems))
+        results = solve_batch(pairs, args.jobs or None, timeout, memory, args.max_nodes, args.deadline,
+                              cache_dir=args.cache, snapshots=args.snapshots, planner=args.planner)
+    else:
+        cache = ProblemCache(args.cache) if args.cache is not None else None
+        results = _solve_sequentially(args.domain, problem_files(args.problems), timeout, memory, args.max_nodes,
+                                      cache, args.snapshots, args.planner)
+
+    stats = None
+    if args.summary:
+        from batch import BatchStats
+        stats = BatchStats()
+
+    all_done = True
+    for result in results:
+        if stats is not None:
+            stats.add(result)
+        if result['status'] not in ('solved', 'unsolvable'):
+            all_done = False
+        if not args.plans:
+            result.pop('plan', None)
+        sys.stdout.write(json.dumps(result) + '\n')
+        sys.stdout.flush()
+    if stats is not None:
+        sys.stderr.write(json.dumps(stats.summary()) + '\n')
+    return 0 if all_done else 1
+
+
+def _solve_sequentially(domain_file, problems, timeout, memory, max_nodes, cache, snapshots, planner):
+    domains = DomainCache()
+    for problem_file in problems:
+        yield solve_problem(domain_file, problem_file, timeout, memory, max_nodes, domains, cache, snapshots,
+                            planner)
+        # the graphs of the previous problem are garbage now, free them before the next
+        gc.collect()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='graphplan', fromfile_prefix_chars='@',
+                                     description='Solve PDDL problems with Graphplan, without the GUI')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    solve = commands.add_parser('solve', fromfile_prefix_chars='@',
+                                help='solve problems and print one JSON line per problem')
+    solve.add_argument('domain', help='domain pddl file')
+    solve.add_argument('problems', nargs='+',
+                       help='problem pddl files, @file to read paths from a file or - to read them from stdin')
+    solve.add_argument('--timeout', type=float, help='seconds per problem')
+    solve.add_argument('--memory', type=int, help='megabytes per problem')
+    solve.add_argument('--max-nodes', type=int,
+                       help='search nodes per extraction, SAT conflicts per horizon, or states to expand')
+    solve.add_argument('--planner', choices=('graphplan', 'sat', 'greedy', 'astar'), default='graphplan',
+                       help='extract plans from the planning graph, encode the graph into SAT, or search forward '
+                            'from the initial state with greedy best first search (h_add) or A* (h_max)')
+    solve.add_argument('-j', '--jobs', type=int, help='solve in this many processes, 0 for one per core')
+    solve.add_argument('--deadline', type=float, help='seconds for the whole run, only with --jobs')
+    solve.add_argument('--cache', metavar='DIR', help='load and store compiled problems in this directory')
+    solve.add_argument('--snapshots', metavar='DIR',
+                       help='resume graphs from snapshots in this directory and save them back')
+    solve.add_argument('--summary', action='store_true', help='print aggregated statistics to stderr at the end')
+    solve.add_argument('--no-plans', dest='plans', action='store_false', help='leave the plans out of the output')
+    solve.set_defaults(function=solve_command)
+
+    args = parser.parse_args(argv)
+    return args.function(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""
+Planning graph heuristics for heuristic search over a PDDL problem.
+
+The problem is grounded once into a GroundTask: states are frozensets of
+fluent ids and actions are indexes into its ground actions. On top of it a
+RelaxedPlanningGraph computes, for any state,
+
+* h_max: the level at which all the goals first show up when delete effects
+  are ignored (admissible),
+* h_add: the sum of the goals' level costs (not admissible, but much better
+  informed),
+* set_level: the first level of the real planning graph, mutexes included,
+  where the goals are all present and pairwise non mutex (admissible).
+
+The relaxed graph builds no mutexes and is not kept as levels: the level
+costs come from a single Dijkstra-like pass per state, and results are
+cached per state. PlanningProblem adapts a GroundTask to aima3.search:
+
+    task = GroundTask(gp.pddl, gp.goals, gp.graphplan.graph.grounder)
+    problem = PlanningProblem(task, heuristic='add')
+    node = best_first_graph_search(problem, problem.h)
+    plan = problem.plan(node)
+"""
+import heapq
+from collections import OrderedDict
+
+from aima3.logic import IndexedFolKB
+from aima3.planning import PDDL, Graph, Grounder, Plan, SymbolTable
+from aima3.search import Problem
+
+INF = float('inf')
+
+
+class GroundTask:
+    """
+    A PDDL problem grounded to the actions reachable from its initial state
+    :param pddl: PDDL object of the problem
+    :param goals: goal clauses
+    :param grounder: optional Grounder of the same problem, needed if the
+    problem was pruned (see preprocess.py). The task grounds with a copy of
+    it, so the grounder of a graph being expanded can be given
+    """
+
+    def __init__(self, pddl, goals, grounder=None):
+        if grounder is None:
+            objects = set(arg for clause in pddl.kb.clauses for arg in clause.args)
+            grounder = Grounder(pddl.actions, SymbolTable(), objects)
+        else:
+            grounder = grounder.copy()
+        self.pddl = pddl
+        self.grounder = grounder
+        self.symbols = grounder.symbols
+        self.initial = frozenset(self.symbols.fluent(clause) for clause in pddl.kb.clauses)
+        self.goals = frozenset(self.symbols.fluent(goal) for goal in goals)
+        self.actions = sorted(grounder.reachable(self.initial), key=lambda action: action.id)
+        grounder.reset()
+
+        # Indexed by the position of the action in self.actions
+        self.pre = [frozenset(action.precond_pos) for action in self.actions]
+        self.neg = [frozenset(action.precond_neg) for action in self.actions]
+        self.add = [frozenset(action.effect_add) for action in self.actions]
+        self.rem = [frozenset(action.effect_rem) for action in self.actions]
+        # Actions by positive precondition
+        self.consumers = {}
+        for i, pre in enumerate(self.pre):
+            for fid in pre:
+                self.consumers.setdefault(fid, []).append(i)
+        self.pre_counts = [len(pre) for pre in self.pre]
+        self.unconditioned = [i for i, pre in enumerate(self.pre) if not pre]
+        # Every action is indexed under one of its preconditions, the one
+        # needed by the fewest actions, so a state only checks the actions
+        # triggered by its facts, each once
+        self.triggers = {}
+        for i, pre in enumerate(self.pre):
+            if pre:
+                trigger = min(pre, key=lambda fid: (len(self.consumers[fid]), fid))
+                self.triggers.setdefault(trigger, []).append(i)
+
+    def applicable(self, state, i):
+        return self.pre[i] <= state and self.neg[i].isdisjoint(state)
+
+    def applicable_actions(self, state):
+        """The indexes of the actions applicable in state, in increasing order"""
+        applicable = [i for i in self.unconditioned if self.neg[i].isdisjoint(state)]
+        pre, neg, triggers = self.pre, self.neg, self.triggers
+        for fid in state:
+            for i in triggers.get(fid, ()):
+                if pre[i] <= state and neg[i].isdisjoint(state):
+                    applicable.append(i)
+        applicable.sort()
+        return applicable
+
+    def result(self, state, i):
+        return (state - self.rem[i]) | self.add[i]
+
+    def expr(self, i):
+        return self.actions[i].expr
+
+
+class RelaxedPlanningGraph:
+    """
+    Heuristics from the planning graph of a GroundTask
+    :param cache_size: number of states whose values are kept, per heuristic
+    """
+
+    def __init__(self, task, cache_size=100000):
+        self.task = task
+        self.cache_size = cache_size
+        self.caches = {'max': OrderedDict(), 'add': OrderedDict(), 'set_level': OrderedDict()}
+        self.hits = 0
+        self.misses = 0
+
+    def fact_costs(self, state, additive=False, goals=None):
+        """
+        The level cost of every fact reachable from state, delete effects
+        ignored. An action costs one plus the max (or with additive, the sum)
+        of the costs of its preconditions. With goals, stops as soon as all
+        of them have their cost.
+        :return: dictionary from fluent id to cost
+        """
+        task = self.task
+        remaining = task.pre_counts[:]
+        reached = [0] * len(task.pre)
+        costs = {}
+        heap = [(0, fid) for fid in state]
+        for i in task.unconditioned:
+            heap.extend((1, fid) for fid in task.add[i])
+        heapq.heapify(heap)
+        left = len(goals) if goals is not None else -1
+
+        consumers, add = task.consumers, task.add
+        while heap:
+            cost, fid = heapq.heappop(heap)
+            if fid in costs:
+                continue
+            costs[fid] = cost
+            if goals is not None and fid in goals:
+                left -= 1
+                if not left:
+                    break
+            for i in consumers.get(fid, ()):
+                remaining[i] -= 1
+                if additive:
+                    reached[i] += cost
+                elif cost > reached[i]:
+                    reached[i] = cost
+                if not remaining[i]:
+                    action_cost = reached[i] + 1
+                    for effect in add[i]:
+                        if effect not in costs:
+                            heapq.heappush(heap, (action_cost, effect))
+        return costs
+
+    def h_max(self, state, goals=None):
+        return self._cached('max', state, goals, self._h_max)
+
+    def h_add(self, state, goals=None):
+        return self._cached('add', state, goals, self._h_add)
+
+    def set_level(self, state, goals=None):
+        return self._cached('set_level', state, goals, self._set_level)
+
+    def _h_max(self, state, goals):
+        costs = self.fact_costs(state, False, goals)
+        return max((costs.get(goal, INF) for goal in goals), default=0)
+
+    def _h_add(self, state, goals):
+        costs = self.fact_costs(state, True, goals)
+        return sum(costs.get(goal, INF) for goal in goals)
+
+    def _set_level(self, state, goals):
+        if self._h_max(state, goals) == INF:
+            return INF
+        task = self.task
+        fluents = task.symbols.fluents
+        pddl = PDDL([fluents[fid] for fid in state], task.pddl.actions, None)
+        # the graph grounds incrementally from its own level 0
+        graph = Graph(pddl, IndexedFolKB([]), grounder=task.grounder.copy())
+        goal_ids = list(goals)
+        while True:
+            facts = graph.levels[-1].current_state_pos
+            if goals.issubset(facts) and graph.non_mutex_goals(goal_ids, -1):
+                return len(graph.levels) - 1
+            if graph.leveloff is not None:
+                return INF
+            graph.expand_graph()
+
+    def _cached(self, kind, state, goals, compute):
+        goals = self.task.goals if goals is None else frozenset(goals)
+        key = (state, goals)
+        cache = self.caches[kind]
+        value = cache.get(key)
+        if value is not None:
+            self.hits += 1
+            cache.move_to_end(key)
+            return value
+        self.misses += 1
+        value = cache[key] = compute(state, goals)
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        return value
+
+
+class PlanningProblem(Problem):
+    """
+    aima3.search Problem over a GroundTask. States are frozensets of fluent
+    ids and actions are indexes into task.actions, costing 1 each.
+    :param heuristic: 'max', 'add' or 'set_level', used by h
+    """
+
+    def __init__(self, task, heuristic='add', rpg=None):
+        super().__init__(task.initial, task.goals)
+        self.task = task
+        self.rpg = rpg or RelaxedPlanningGraph(task)
+        self.heuristic = {'max': self.rpg.h_max, 'add': self.rpg.h_add,
+                          'set_level': self.rpg.set_level}[heuristic]
+
+    def actions(self, state):
+        return self.task.applicable_actions(state)
+
+    def result(self, state, action):
+        return self.task.result(state, action)
+
+    def goal_test(self, state):
+        return self.goal <= state
+
+    def h(self, node):
+        return self.heuristic(node.state)
+
+    def plan(self, node):
+        """The Plan, one action per step, reaching node, None if node is None"""
+        if node is None:
+            return None
+        return Plan([(step, [self.task.expr(i)]) for step, i in enumerate(node.solution())])
@@ -1,13 +1,14 @@
 import sys
+import time
 import matplotlib
 matplotlib.use('Qt5Agg')
 import engine
+from problem_cache import ProblemCache
 from PyQt5 import QtCore, QtGui, QtWidgets
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg, NavigationToolbar2QT as NavigationToolbar
 from matplotlib.figure import Figure
 import matplotlib.pyplot as plt
 DEBUG = False
-import networkx as nx
 
 
 class MplCanvas(FigureCanvasQTAgg):
@@ -20,11 +21,69 @@ class MplCanvas(FigureCanvasQTAgg):
 
 
 
+class SolveWorker(QtCore.QObject):
+    """
+    Expands or solves the graph of gp off the GUI thread. Solving runs in
+    slices of SLICE seconds, resumed until there is an answer or cancel was
+    called, and progress is emitted with the stats of gp after every slice.
+    progress is connected blocking, so the graph is not changed while the GUI
+    draws it.
+    :param job: 'expand', 'solve' or 'expand_and_solve'
+    """
+    SLICE = 0.25
+    progress = QtCore.pyqtSignal(dict)
+    # the solution, None if cancelled or expanding only
+    finished = QtCore.pyqtSignal(object)
+    failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, gp, job):
+        super(SolveWorker, self).__init__()
+        self.gp = gp
+        self.job = job
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        start = time.monotonic()
+        try:
+            solution = self._run(start)
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.finished.emit(solution)
+
+    def _run(self, start):
+        if self.job == 'expand':
+            self.gp.expand_level()
+            self._emit_progress(start)
+            return None
+
+        timeout = self.SLICE
+        while not self._cancelled:
+            solution = self.gp.solve(with_expanding=self.job == 'expand_and_solve', timeout=timeout)
+            self._emit_progress(start)
+            if solution is not None:
+                return solution
+            if self.gp.planner not in ('graphplan', 'sat'):
+                # the forward planners start over on every call, give them twice as long each time
+                timeout *= 2
+        return None
+
+    def _emit_progress(self, start):
+        stats = self.gp.stats()
+        stats['elapsed'] = time.monotonic() - start
+        self.progress.emit(stats)
+
+
 class MainWindow(QtWidgets.QMainWindow):
 
     def __init__(self, *args, **kwargs):
         super(MainWindow, self).__init__(*args, **kwargs)
         self.gp = engine.GraphPlanVis()
+        # reopening or resetting a problem loads it from here instead of parsing it again
+        self.problem_cache = ProblemCache()
 
         self.fig_width = 5
         self.fig_height = 4
@@ -41,6 +100,11 @@ class MainWindow(QtWidgets.QMainWindow):
             self.domain_file_path = None
             self.problem_file_path = None
 
+        self.thread = None
+        self.worker = None
+        self._job = None
+        self._on_finished = None
+        self._shown_levels = 0
         self._construct_top_menu()
         self._construct_main_menu()
         cid = self.mpl.figure.canvas.mpl_connect('button_press_event', self._onclick)
@@ -54,25 +118,23 @@ class MainWindow(QtWidgets.QMainWindow):
         self.mutex_mode = False
 
     def _onclick(self, event):
-        if not self.mutex_mode:
+        if not self.mutex_mode or self._is_busy():
             return
 
-        clicked = min(self.gp.pos.items(),
-                      key=lambda x: pow(x[1][0]-event.xdata, 2) + pow(x[1][1]-event.ydata, 2))
-        clicked = clicked[0]
+        if event.xdata is None:
+            return
+        clicked = self.gp.node_at(event.xdata, event.ydata)
+        if clicked is None:
+            return
 
         mutexes = self.gp.get_nx_node_mutexes(self.mpl.axes, clicked)
 
         self._after_mutex_press(clicked, mutexes)
 
     def _after_mutex_press(self, clicked, mutexes):
-        self._refresh_graph_view()
-
-        nx.draw_networkx_nodes(self.gp.nx_graph, self.gp.pos, [clicked],
-                               node_shape="s", node_color="yellow", ax=self.mpl.axes)
-
-        nx.draw_networkx_nodes(self.gp.nx_graph, self.gp.pos, mutexes,
-                               node_shape="s", node_color="orange", ax=self.mpl.axes)
+        self.gp.clear_highlights()
+        self.gp.highlight_nodes([clicked], color="yellow")
+        self.gp.highlight_nodes(mutexes, color="orange")
         self._refresh_figure()
 
     def _construct_main_menu(self, fig=None):
@@ -96,6 +158,8 @@ class MainWindow(QtWidgets.QMainWindow):
         self.file_menu = QtWidgets.QMenu('&File', self)
         self.file_menu.addAction('&Load Domain', lambda: self.file_load_pddl("domain"))
         self.file_menu.addAction('&Load problem', lambda: self.file_load_pddl("problem"))
+        self.file_menu.addAction('L&oad graph', self.file_load_snapshot)
+        self.file_menu.addAction('Sa&ve graph', self.file_save_snapshot)
 
         self.file_menu.addAction('&Quit', self.file_quit,
                                  QtCore.Qt.CTRL + QtCore.Qt.Key_Q)
@@ -113,6 +177,8 @@ class MainWindow(QtWidgets.QMainWindow):
         self.action_menu.addAction('&Reset', self.action_reset_graph,
                                    QtCore.Qt.CTRL + QtCore.Qt.Key_R)
         self.action_menu.addAction('&Change stopping condition', self.action_change_max_depth)
+        self.cancel_action = self.action_menu.addAction('C&ancel', self.action_cancel, QtCore.Qt.Key_Escape)
+        self.cancel_action.setDisabled(True)
 
         self.action_menu.setDisabled(True)
 
@@ -136,6 +202,12 @@ class MainWindow(QtWidgets.QMainWindow):
         self.help_menu.addAction('&About', self.about)
 
     def closeEvent(self, ce):
+        if self._is_busy():
+            self.worker.cancel()
+            thread = self.thread
+            # the worker may be waiting on _on_progress, so events are processed while waiting
+            while not thread.wait(50):
+                QtWidgets.QApplication.processEvents()
         self.file_quit()
 
     def file_quit(self):
@@ -150,6 +222,39 @@ class MainWindow(QtWidgets.QMainWindow):
         if self.problem_file_path and self.domain_file_path:
             self._try_start_graph_plan()
 
+    def file_save_snapshot(self):
+        if not self.gp.is_ready:
+            return
+        options = QtWidgets.QFileDialog.Options()
+        options |= QtWidgets.QFileDialog.DontUseNativeDialog
+        file_path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Save graph", "", "graph snapshots (*.gps)",
+                                                             options=options)
+        if not file_path:
+            return
+        try:
+            self.gp.save_snapshot(file_path)
+        except Exception as e:
+            error_dialog = QtWidgets.QErrorMessage()
+            error_dialog.showMessage(str(e))
+
+    def file_load_snapshot(self):
+        options = QtWidgets.QFileDialog.Options()
+        options |= QtWidgets.QFileDialog.DontUseNativeDialog
+        file_path, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Load graph", "", "graph snapshots (*.gps)",
+                                                             options=options)
+        if not file_path:
+            return
+        try:
+            self.gp.load_snapshot(file_path)
+        except Exception as e:
+            self.gp = engine.GraphPlanVis()
+            error_dialog = QtWidgets.QErrorMessage()
+            error_dialog.showMessage(str(e))
+            return
+        self.action_menu.setDisabled(False)
+        self.view_menu.setDisabled(False)
+        self._refresh_graph_view()
+
     def about(self):
         # TODO this
         QtWidgets.QMessageBox.about(self, "About", "e")
@@ -157,13 +262,20 @@ class MainWindow(QtWidgets.QMainWindow):
     def action_expand_level(self):
         if not self.gp.is_ready:
             return
-        self.gp.expand_level()
-        self._refresh_graph_view()
+        self._start_worker('expand', self._after_expand)
+
+    def _after_expand(self, solution):
+        # the new level was drawn on progress already
+        pass
 
     def action_solve(self):
         if not self.gp.is_ready:
             return
-        solution = self.gp.solve(with_expanding=False)
+        self._start_worker('solve', self._after_solve)
+
+    def _after_solve(self, solution):
+        if solution is None:
+            return
         solution_string = self.gp.format_solution(solution)
         ms = QtWidgets.QMessageBox()
         ms.setText(solution_string)
@@ -172,19 +284,96 @@ class MainWindow(QtWidgets.QMainWindow):
     def action_expand_and_solve(self):
         if not self.gp.is_ready:
             return
-        solution = self.gp.solve()
-        self.gp._create_nx_graph()
-        self._set_empty_plot()
+        self._start_worker('expand_and_solve', self._after_expand_and_solve)
+
+    def _after_expand_and_solve(self, solution):
+        if solution is None:
+            return
+        if not solution:
+            self.statusBar().showMessage("No plan: the graph leveled off without one", 5000)
+            return
+        self.gp.visualize(self.mpl.axes)
         solution_nodes = self.gp.get_solution_nx_nodes(solution)
 
-        self.gp.draw_graph(self.mpl.axes, alpha=0.2)
-        self.gp.draw_graph(self.mpl.axes, draw_list=solution_nodes, keep_old_layout=True)
+        self.gp.highlight_nodes(solution_nodes, others_alpha=0.2)
         self._refresh_figure()
         # solution_string = self.gp.format_solution(solution)
         # ms = QtWidgets.QMessageBox()
         # ms.setText(solution_string)
         # ms.exec_()
 
+    def action_cancel(self):
+        if self._is_busy():
+            self.worker.cancel()
+            self.statusBar().showMessage("Cancelling...")
+
+    def _is_busy(self):
+        return self.thread is not None and self.thread.isRunning()
+
+    def _start_worker(self, job, on_finished):
+        """
+        Runs job on a SolveWorker in a new thread, with the menus that change
+        the graph disabled until on_finished was called with its solution
+        """
+        if self._is_busy():
+            return
+        self.thread = QtCore.QThread(self)
+        self.worker = SolveWorker(self.gp, job)
+        self.worker.moveToThread(self.thread)
+        self.thread.started.connect(self.worker.run)
+        self.worker.progress.connect(self._on_progress, QtCore.Qt.BlockingQueuedConnection)
+        self._on_finished = on_finished
+        self.worker.finished.connect(self._on_worker_done)
+        self.worker.failed.connect(self._on_worker_failed)
+        self.worker.finished.connect(self.thread.quit)
+        self.worker.failed.connect(self.thread.quit)
+        thread = self.thread
+        thread.finished.connect(lambda: self._on_thread_finished(thread))
+        thread.finished.connect(self.worker.deleteLater)
+        thread.finished.connect(thread.deleteLater)
+        self._job = job
+        self._shown_levels = len(self.gp.graphplan.graph.levels)
+        self._set_busy(True)
+        self.statusBar().showMessage("Working...")
+        self.thread.start()
+
+    def _set_busy(self, busy):
+        self.file_menu.setDisabled(busy)
+        self.view_menu.setDisabled(busy)
+        for action in self.action_menu.actions():
+            action.setDisabled(busy)
+        self.cancel_action.setDisabled(not busy)
+
+    def _on_progress(self, stats):
+        self.statusBar().showMessage(
+            "level {levels}, {nogoods} nogoods, {nodes} nodes expanded, {elapsed:.1f}s".format(
+                nodes=stats['search_nodes'] + stats['expanded_states'], **stats))
+        # draw the levels built since the last progress report
+        levels = len(self.gp.graphplan.graph.levels)
+        if levels != self._shown_levels:
+            self._shown_levels = levels
+            self._refresh_graph_view()
+
+    def _on_worker_done(self, solution):
+        self._set_busy(False)
+        if solution is None and self._job != 'expand':
+            self.statusBar().showMessage("Cancelled, solving again resumes the search", 5000)
+        else:
+            self.statusBar().clearMessage()
+        self._on_finished(solution)
+
+    def _on_thread_finished(self, thread):
+        # the thread and its worker are deleted once control returns to the event loop
+        if self.thread is thread:
+            self.thread = None
+            self.worker = None
+
+    def _on_worker_failed(self, message):
+        self._set_busy(False)
+        self.statusBar().clearMessage()
+        error_dialog = QtWidgets.QErrorMessage()
+        error_dialog.showMessage(message)
+
     def action_reset_graph(self):
 
         self.gp = engine.GraphPlanVis()
@@ -205,11 +394,12 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def show_no_ops(self):
         self.gp.draw_no_op = not self.gp.draw_no_op
-        self._refresh_graph_view()
+        self.gp.update_no_op_visibility()
+        self._refresh_figure()
 
     def _try_start_graph_plan(self):
         try:
-            self.gp.create_problem(self.domain_file_path, self.problem_file_path)
+            self.gp.create_problem(self.domain_file_path, self.problem_file_path, cache=self.problem_cache)
             self.action_menu.setDisabled(False)
             self.view_menu.setDisabled(False)
 
@@ -238,7 +428,6 @@ class MainWindow(QtWidgets.QMainWindow):
         self.mpl.figure.canvas.flush_events()
 
     def _refresh_graph_view(self):
-        self.mpl.axes.cla()
         self.gp.visualize(self.mpl.axes, alpha=1)
         self._refresh_figure()
 
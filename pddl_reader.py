@@ -0,0 +1,269 @@
+"""
+A small PDDL reader for the STRIPS subset the planner supports: typing,
+negative preconditions and constants.
+
+The file is tokenized in a single pass and read into nested lists with an
+explicit stack, so the time is linear in the size of the file. PDDL is case
+insensitive and every name is lower cased. Atoms are tuples of names, such as
+('on', '?x', '?y'), and the classes mirror the parts of pddlpy's interface the
+engine uses, so either can be given to engine.to_pddl_aima_obj.
+"""
+import re
+
+_TOKENS = re.compile(r';[^\n]*|[()]|[^\s();]+')
+
+SUPPORTED_REQUIREMENTS = {':strips', ':typing', ':negative-preconditions'}
+
+
+class PDDLError(ValueError):
+    pass
+
+
+class UnsupportedPDDL(PDDLError):
+    """The file is valid PDDL but uses features outside the supported subset"""
+    pass
+
+
+class UnsupportedGoal(UnsupportedPDDL):
+    """
+    The goal has negative atoms. The planner does not solve for them and
+    pddlpy reads them as positive atoms, so there is no falling back on it
+    """
+    pass
+
+
+class Operator:
+    def __init__(self, operator_name):
+        self.operator_name = operator_name
+        self.variable_list = {}
+        self.precondition_pos = []
+        self.precondition_neg = []
+        self.effect_pos = []
+        self.effect_neg = []
+
+
+class Domain:
+    def __init__(self):
+        self.name = None
+        self.requirements = []
+        self.types = {}
+        self.objects = {}  # constants, name -> type
+        self.predicates = []
+        self.operators = {}
+
+
+class Problem:
+    def __init__(self):
+        self.name = None
+        self.domain = None
+        self.objects = {}
+        self.initialstate = []
+        self.goals = []
+
+
+class DomainProblem:
+    """
+    A parsed domain and problem
+    :param domain: path of the domain file, or an already parsed Domain
+    """
+
+    def __init__(self, domain, problemfile):
+        self.domain = domain if isinstance(domain, Domain) else parse_domain(domain)
+        self.problem = parse_problem(problemfile)
+
+    def operators(self):
+        return self.domain.operators.keys()
+
+    def initialstate(self):
+        return self.problem.initialstate
+
+    def goals(self):
+        return self.problem.goals
+
+    def worldobjects(self):
+        return dict(self.domain.objects, **self.problem.objects)
+
+
+def tokenize(text):
+    """Yields (token, offset) for every parenthesis and name, skipping comments"""
+    for match in _TOKENS.finditer(text):
+        token = match.group()
+        if token[0] != ';':
+            yield token.lower(), match.start()
+
+
+def read(text, source='<string>'):
+    """
+    Reads the s-expression in text into nested lists of names
+    :return: the outermost list
+    """
+    stack = [[]]
+    offsets = []
+    for token, offset in tokenize(text):
+        if token == '(':
+            stack.append([])
+            offsets.append(offset)
+        elif token == ')':
+            if len(stack) == 1:
+                raise _error('unexpected )', text, offset, source)
+            closed = stack.pop()
+            offsets.pop()
+            stack[-1].append(closed)
+        else:
+            stack[-1].append(token)
+    if len(stack) > 1:
+        raise _error('unclosed (', text, offsets[-1], source)
+    if len(stack[0]) != 1 or not isinstance(stack[0][0], list):
+        raise PDDLError('%s: expected a single (define ...)' % source)
+    return stack[0][0]
+
+
+def _error(message, text, offset, source):
+    return PDDLError('%s:%d: %s' % (source, text.count('\n', 0, offset) + 1, message))
+
+
+def _read_file(path):
+    with open(path) as f:
+        return read(f.read(), path)
+
+
+def parse_domain(path):
+    return domain_from_list(_read_file(path))
+
+
+def parse_problem(path):
+    return problem_from_list(_read_file(path))
+
+
+def domain_from_list(definition):
+    _expect_define(definition, 'domain')
+    domain = Domain()
+    domain.name = definition[1][1]
+    for section in definition[2:]:
+        keyword = _keyword(section)
+        if keyword == ':requirements':
+            domain.requirements = _requirements(section[1:])
+        elif keyword == ':types':
+            domain.types = typed_list(section[1:])
+        elif keyword == ':constants':
+            domain.objects = typed_list(section[1:])
+        elif keyword == ':predicates':
+            domain.predicates = [tuple(predicate) for predicate in section[1:]]
+        elif keyword == ':action':
+            operator = _operator(section)
+            domain.operators[operator.operator_name] = operator
+        else:
+            raise UnsupportedPDDL('domain section %s is not supported' % keyword)
+    return domain
+
+
+def problem_from_list(definition):
+    _expect_define(definition, 'problem')
+    problem = Problem()
+    problem.name = definition[1][1]
+    for section in definition[2:]:
+        keyword = _keyword(section)
+        if keyword == ':domain':
+            problem.domain = section[1]
+        elif keyword == ':requirements':
+            _requirements(section[1:])
+        elif keyword == ':objects':
+            problem.objects = typed_list(section[1:])
+        elif keyword == ':init':
+            problem.initialstate = _unique(_atom(atom) for atom in section[1:])
+        elif keyword == ':goal':
+            goals_pos, goals_neg = [], []
+            _condition(section[1], goals_pos, goals_neg)
+            if goals_neg:
+                raise UnsupportedGoal('negative goals are not supported')
+            problem.goals = _unique(goals_pos)
+        else:
+            raise UnsupportedPDDL('problem section %s is not supported' % keyword)
+    return problem
+
+
+def typed_list(items):
+    """
+    Reads a typed list such as ?x ?y - block ?r into {'?x': 'block', '?y': 'block', '?r': None}
+    """
+    result = {}
+    pending = []
+    items = iter(items)
+    for item in items:
+        if item == '-':
+            item_type = next(items, None)
+            if not isinstance(item_type, str):
+                raise UnsupportedPDDL('only simple types are supported, found %r' % (item_type,))
+            for name in pending:
+                result[name] = item_type
+            pending = []
+        else:
+            pending.append(item)
+    for name in pending:
+        result[name] = None
+    return result
+
+
+def _operator(section):
+    operator = Operator(section[1])
+    fields = iter(section[2:])
+    for field in fields:
+        value = next(fields, None)
+        if field == ':parameters':
+            operator.variable_list = typed_list(value)
+        elif field == ':precondition':
+            _condition(value, operator.precondition_pos, operator.precondition_neg)
+        elif field == ':effect':
+            _condition(value, operator.effect_pos, operator.effect_neg)
+        else:
+            raise UnsupportedPDDL('action field %s is not supported' % field)
+    for atoms in (operator.precondition_pos, operator.precondition_neg, operator.effect_pos, operator.effect_neg):
+        atoms[:] = _unique(atoms)
+    return operator
+
+
+def _condition(formula, positive, negative):
+    """Splits a conjunction of literals into the positive and negative atoms"""
+    if not formula:
+        return
+    head = formula[0]
+    if head == 'and':
+        for sub_formula in formula[1:]:
+            _condition(sub_formula, positive, negative)
+    elif head == 'not':
+        negative.append(_atom(formula[1]))
+    elif head in ('or', 'imply', 'exists', 'forall', 'when', '='):
+        raise UnsupportedPDDL('%s is not supported' % head)
+    else:
+        positive.append(_atom(formula))
+
+
+def _atom(formula):
+    if not isinstance(formula, list) or not formula or not all(isinstance(name, str) for name in formula):
+        raise PDDLError('expected an atom, found %r' % (formula,))
+    if formula[0] in ('=', 'not', 'and'):
+        raise UnsupportedPDDL('%s is not supported here' % formula[0])
+    return tuple(formula)
+
+
+def _requirements(requirements):
+    unsupported = set(requirements) - SUPPORTED_REQUIREMENTS
+    if unsupported:
+        raise UnsupportedPDDL('requirements %s are not supported' % ', '.join(sorted(unsupported)))
+    return list(requirements)
+
+
+def _expect_define(definition, kind):
+    if (len(definition) < 2 or definition[0] != 'define' or not isinstance(definition[1], list)
+            or len(definition[1]) != 2 or definition[1][0] != kind):
+        raise PDDLError('expected (define (%s name) ...)' % kind)
+
+
+def _keyword(section):
+    if not isinstance(section, list) or not section or not isinstance(section[0], str):
+        raise PDDLError('expected a section, found %r' % (section,))
+    return section[0]
+
+
+def _unique(atoms):
+    return list(dict.fromkeys(atoms))
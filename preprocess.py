@@ -0,0 +1,116 @@
+"""
+Reachability and relevance pruning of a problem before its planning graph
+is built.
+
+* Reachability: the actions reachable from the initial state, ignoring
+  delete effects and negative preconditions, are grounded once. No other
+  action can ever be applied.
+* Static facts: facts no reachable action adds or deletes keep their initial
+  value forever, such as the type facts ball(b1). They are dropped from the
+  initial state, the preconditions and the goals. An action with a negative
+  precondition on a static true fact is dropped too.
+* Relevance: going backwards from the goals, an action is relevant if it adds
+  a fact some goal or relevant action needs true, or deletes one some relevant
+  action needs false. Only relevant actions are kept, and only the facts
+  relevant in either way are kept in the initial state and in effects,
+  along with the facts one relevant action adds and another deletes: those
+  make the two actions mutex, so they are not taken in the same step.
+
+Every plan of the pruned problem is a plan of the original one, its steps
+included, and the pruned problem has a plan whenever the original one does.
+
+    pruned = prune(pddl, goals)
+    graph = Graph(PDDL(pruned.init, pddl.actions, goal_test), negkb, grounder=pruned.grounder)
+"""
+from aima3.planning import FixedGrounder, GroundAction, Grounder, SymbolTable
+
+
+class PrunedProblem:
+    """
+    :param init: clauses of the pruned initial state
+    :param goals: goal clauses left after dropping the static true ones
+    :param grounder: FixedGrounder of the pruned ground actions
+    :param removed: dictionary counting what was pruned
+    """
+
+    def __init__(self, init, goals, grounder, removed):
+        self.init = init
+        self.goals = goals
+        self.grounder = grounder
+        self.removed = removed
+
+
+def prune(pddl, goals, grounder=None):
+    """
+    :param pddl: PDDL object of the problem
+    :param goals: goal clauses
+    :param grounder: optional Grounder of the problem, to reuse its ground actions
+    :return: PrunedProblem, whose fluent and action ids are those of the grounder
+    """
+    if grounder is None:
+        objects = set(arg for clause in pddl.kb.clauses for arg in clause.args)
+        grounder = Grounder(pddl.actions, SymbolTable(), objects)
+    symbols = grounder.symbols
+    initial = set(symbols.fluent(clause) for clause in pddl.kb.clauses)
+    goal_ids = [symbols.fluent(goal) for goal in goals]
+    reachable = grounder.reachable(initial)
+    grounder.reset()
+
+    changing = set()
+    for action in reachable:
+        changing.update(action.effect_add)
+        changing.update(action.effect_rem)
+    static_true = initial - changing
+    applicable = [action for action in reachable if static_true.isdisjoint(action.precond_neg)]
+
+    adders = {}
+    deleters = {}
+    for action in applicable:
+        for fid in action.effect_add:
+            adders.setdefault(fid, []).append(action)
+        for fid in action.effect_rem:
+            deleters.setdefault(fid, []).append(action)
+
+    need_true = set(fid for fid in goal_ids if fid not in static_true)
+    need_false = set()
+    relevant = set()
+    pending = [(fid, True) for fid in need_true]
+    while pending:
+        fid, positive = pending.pop()
+        for action in (adders if positive else deleters).get(fid, ()):
+            if action.id in relevant:
+                continue
+            relevant.add(action.id)
+            for pre in action.precond_pos:
+                if pre not in static_true and pre not in need_true:
+                    need_true.add(pre)
+                    pending.append((pre, True))
+            for pre in action.precond_neg:
+                if pre in changing and pre not in need_false:
+                    need_false.add(pre)
+                    pending.append((pre, False))
+
+    # Inconsistent effects on an irrelevant fact still forbid a parallel step
+    added = set()
+    deleted = set()
+    for action in applicable:
+        if action.id in relevant:
+            added.update(action.effect_add)
+            deleted.update(fid for fid in action.effect_rem if fid not in action.effect_add)
+    kept = need_true | need_false | (added & deleted)
+    actions = [GroundAction(action.id, action.expr,
+                            tuple(fid for fid in action.precond_pos if fid not in static_true),
+                            tuple(fid for fid in action.precond_neg if fid in changing),
+                            tuple(fid for fid in action.effect_add if fid in kept),
+                            tuple(fid for fid in action.effect_rem if fid in kept))
+               for action in applicable if action.id in relevant]
+
+    fluents = symbols.fluents
+    init = [clause for clause in pddl.kb.clauses if symbols.fluent(clause) in kept]
+    removed = {
+        'static_facts': len(static_true),
+        'initial_facts': len(initial) - len(set(symbols.fluent(clause) for clause in init)),
+        'irrelevant_actions': len(reachable) - len(actions),
+    }
+    return PrunedProblem(init, [fluents[fid] for fid in goal_ids if fid not in static_true],
+                         FixedGrounder(actions, symbols), removed)
@@ -0,0 +1,123 @@
+"""
+On-disk cache of compiled problems.
+
+Entries are keyed by a SHA-256 of the contents of the domain and problem
+files, so an edited file is compiled again and a copied one is not. Each entry
+is a short header followed by a pickle, which is loaded with the classes of
+SAFE_GLOBALS only (see safe_pickle.py), so an entry planted in a shared cache
+directory can not run code.
+
+    cache = ProblemCache()
+    gp.create_problem(domain_file, problem_file, cache=cache)
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+
+import safe_pickle
+from engine import compile_problem
+
+MAGIC = b'GPVC'
+# bump when the compiled objects change in a way old entries cannot load into
+FORMAT_VERSION = 4
+HEADER = MAGIC + bytes([FORMAT_VERSION])
+# the only globals an entry may refer to, by module
+SAFE_GLOBALS = {
+    'aima3.planning': {'Action', 'FixedGrounder', 'GroundAction', 'Grounder', 'PDDL', 'SymbolTable'},
+    'aima3.logic': {'ClauseView', 'FolKB', 'IndexedFolKB'},
+    'aima3.utils': {'Expr'},
+    'engine': {'CompiledProblem', 'GoalTest'},
+    'builtins': {'dict', 'frozenset', 'list', 'set', 'tuple'},
+    'collections': {'OrderedDict', 'defaultdict'},
+}
+
+
+def content_key(domain_file_path, problem_file_path, salt=HEADER):
+    """Hex SHA-256 of the contents of both files, prefixed with salt"""
+    digest = hashlib.sha256(salt)
+    for path in (domain_file_path, problem_file_path):
+        with open(path, 'rb') as f:
+            content = f.read()
+        # the length keeps (ab, c) and (a, bc) apart
+        digest.update(len(content).to_bytes(8, 'little'))
+        digest.update(content)
+    return digest.hexdigest()
+
+
+def default_directory():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'graphplan-vis')
+
+
+class ProblemCache:
+    """
+    :param directory: where entries are stored, default_directory() if None
+    :param ground: without prune, also store the ground actions reachable
+    from the initial state. They make entries much bigger, which only pays
+    off when grounding is expensive compared to reading them back
+    :param prune: store problems pruned by preprocess.py, with their ground
+    actions. Entries compiled with different ground or prune are kept apart
+    """
+
+    def __init__(self, directory=None, ground=False, prune=True):
+        self.directory = directory or default_directory()
+        self.ground = ground
+        self.prune = prune
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, domain_file_path, problem_file_path):
+        return content_key(domain_file_path, problem_file_path, HEADER + bytes([self.prune, self.ground]))
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.gpc')
+
+    def get(self, domain_file_path, problem_file_path, domains=None):
+        """
+        Loads a compiled problem, compiling and storing it if it is not cached
+        :param domains: optional DomainCache used when compiling
+        :return: CompiledProblem
+        """
+        key = self.key(domain_file_path, problem_file_path)
+        compiled = self.load(key)
+        if compiled is not None:
+            self.hits += 1
+            return compiled
+        self.misses += 1
+        compiled = compile_problem(domain_file_path, problem_file_path, domains, self.ground, self.prune)
+        self.store(key, compiled)
+        return compiled
+
+    def load(self, key):
+        """Returns the CompiledProblem stored under key, None if missing or unreadable"""
+        try:
+            with open(self.path(key), 'rb') as f:
+                if f.read(len(HEADER)) != HEADER:
+                    return None
+                return safe_pickle.load(f, SAFE_GLOBALS)
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            # missing, empty, truncated, written by incompatible code or
+            # referring to classes outside SAFE_GLOBALS
+            return None
+
+    def store(self, key, compiled):
+        """Writes an entry atomically, so concurrent readers never see half of it"""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                f.write(HEADER)
+                pickle.dump(compiled, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def clear(self):
+        """Removes every entry of the cache"""
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.gpc'):
+                    os.unlink(os.path.join(root, name))
@@ -0,0 +1,39 @@
+"""
+Unpickling restricted to known classes.
+
+pickle.load calls whatever the data names, so loading a planted file runs
+arbitrary code. RestrictedUnpickler only resolves the globals it is given,
+by module, and refuses the rest. Snapshots and cached problems, which may be
+read from shared directories, are loaded through it. The objects are still
+rebuilt from the file's contents, so this keeps a file from running code, not
+from holding inconsistent data.
+"""
+import io
+import pickle
+
+
+class ForbiddenGlobal(pickle.UnpicklingError):
+    pass
+
+
+class RestrictedUnpickler(pickle.Unpickler):
+    """
+    :param allowed: dict from module name to the names that may be loaded from it
+    """
+
+    def __init__(self, file, allowed):
+        super().__init__(file)
+        self.allowed = allowed
+
+    def find_class(self, module, name):
+        if name not in self.allowed.get(module, ()):
+            raise ForbiddenGlobal('%s.%s may not be loaded' % (module, name))
+        return super().find_class(module, name)
+
+
+def load(file, allowed):
+    return RestrictedUnpickler(file, allowed).load()
+
+
+def loads(data, allowed):
+    return load(io.BytesIO(data), allowed)
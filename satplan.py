@@ -0,0 +1,185 @@
+"""
+Planning as satisfiability over the planning graph.
+
+GraphEncoder turns the levels of a Graph into CNF, one level at a time:
+a variable per fact of every level and per ground action of every action
+level, with clauses for
+
+* the initial state, whose facts are all true,
+* preconditions: an action implies its preconditions at its level,
+* effects: an action implies its effects at the next level,
+* frame axioms: a fact that becomes true was added by an action of the level
+  before, and one that becomes false was deleted by one,
+* mutexes: two actions the graph marks mutex are not taken together.
+
+The goals are not clauses but assumptions of the solver call, so when a
+horizon turns out too short the next level is simply appended and the clauses
+learned so far are kept. SATPlanner drives the horizon from the first level
+where all the goals show up, expanding the graph as it goes. Unlike backward
+search from the goals, which may explode on problems with many parallel
+actions, its cost grows with the size of the graph.
+
+A refuted horizon does not rule out longer ones, so once the graph has
+leveled off SATPlanner also runs the backward search of Graphplan on the
+same graph: the nogoods it finds tell, as in Graphplan, when no horizon
+can have a plan.
+
+    planner = SATPlanner(graphplan, graphplan.graph.goal_ids(goals))
+    plan = planner.solve(timeout=60)
+"""
+import time
+from collections import defaultdict
+
+from aima3.planning import Plan
+from cdcl import Solver
+
+
+class GraphEncoder:
+    """
+    CNF encoding of the first levels of graph into solver
+    :param solver: a cdcl.Solver, or anything with new_var and add_clause
+    """
+
+    def __init__(self, graph, solver):
+        self.graph = graph
+        self.solver = solver
+        # per level, fluent id -> variable
+        self.fact_vars = []
+        # per action level, ground action id -> variable
+        self.action_vars = []
+
+    @property
+    def horizon(self):
+        return len(self.fact_vars) - 1
+
+    def encode(self, horizon):
+        """Encodes the levels up to horizon, which must be built but the last"""
+        while self.horizon < horizon:
+            self._encode_level(self.horizon + 1)
+
+    def _encode_level(self, t):
+        solver = self.solver
+        facts = {fid: solver.new_var() for fid in self.graph.levels[t].current_state_pos}
+        if t == 0:
+            for v in facts.values():
+                solver.add_clause([v])
+        else:
+            self._encode_transition(t - 1, facts)
+        self.fact_vars.append(facts)
+
+    def _encode_transition(self, t, after):
+        """Encodes the actions of level t, leading to the facts after"""
+        solver = self.solver
+        level = self.graph.levels[t]
+        ground = self.graph.grounder.ground
+        before = self.fact_vars[t]
+        actions = {aid: solver.new_var() for aid in level.ground_actions}
+        adders = defaultdict(list)
+        deleters = defaultdict(list)
+
+        for aid, a in actions.items():
+            action = ground[aid]
+            for fid in action.precond_pos:
+                solver.add_clause([-a, before[fid]])
+            for fid in action.precond_neg:
+                if fid in before:
+                    solver.add_clause([-a, -before[fid]])
+            for fid in action.effect_add:
+                solver.add_clause([-a, after[fid]])
+                adders[fid].append(a)
+            for fid in action.effect_rem:
+                # an action adding what it deletes leaves it true
+                if fid in after and fid not in action.effect_add:
+                    solver.add_clause([-a, -after[fid]])
+                    deleters[fid].append(a)
+
+        for fid, v in after.items():
+            old = before.get(fid)
+            if old is None:
+                solver.add_clause([-v] + adders[fid])
+            else:
+                solver.add_clause([-v, old] + adders[fid])
+                solver.add_clause([v, -old] + deleters[fid])
+
+        for aid, a in actions.items():
+            for other in level.mutex.mutex_with(aid):
+                if other > aid and other in actions:
+                    solver.add_clause([-a, -actions[other]])
+        self.action_vars.append(actions)
+
+    def plan(self, model, horizon):
+        """The Plan of the actions true in model, skipping steps with none"""
+        symbols = self.graph.symbols
+        steps = []
+        for t in range(horizon):
+            taken = [symbols.actions[aid] for aid, v in self.action_vars[t].items() if model[v]]
+            if taken:
+                steps.append((t, taken))
+        return Plan(steps)
+
+
+class SATPlanner:
+    """
+    :param graphplan: the GraphPlan of the problem, whose graph is expanded
+    as needed and whose nogoods decide that there is no plan
+    :param goals: fluent ids of the goals
+    """
+
+    def __init__(self, graphplan, goals):
+        self.graphplan = graphplan
+        self.graph = graph = graphplan.graph
+        self.goals = list(goals)
+        self.solver = Solver()
+        self.encoder = GraphEncoder(graph, self.solver)
+        # horizons up to this one are known to be too short
+        self.refuted = -1
+
+    def solve(self, with_expanding=True, max_conflicts=None, timeout=None, max_depth_checking=None):
+        """
+        Looks for a plan at the first horizon the goals show up at and then at
+        longer ones, expanding the graph if with_expanding.
+        :param max_conflicts: conflicts allowed per horizon, and action sets
+        tried by the backward search past the fixed point, None for no limit
+        :param timeout: seconds for the whole call, None for no limit
+        :param max_depth_checking: levels past the fixed point to try at most,
+        None to go on until there is a plan or Graphplan's termination test
+        shows there is none
+        :return: a Plan, [] if there is no solution, or None if the budget ran
+        out, in which case solving again resumes at the same horizon
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        graph = self.graph
+        while True:
+            horizon = len(graph.levels) - 1
+            present = set(graph.levels[horizon].current_state_pos).issuperset(self.goals)
+            if present and horizon > self.refuted:
+                self.encoder.encode(horizon)
+                facts = self.encoder.fact_vars[horizon]
+                satisfiable = self.solver.solve([facts[fid] for fid in self.goals], max_conflicts, deadline)
+                if satisfiable is None:
+                    return None
+                if satisfiable:
+                    return self.encoder.plan(self.solver.model, horizon)
+                self.refuted = horizon
+                if not self.solver.ok:
+                    # unsatisfiable without the goals, can not happen for a consistent graph
+                    return []
+                if graph.leveloff is not None:
+                    remaining = None if deadline is None else max(0, deadline - time.monotonic())
+                    solution = self.graphplan.extract_solution(self.goals, [], -1, max_conflicts, remaining)
+                    if solution:
+                        return solution
+                    if solution is False and self.graphplan.exhausted():
+                        return []
+                    # a search cut short by max_conflicts is not counted by exhausted
+            elif not present and graph.leveloff is not None:
+                return []
+
+            if not with_expanding:
+                return []
+            if (max_depth_checking is not None and graph.leveloff is not None and
+                    horizon - graph.leveloff >= max_depth_checking):
+                return []
+            graph.expand_graph()
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
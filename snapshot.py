@@ -0,0 +1,99 @@
+"""
+Snapshots of expanded planning graphs.
+
+A snapshot holds a whole GraphPlan: the levels with their links and mutexes,
+the symbol table, the grounder and the nogood table, together with the goals
+of the problem. Loading one gives a graph that can be expanded and solved
+further without rebuilding it from level 0, in the GUI or in batch runs.
+
+The file is a header (magic, format version, flags) followed by a pickle,
+compressed with zlib unless saved with compress=False. A paused extraction is
+not saved.
+
+Loading only builds the classes in SAFE_GLOBALS (see safe_pickle.py), so a
+snapshot can not make the unpickler call anything else. The objects are still
+rebuilt from the file's contents, so only load snapshots from sources you trust.
+"""
+import os
+import pickle
+import tempfile
+import zlib
+
+import safe_pickle
+
+MAGIC = b'GPVS'
+# bump when Graph, Level or GraphPlan change in a way old snapshots cannot load into
+FORMAT_VERSION = 4
+COMPRESSED = 1
+# the only globals a snapshot may refer to, by module
+SAFE_GLOBALS = {
+    'aima3.planning': {'Action', 'FixedGrounder', 'Graph', 'GraphPlan', 'GroundAction', 'Grounder', 'Level',
+                       'MutexRelation', 'NogoodTable', 'PDDL', 'SymbolTable'},
+    'aima3.logic': {'ClauseView', 'FolKB', 'IndexedFolKB'},
+    'aima3.utils': {'Expr'},
+    'engine': {'GoalTest'},
+    'snapshot': {'Snapshot'},
+    'builtins': {'dict', 'frozenset', 'list', 'set', 'tuple'},
+    'collections': {'OrderedDict', 'defaultdict'},
+}
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+class Snapshot:
+    def __init__(self, graphplan, goals, max_depth_checking=None):
+        self.graphplan = graphplan
+        self.goals = goals
+        self.max_depth_checking = max_depth_checking
+
+    @property
+    def levels(self):
+        return len(self.graphplan.graph.levels)
+
+
+def save_snapshot(snapshot, path, compress=True):
+    """Writes snapshot to path, atomically"""
+    data = pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+    flags = 0
+    if compress:
+        data = zlib.compress(data, 1)
+        flags |= COMPRESSED
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            f.write(MAGIC + bytes([FORMAT_VERSION, flags]))
+            f.write(data)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def load_snapshot(path):
+    """
+    :return: the Snapshot saved in path
+    :raises SnapshotError: if path is not a snapshot of this format version,
+    is corrupt or refers to classes outside SAFE_GLOBALS
+    """
+    with open(path, 'rb') as f:
+        header = f.read(len(MAGIC) + 2)
+        if len(header) < len(MAGIC) + 2 or header[:len(MAGIC)] != MAGIC:
+            raise SnapshotError('%s is not a graph snapshot' % path)
+        version, flags = header[len(MAGIC)], header[len(MAGIC) + 1]
+        if version != FORMAT_VERSION:
+            raise SnapshotError('%s has snapshot format %d, expected %d' % (path, version, FORMAT_VERSION))
+        data = f.read()
+    try:
+        if flags & COMPRESSED:
+            data = zlib.decompress(data)
+        saved = safe_pickle.loads(data, SAFE_GLOBALS)
+    except safe_pickle.ForbiddenGlobal as e:
+        raise SnapshotError('%s refers to a class snapshots may not hold: %s' % (path, e))
+    except Exception as e:
+        raise SnapshotError('%s is corrupt: %s' % (path, e))
+    if not isinstance(saved, Snapshot):
+        raise SnapshotError('%s does not hold a Snapshot' % path)
+    return saved
@@ -0,0 +1,66 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+EXAMPLES = os.path.join(ROOT, 'examples')
+
+
+def example(domain, problem):
+    """Paths of a bundled domain and problem, e.g. example('gripper', 'p01')"""
+    return (os.path.join(EXAMPLES, domain, 'domain.pddl'),
+            os.path.join(EXAMPLES, domain, problem + '.pddl'))
+
+
+def check_plan(domain_file_path, problem_file_path, plan):
+    """
+    Asserts that plan solves the problem, checked against the unpruned
+    problem: the actions of a step do not interfere, none deleting what
+    another adds or needs, and the step is applied in both orders
+    """
+    from engine import compile_problem
+    from heuristics import GroundTask
+
+    compiled = compile_problem(domain_file_path, problem_file_path, prune=False)
+    task = GroundTask(compiled.pddl, compiled.goals)
+    by_expr = {action.expr: i for i, action in enumerate(task.actions)}
+    state = task.initial
+    for _, actions in plan.steps:
+        step = [by_expr[action] for action in actions if action.op != 'Persistence']
+        for i in step:
+            for j in step:
+                if i != j:
+                    deleted = task.rem[i] - task.add[i]
+                    assert deleted.isdisjoint(task.add[j] | task.pre[j]), (task.actions[i].expr, actions)
+                    assert task.add[i].isdisjoint(task.neg[j]), (task.actions[i].expr, actions)
+        for order in (step, step[::-1]):
+            reached = state
+            for i in order:
+                assert task.applicable(reached, i), task.actions[i].expr
+                reached = task.result(reached, i)
+        state = reached
+    assert task.goals <= state
+
+
+# p is used up by either action, so q and r show up non mutex from level 2
+# on but never hold together
+UNSOLVABLE_DOMAIN = '''(define (domain consume)
+  (:requirements :strips)
+  (:predicates (p) (q) (r))
+  (:action make-q :parameters () :precondition (p) :effect (and (q) (not (p))))
+  (:action make-r :parameters () :precondition (p) :effect (and (r) (not (p)))))
+'''
+UNSOLVABLE_PROBLEM = '''(define (problem consume-1) (:domain consume)
+  (:init (p))
+  (:goal (and (q) (r))))
+'''
+
+
+def write_problem(directory, domain, problem):
+    """Writes the texts of a domain and problem to directory, returning their paths"""
+    paths = (os.path.join(str(directory), 'domain.pddl'), os.path.join(str(directory), 'problem.pddl'))
+    for path, text in zip(paths, (domain, problem)):
+        with open(path, 'w') as f:
+            f.write(text)
+    return paths
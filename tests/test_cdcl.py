@@ -0,0 +1,96 @@
+import itertools
+import random
+
+import pytest
+
+from cdcl import Solver
+from conftest import UNSOLVABLE_DOMAIN, UNSOLVABLE_PROBLEM, check_plan, example, write_problem
+from engine import GraphPlanVis
+
+
+def random_cnf(rng, num_vars):
+    clauses = []
+    for _ in range(rng.randint(1, 5 * num_vars)):
+        size = rng.choice([1, 2, 2, 3, 3, 3, 4])
+        variables = rng.sample(range(1, num_vars + 1), min(size, num_vars))
+        clauses.append([v if rng.random() < 0.5 else -v for v in variables])
+    return clauses
+
+
+def satisfies(values, clauses):
+    """values: bools indexed by variable"""
+    return all(any(values[abs(lit)] == (lit > 0) for lit in clause) for clause in clauses)
+
+
+def brute_force(num_vars, clauses):
+    return any(satisfies((None,) + values, clauses)
+               for values in itertools.product((False, True), repeat=num_vars))
+
+
+def new_solver(num_vars, clauses):
+    solver = Solver()
+    for _ in range(num_vars):
+        solver.new_var()
+    for clause in clauses:
+        solver.add_clause(clause)
+    return solver
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_random_cnf_matches_brute_force(seed):
+    rng = random.Random(seed)
+    num_vars = rng.randint(1, 10)
+    clauses = random_cnf(rng, num_vars)
+    solver = new_solver(num_vars, clauses)
+    result = solver.solve()
+    assert result == brute_force(num_vars, clauses)
+    if result:
+        assert satisfies(solver.model, clauses)
+
+
+@pytest.mark.parametrize('seed', range(100))
+def test_incremental_solves_with_assumptions(seed):
+    rng = random.Random(seed)
+    num_vars = rng.randint(2, 10)
+    clauses = random_cnf(rng, num_vars)[:2 * num_vars]
+    solver = new_solver(num_vars, clauses)
+    for _ in range(5):
+        assumed = rng.sample(range(1, num_vars + 1), rng.randint(0, min(3, num_vars)))
+        assumptions = [v if rng.random() < 0.5 else -v for v in assumed]
+        expected = brute_force(num_vars, clauses + [[lit] for lit in assumptions])
+        result = solver.solve(assumptions)
+        assert result == expected
+        if result:
+            assert satisfies(solver.model, clauses)
+            assert all(solver.value(abs(lit)) == (lit > 0) for lit in assumptions)
+        # clauses can be added between calls, and learned ones are kept
+        clause = random_cnf(rng, num_vars)[0]
+        clauses.append(clause)
+        solver.add_clause(clause)
+
+
+@pytest.mark.parametrize('problem', ['p01', 'p02', 'p03', 'p04'])
+def test_sat_plan_is_valid(problem):
+    path = example('blocksworld', problem)
+    gp = GraphPlanVis()
+    gp.create_problem(*path)
+    plan = gp.solve(planner='sat')
+    assert plan
+    check_plan(*path, plan)
+
+
+def test_sat_plan_is_as_short_as_graphplan():
+    path = example('gripper', 'p01')
+    gp = GraphPlanVis()
+    gp.create_problem(*path)
+    plan = gp.solve(planner='sat')
+    check_plan(*path, plan)
+    gp.create_problem(*path)
+    assert len(plan) == len(gp.solve())
+
+
+def test_sat_planner_stops_on_unsolvable_problems(tmp_path):
+    gp = GraphPlanVis()
+    gp.create_problem(*write_problem(tmp_path, UNSOLVABLE_DOMAIN, UNSOLVABLE_PROBLEM), prune=False)
+    assert gp.solve(planner='sat') == []
+    assert gp.graphplan.graph.leveloff is not None
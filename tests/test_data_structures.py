@@ -0,0 +1,129 @@
+import random
+
+import pytest
+
+from aima3.logic import ClauseView, FolKB, IndexedFolKB
+from aima3.utils import PriorityQueue, expr
+
+
+class Keyed:
+    """Equal to any Keyed of the same key, as search nodes are by state"""
+
+    def __init__(self, key, f):
+        self.key = key
+        self.f = f
+
+    def __eq__(self, other):
+        return isinstance(other, Keyed) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+
+def test_priority_queue_ties_come_out_first_in_first_out():
+    queue = PriorityQueue(min, lambda item: item[0])
+    for item in [(2, 'a'), (1, 'b'), (2, 'c'), (1, 'd'), (0, 'e'), (2, 'f')]:
+        queue.append(item)
+    assert [queue.pop()[1] for _ in range(len(queue))] == ['e', 'b', 'd', 'a', 'c', 'f']
+    with pytest.raises(IndexError):
+        queue.pop()
+
+
+def test_priority_queue_max_order():
+    queue = PriorityQueue(max, lambda item: item[0])
+    for item in [(1, 'a'), (3, 'b'), (3, 'c'), (2, 'd')]:
+        queue.append(item)
+    assert [queue.pop()[1] for _ in range(4)] == ['b', 'c', 'd', 'a']
+
+
+def test_priority_queue_lookup_and_deletion():
+    queue = PriorityQueue(min, lambda item: item.f)
+    first, second, third = Keyed('x', 5), Keyed('y', 3), Keyed('z', 4)
+    for item in (first, second, third):
+        queue.append(item)
+    assert Keyed('x', 0) in queue and Keyed('w', 0) not in queue
+    # lookup by an equal item returns the one queued
+    assert queue[Keyed('x', 0)] is first and queue[Keyed('w', 0)] is None
+
+    del queue[Keyed('y', 0)]
+    del queue[Keyed('w', 0)]
+    assert len(queue) == 2 and second not in queue
+
+    # appending an item equal to a queued one replaces it
+    better = Keyed('x', 1)
+    queue.append(better)
+    assert len(queue) == 2 and queue[first] is better
+    assert queue.pop() is better and queue.pop() is third
+    assert len(queue) == 0
+
+
+def test_priority_queue_matches_sorting():
+    rng = random.Random(0)
+    queue = PriorityQueue(min, lambda item: item[0])
+    items = [(rng.randint(0, 5), i) for i in range(200)]
+    removed = set(rng.sample(items, 50))
+    for item in items:
+        queue.append(item)
+    for item in removed:
+        del queue[item]
+    expected = sorted((item for item in items if item not in removed), key=lambda item: item[0])
+    assert [queue.pop() for _ in range(len(queue))] == expected
+
+
+ATOMS = [expr('On(%s, %s)' % pair) for pair in [('A', 'B'), ('B', 'C'), ('C', 'A'), ('A', 'Table')]] + \
+        [expr('Clear(%s)' % block) for block in 'ABC']
+
+
+def test_indexed_kb_matches_folkb():
+    rng = random.Random(1)
+    plain, indexed = FolKB(), IndexedFolKB()
+    for _ in range(300):
+        atom = rng.choice(ATOMS)
+        if atom in plain:
+            plain.retract(atom)
+            indexed.retract(atom)
+        else:
+            plain.tell(atom)
+            indexed.tell(atom)
+        assert [a in plain for a in ATOMS] == [a in indexed for a in ATOMS]
+        assert [a in plain.clauses for a in ATOMS] == [a in indexed.clauses for a in ATOMS]
+        assert sorted(map(repr, plain.clauses)) == sorted(map(repr, indexed.clauses))
+        query = expr('On(x, y)')
+        assert ({repr(answer) for answer in plain.ask_generator(query)} ==
+                {repr(answer) for answer in indexed.ask_generator(query)})
+
+
+def test_indexed_kb_rules():
+    clauses = [expr('Farmer(Mac)'), expr('Rabbit(Pete)'), expr('(Rabbit(r) & Farmer(f)) ==> Hates(f, r)')]
+    plain, indexed = FolKB(clauses), IndexedFolKB(clauses)
+    for kb in (plain, indexed):
+        kb.tell(expr('Rabbit(Flopsie)'))
+        kb.retract(expr('Rabbit(Pete)'))
+    query, x = expr('Hates(Mac, x)'), expr('x')
+    # the answers also bind the variables of the rule, renamed apart on every use
+    assert ({answer[x] for answer in plain.ask_generator(query)} ==
+            {answer[x] for answer in indexed.ask_generator(query)} == {expr('Flopsie')})
+    assert indexed.facts('Rabbit') == [expr('Rabbit(Flopsie)')]
+
+
+def test_indexed_kb_tells_once_and_retracts_missing_clauses():
+    kb = IndexedFolKB([ATOMS[0], ATOMS[0]])
+    assert len(kb) == 1
+    kb.retract(ATOMS[1])
+    kb.retract(ATOMS[0])
+    kb.retract(ATOMS[0])
+    assert len(kb) == 0 and ATOMS[0] not in kb
+
+
+def test_clause_view_is_live_and_read_only():
+    kb = IndexedFolKB(ATOMS[:2])
+    view = kb.clauses
+    assert isinstance(view, ClauseView)
+    assert not hasattr(view, 'append') and not hasattr(view, 'remove')
+    kb.tell(ATOMS[2])
+    assert len(view) == 3 and ATOMS[2] in view and view[-1] == ATOMS[2]
+    assert view + [ATOMS[3]] == ATOMS[:4] and [ATOMS[3]] + view == [ATOMS[3]] + ATOMS[:3]
+    # the KB can change while its clauses are iterated
+    for clause in view:
+        kb.retract(clause)
+    assert len(view) == 0 and list(view) == []
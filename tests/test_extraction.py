@@ -0,0 +1,71 @@
+import pytest
+
+from conftest import check_plan, example
+from engine import GraphPlanVis
+from aima3.planning import NogoodTable
+
+PROBLEMS = [('blocksworld', 'p01'), ('blocksworld', 'p02'), ('blocksworld', 'p03'), ('blocksworld', 'p04'),
+            ('gripper', 'p01'), ('gripper', 'p02')]
+
+# d deletes p, so p and f are both supported at level 1 by actions mutex
+# with d, but not by mutex pairs only: the goals are reachable at level 2
+SUPPORT_DOMAIN = '''(define (domain support)
+  (:requirements :strips)
+  (:predicates (p) (f) (g))
+  (:action a :parameters () :precondition (p) :effect (f))
+  (:action d :parameters () :precondition (p) :effect (not (p)))
+  (:action e :parameters () :precondition (and (p) (f)) :effect (g)))
+'''
+SUPPORT_PROBLEM = '''(define (problem support-1) (:domain support)
+  (:init (p))
+  (:goal (and (g) (p))))
+'''
+
+
+def test_nogood_table():
+    table = NogoodTable()
+    table.add(2, [4, 1])
+    table.add(2, {1, 4})
+    table.add(3, [1, 4, 9])
+    assert len(table) == 2 and table.count(2) == 1
+    assert table.is_nogood(2, [1, 4]) and (2, [4, 9, 1]) in table
+    assert not table.is_nogood(2, [1, 9]) and not table.is_nogood(1, [1, 4])
+    assert table.is_nogood(3, [9, 4, 1]) and not table.is_nogood(3, [1, 4])
+    assert table.hits == 3 and table.misses == 3
+
+
+def solve(domain, problem, **kwargs):
+    path = example(domain, problem)
+    gp = GraphPlanVis()
+    gp.create_problem(*path)
+    return path, gp, gp.solve(**kwargs)
+
+
+@pytest.mark.parametrize('domain, problem', PROBLEMS)
+def test_plan_is_valid(domain, problem):
+    path, _, plan = solve(domain, problem)
+    assert plan
+    check_plan(*path, plan)
+
+
+def test_fact_mutexes_need_every_supporter_pair_mutex(tmp_path):
+    domain, problem = tmp_path / 'domain.pddl', tmp_path / 'problem.pddl'
+    domain.write_text(SUPPORT_DOMAIN)
+    problem.write_text(SUPPORT_PROBLEM)
+    gp = GraphPlanVis()
+    gp.create_problem(str(domain), str(problem), prune=False)
+    plan = gp.solve()
+    assert len(plan) == 2
+    check_plan(str(domain), str(problem), plan)
+
+
+def test_paused_search_resumes_to_a_valid_plan():
+    path, gp, plan = solve('blocksworld', 'p02', max_nodes=1)
+    paused = 0
+    while plan is None:
+        paused += 1
+        plan = gp.solve(max_nodes=1)
+    assert paused
+    check_plan(*path, plan)
+    _, _, unbounded = solve('blocksworld', 'p02')
+    assert len(plan) == len(unbounded)
@@ -0,0 +1,51 @@
+import pytest
+
+from conftest import UNSOLVABLE_DOMAIN, UNSOLVABLE_PROBLEM, check_plan, example, write_problem
+from engine import GraphPlanVis
+from forward import ForwardPlanner
+from test_heuristics import goal_distances, ground
+
+PROBLEMS = [('blocksworld', 'p01'), ('blocksworld', 'p02'), ('blocksworld', 'p03'), ('blocksworld', 'p04'),
+            ('gripper', 'p01'), ('gripper', 'p02')]
+
+
+def solve(path, planner, **kwargs):
+    gp = GraphPlanVis()
+    gp.create_problem(*path, **kwargs)
+    return gp.solve(planner=planner)
+
+
+@pytest.mark.parametrize('planner', ['greedy', 'astar'])
+@pytest.mark.parametrize('domain, problem', PROBLEMS)
+def test_plan_is_valid(domain, problem, planner):
+    path = example(domain, problem)
+    plan = solve(path, planner)
+    assert plan
+    check_plan(*path, plan)
+
+
+@pytest.mark.parametrize('domain, problem', [('blocksworld', 'p03'), ('gripper', 'p01')])
+def test_astar_plans_are_the_shortest(domain, problem):
+    task = ground(domain, problem)
+    for heuristic in (None, 'max', 'set_level'):
+        plan = ForwardPlanner(task, 'astar', heuristic).solve()
+        assert len(plan) == goal_distances(task)[task.initial]
+
+
+@pytest.mark.parametrize('planner', ['greedy', 'astar'])
+def test_unsolvable_problem_has_no_plan(tmp_path, planner):
+    path = write_problem(tmp_path, UNSOLVABLE_DOMAIN, UNSOLVABLE_PROBLEM)
+    assert solve(path, planner, prune=False) == []
+
+
+def test_budget_pauses_the_search():
+    task = ground('gripper', 'p01')
+    planner = ForwardPlanner(task)
+    assert planner.solve(max_nodes=1) is None
+    assert planner.expanded > 1
+    assert planner.solve()
+
+
+def test_unknown_search_is_rejected():
+    with pytest.raises(ValueError):
+        ForwardPlanner(ground('gripper', 'p01'), 'bfs')
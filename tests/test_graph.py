@@ -0,0 +1,92 @@
+import pytest
+
+from conftest import example
+from engine import compile_problem
+from aima3.logic import IndexedFolKB
+from aima3.planning import Graph, MutexRelation
+
+PROBLEMS = [('blocksworld', 'p01'), ('blocksworld', 'p03'), ('gripper', 'p01')]
+
+
+def links(links, keys, values):
+    return {keys[key]: frozenset(values[value] for value in linked) for key, linked in links.items()}
+
+
+def pairs(relation, names):
+    return {frozenset((names[a], names[b])) for a, b in relation}
+
+
+def describe(graph, level):
+    """A level in terms of expressions, comparable across symbol tables"""
+    fluents, actions = graph.symbols.fluents, graph.symbols.actions
+    return {
+        'state_pos': {fluents[fid] for fid in level.current_state_pos},
+        'state_neg': {fluents[fid] for fid in level.current_state_neg},
+        'actions': {actions[aid] for aid in level.ground_actions},
+        'action_links_pos': links(level.current_action_links_pos, actions, fluents),
+        'action_links_neg': links(level.current_action_links_neg, actions, fluents),
+        'next_action_links': links(level.next_action_links, actions, fluents),
+        'state_links_pos': links(level.next_state_links_pos, fluents, actions),
+        'state_links_neg': links(level.next_state_links_neg, fluents, actions),
+        'mutex': pairs(level.mutex, actions),
+        'state_mutex': pairs(level.state_mutex, fluents),
+    }
+
+
+@pytest.mark.parametrize('domain, problem', PROBLEMS)
+def test_incremental_matches_full_rebuild(domain, problem):
+    path = example(domain, problem)
+    incremental = Graph(compile_problem(*path, prune=False).pddl, IndexedFolKB([]))
+    rebuilt = Graph(compile_problem(*path, prune=False).pddl, IndexedFolKB([]), incremental=False)
+    for _ in range(5):
+        incremental.expand_graph()
+        rebuilt.expand_graph()
+
+    assert len(incremental.levels) == len(rebuilt.levels)
+    assert incremental.leveloff == rebuilt.leveloff
+    for new, old in zip(incremental.levels, rebuilt.levels):
+        assert describe(incremental, new) == describe(rebuilt, old)
+
+
+@pytest.mark.parametrize('domain, problem', PROBLEMS)
+def test_leveloff_is_found_right_away(domain, problem):
+    graph = Graph(compile_problem(*example(domain, problem)).pddl, IndexedFolKB([]))
+    while graph.leveloff is None:
+        graph.expand_graph()
+        assert len(graph.levels) < 30
+    n = graph.leveloff
+    levels = graph.levels
+    assert len(levels) == n + 2
+    assert describe(graph, levels[n])['state_pos'] == describe(graph, levels[n + 1])['state_pos']
+    assert levels[n].fact_mutex.key == levels[n + 1].fact_mutex.key
+
+    def same(k):
+        return (k > 0 and levels[k].facts_key == levels[k + 1].facts_key and
+                levels[k - 1].actions_key == levels[k].actions_key)
+    # n is the first level the graph stays the same after
+    assert n == 0 or same(n)
+    assert not any(same(k) for k in range(n))
+
+
+def test_mutex_relation():
+    relation = MutexRelation()
+    relation.add(3, 70)
+    relation.add(70, 3)
+    relation.add(5, 5)
+    relation.add(1, 3)
+    assert len(relation) == 2
+    assert relation.is_mutex(70, 3) and (3, 1) in relation
+    assert not relation.is_mutex(5, 5) and not relation.is_mutex(1, 70)
+    assert sorted(relation) == [(1, 3), (3, 70)]
+    assert sorted(relation.mutex_with(3)) == [1, 70]
+    assert relation.non_mutex([1, 70, 5]) and not relation.non_mutex([1, 3])
+
+    copied = relation.copy()
+    assert copied.key == relation.key
+    copied.add(1, 70)
+    assert copied.key != relation.key and not relation.is_mutex(1, 70)
+
+    same = MutexRelation()
+    same.add(70, 3)
+    same.add(3, 1)
+    assert same.key == relation.key
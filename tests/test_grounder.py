@@ -0,0 +1,69 @@
+import itertools
+
+import pytest
+
+from conftest import example
+from engine import compile_problem
+from aima3.logic import IndexedFolKB
+from aima3.planning import Expr, Graph, Grounder
+
+PROBLEMS = [('blocksworld', 'p01'), ('blocksworld', 'p02'), ('gripper', 'p01')]
+
+
+def brute_force(graph, facts):
+    """Expressions of every action enabled by facts, trying all object permutations"""
+    symbols = graph.symbols
+    facts = {symbols.fluents[fid] for fid in facts}
+    found = set()
+    for schema in graph.pddl.actions:
+        assert all(arg.op.islower() for arg in schema.args)
+        for values in itertools.permutations(graph.objects, len(schema.args)):
+            if (all(schema.substitute(clause, values) in facts for clause in schema.precond_pos) and
+                    all(schema.substitute(clause, values) not in facts for clause in schema.precond_neg)):
+                found.add(schema.substitute(Expr(schema.name, *schema.args), values))
+    return found
+
+
+def exprs(actions):
+    return {action.expr for action in actions}
+
+
+@pytest.mark.parametrize('domain, problem', PROBLEMS)
+def test_levels_match_brute_force(domain, problem):
+    compiled = compile_problem(*example(domain, problem), prune=False)
+    graph = Graph(compiled.pddl, IndexedFolKB([]))
+    for _ in range(4):
+        graph.expand_graph()
+
+    ground = graph.grounder.ground
+    # the last level has not been expanded, so it has no actions yet
+    for level in graph.levels[:-1]:
+        facts = level.current_state_pos
+        expected = brute_force(graph, facts)
+        fresh = Grounder(graph.pddl.actions, graph.symbols, graph.objects)
+        assert exprs(fresh(facts)) == expected
+        assert {ground[aid].expr for aid in level.ground_actions} == expected
+
+
+@pytest.mark.parametrize('domain, problem', PROBLEMS)
+def test_growing_facts_match_fresh_grounder(domain, problem):
+    compiled = compile_problem(*example(domain, problem), prune=False)
+    graph = Graph(compiled.pddl, IndexedFolKB([]))
+    for _ in range(4):
+        graph.expand_graph()
+
+    grounder = Grounder(graph.pddl.actions, graph.symbols, graph.objects)
+    for level in graph.levels:
+        fresh = Grounder(graph.pddl.actions, graph.symbols, graph.objects)
+        facts = level.current_state_pos
+        assert exprs(grounder(facts)) == exprs(fresh(facts))
+
+
+def test_reachable_is_the_relaxed_fixed_point():
+    compiled = compile_problem(*example('gripper', 'p01'), prune=False)
+    graph = Graph(compiled.pddl, IndexedFolKB([]))
+    while graph.leveloff is None:
+        graph.expand_graph()
+    grounder = Grounder(graph.pddl.actions, graph.symbols, graph.objects)
+    reached = grounder.reachable(graph.levels[0].current_state_pos)
+    assert exprs(reached) == brute_force(graph, graph.levels[-1].current_state_pos)
@@ -0,0 +1,102 @@
+from collections import deque
+
+import pytest
+
+from conftest import example
+from engine import compile_problem
+from heuristics import INF, GroundTask, RelaxedPlanningGraph
+
+PROBLEMS = [('blocksworld', 'p01'), ('blocksworld', 'p02'), ('blocksworld', 'p03'), ('gripper', 'p01')]
+
+
+def ground(domain, problem):
+    compiled = compile_problem(*example(domain, problem), prune=False)
+    return GroundTask(compiled.pddl, compiled.goals)
+
+
+def relaxed_levels(task, state):
+    """Cost of each fact, the first relaxed level it shows up at, expanding level by level"""
+    costs = {fid: 0 for fid in state}
+    level = 0
+    while True:
+        level += 1
+        reached = set(costs)
+        new = {fid for i in range(len(task.actions)) if task.pre[i] <= reached
+               for fid in task.add[i] if fid not in costs}
+        if not new:
+            return costs
+        costs.update((fid, level) for fid in new)
+
+
+def additive_costs(task, state):
+    """Bellman-Ford on the additive cost of each fact"""
+    costs = {fid: 0 for fid in state}
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(task.actions)):
+            if task.pre[i] <= costs.keys():
+                cost = 1 + sum(costs[fid] for fid in task.pre[i])
+                for fid in task.add[i]:
+                    if cost < costs.get(fid, INF):
+                        costs[fid] = cost
+                        changed = True
+    return costs
+
+
+def goal_distances(task):
+    """Length of the shortest sequential plan from every reachable state"""
+    parents = {task.initial: []}
+    queue = deque([task.initial])
+    while queue:
+        state = queue.popleft()
+        for i in task.applicable_actions(state):
+            child = task.result(state, i)
+            if child not in parents:
+                parents[child] = []
+                queue.append(child)
+            parents[child].append(state)
+
+    distances = {state: 0 for state in parents if task.goals <= state}
+    queue = deque(distances)
+    while queue:
+        state = queue.popleft()
+        for parent in parents[state]:
+            if parent not in distances:
+                distances[parent] = distances[state] + 1
+                queue.append(parent)
+    return {state: distances.get(state, INF) for state in parents}
+
+
+@pytest.mark.parametrize('domain, problem', PROBLEMS)
+def test_values_match_brute_force(domain, problem):
+    task = ground(domain, problem)
+    rpg = RelaxedPlanningGraph(task)
+    for state in list(goal_distances(task))[:50]:
+        levels = relaxed_levels(task, state)
+        assert rpg.fact_costs(state) == levels
+        assert rpg.h_max(state) == max(levels.get(goal, INF) for goal in task.goals)
+        added = additive_costs(task, state)
+        assert rpg.fact_costs(state, additive=True) == added
+        assert rpg.h_add(state) == sum(added.get(goal, INF) for goal in task.goals)
+
+
+@pytest.mark.parametrize('domain, problem', PROBLEMS)
+def test_admissible_heuristics_bound_the_plan_length(domain, problem):
+    task = ground(domain, problem)
+    rpg = RelaxedPlanningGraph(task)
+    distances = goal_distances(task)
+    for state, distance in distances.items():
+        assert rpg.h_max(state) <= distance
+        assert rpg.h_max(state) <= rpg.h_add(state)
+        if distance == 0:
+            assert rpg.h_max(state) == rpg.h_add(state) == 0
+    for state in list(distances)[::max(1, len(distances) // 20)]:
+        assert rpg.h_max(state) <= rpg.set_level(state) <= distances[state]
+
+
+def test_unreachable_goals_cost_infinity():
+    task = ground('gripper', 'p01')
+    rpg = RelaxedPlanningGraph(task)
+    # nothing is reachable from the empty state
+    assert rpg.h_max(frozenset()) == rpg.h_add(frozenset()) == rpg.set_level(frozenset()) == INF
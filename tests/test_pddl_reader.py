@@ -0,0 +1,94 @@
+import glob
+import os
+
+import pytest
+
+import engine
+import pddl_reader
+from conftest import EXAMPLES, write_problem
+
+pddlpy = pytest.importorskip('pddlpy')
+
+PROBLEMS = sorted(glob.glob(os.path.join(EXAMPLES, '*', 'p*.pddl')))
+
+DOMAIN = '''(define (domain switch)
+  (:requirements {requirements})
+  (:predicates (on ?s) (off ?s))
+  (:action turn-on :parameters (?s) :precondition (off ?s) :effect (and (on ?s) (not (off ?s)))))
+'''
+PROBLEM = '''(define (problem switch-1) (:domain switch)
+  (:objects s1 s2)
+  (:init (off s1) (off s2))
+  (:goal {goal}))
+'''
+
+
+def atoms(atoms):
+    """The atoms as a set of tuples, also from pddlpy Atoms"""
+    return {tuple(getattr(atom, 'predicate', atom)) for atom in atoms}
+
+
+def read_text(path):
+    with open(path) as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('problem_file', PROBLEMS, ids=os.path.relpath)
+def test_reads_examples_as_pddlpy(problem_file, tmp_path):
+    domain_file = os.path.join(os.path.dirname(problem_file), 'domain.pddl')
+    ours = pddl_reader.DomainProblem(domain_file, problem_file)
+    # pddlpy keeps the case of names and fails on upper case keywords such as :INIT
+    theirs = pddlpy.DomainProblem(*write_problem(tmp_path, read_text(domain_file).lower(),
+                                                 read_text(problem_file).lower()))
+
+    assert ours.worldobjects() == theirs.worldobjects()
+    assert atoms(ours.initialstate()) == atoms(theirs.initialstate())
+    assert atoms(ours.goals()) == atoms(theirs.goals())
+    assert set(ours.operators()) == set(theirs.operators())
+    for name in ours.operators():
+        mine, other = ours.domain.operators[name], theirs.domain.operators[name]
+        assert mine.variable_list == other.variable_list
+        for field in ('precondition_pos', 'precondition_neg', 'effect_pos', 'effect_neg'):
+            assert atoms(getattr(mine, field)) == atoms(getattr(other, field)), (name, field)
+
+
+def test_unsupported_pddl_falls_back_on_pddlpy(tmp_path):
+    path = write_problem(tmp_path, DOMAIN.format(requirements=':adl'), PROBLEM.format(goal='(on s1)'))
+    with pytest.raises(pddl_reader.UnsupportedPDDL):
+        pddl_reader.DomainProblem(*path)
+    domprob = engine.load_domain_problem(*path)
+    assert isinstance(domprob, pddlpy.DomainProblem)
+    assert atoms(domprob.goals()) == {('on', 's1')}
+
+
+def test_supported_pddl_is_read_without_pddlpy(tmp_path):
+    path = write_problem(tmp_path, DOMAIN.format(requirements=':strips'), PROBLEM.format(goal='(on s1)'))
+    assert isinstance(engine.load_domain_problem(*path), pddl_reader.DomainProblem)
+
+
+def test_negative_goals_are_rejected(tmp_path):
+    path = write_problem(tmp_path, DOMAIN.format(requirements=':strips'),
+                         PROBLEM.format(goal='(and (on s1) (not (off s2)))'))
+    with pytest.raises(pddl_reader.UnsupportedGoal):
+        engine.load_domain_problem(*path)
+
+
+@pytest.mark.parametrize('text, message', [
+    ('(define (domain d) (:predicates (p))', 'unclosed'),
+    ('(define (domain d))\n)', ':2: unexpected )'),
+    ('(define (problem d))', 'expected (define (domain'),
+])
+def test_syntax_errors(text, message):
+    with pytest.raises(pddl_reader.PDDLError, match=message.replace('(', r'\(').replace(')', r'\)')):
+        pddl_reader.domain_from_list(pddl_reader.read(text))
+
+
+@pytest.mark.parametrize('section', [
+    '(:functions (cost))',
+    '(:action a :parameters (?x - (either t u)) :effect (p ?x))',
+    '(:action a :parameters () :precondition (or (p) (q)) :effect (p))',
+    '(:action a :parameters () :effect (when (p) (q)))',
+])
+def test_unsupported_constructs(section):
+    with pytest.raises(pddl_reader.UnsupportedPDDL):
+        pddl_reader.domain_from_list(pddl_reader.read('(define (domain d) %s)' % section))
@@ -0,0 +1,48 @@
+import pytest
+
+from conftest import check_plan, example, write_problem
+from engine import GraphPlanVis, compile_problem
+
+PROBLEMS = [('blocksworld', 'p01'), ('blocksworld', 'p02'), ('blocksworld', 'p03'), ('blocksworld', 'p04'),
+            ('gripper', 'p01'), ('gripper', 'p02')]
+
+# f is irrelevant to the goals, but a and b can not be taken together
+CONFLICT_DOMAIN = '''(define (domain conflict)
+  (:requirements :strips)
+  (:predicates (p) (f) (g1) (g2))
+  (:action a :parameters () :precondition (p) :effect (and (g1) (f)))
+  (:action b :parameters () :precondition (p) :effect (and (g2) (not (f)))))
+'''
+CONFLICT_PROBLEM = '''(define (problem conflict-1) (:domain conflict)
+  (:init (p))
+  (:goal (and (g1) (g2))))
+'''
+
+
+def solve(path, prune):
+    gp = GraphPlanVis()
+    gp.create_problem(*path, prune=prune)
+    return gp.solve()
+
+
+@pytest.mark.parametrize('domain, problem', PROBLEMS)
+def test_pruned_plans_are_plans_of_the_original(domain, problem):
+    path = example(domain, problem)
+    pruned = solve(path, True)
+    check_plan(*path, pruned)
+    # pruning keeps the shortest plans
+    assert len(pruned) == len(solve(path, False))
+
+
+@pytest.mark.parametrize('domain, problem', PROBLEMS)
+def test_pruning_removes_static_facts(domain, problem):
+    path = example(domain, problem)
+    pruned, unpruned = compile_problem(*path), compile_problem(*path, prune=False)
+    assert len(pruned.pddl.kb.clauses) < len(unpruned.pddl.kb.clauses)
+
+
+def test_effects_on_irrelevant_facts_keep_actions_apart(tmp_path):
+    path = write_problem(tmp_path, CONFLICT_DOMAIN, CONFLICT_PROBLEM)
+    plan = solve(path, True)
+    check_plan(*path, plan)
+    assert len(plan) == 2
@@ -0,0 +1,53 @@
+import os
+import pickle
+
+from conftest import check_plan, example
+from engine import GraphPlanVis
+from problem_cache import HEADER, ProblemCache
+
+
+class Planted:
+    """Unpickling calls os.system if the unpickler resolves it"""
+
+    def __init__(self, marker):
+        self.marker = marker
+
+    def __reduce__(self):
+        return os.system, ('touch %s' % self.marker,)
+
+
+def test_cached_problem_solves_the_same(tmp_path):
+    path = example('blocksworld', 'p02')
+    cache = ProblemCache(str(tmp_path))
+    plans = []
+    for _ in range(2):
+        gp = GraphPlanVis()
+        gp.create_problem(*path, cache=cache)
+        plans.append(gp.solve())
+    assert (cache.misses, cache.hits) == (1, 1)
+    assert [set(step) for step in plans[0]] == [set(step) for step in plans[1]]
+    check_plan(*path, plans[1])
+
+
+def test_entries_are_kept_apart_by_options(tmp_path):
+    path = example('gripper', 'p01')
+    keys = {ProblemCache(str(tmp_path), ground, prune).key(*path)
+            for ground in (False, True) for prune in (False, True)}
+    assert len(keys) == 4
+
+
+def test_planted_entry_is_not_run(tmp_path):
+    path = example('gripper', 'p01')
+    cache = ProblemCache(str(tmp_path / 'cache'))
+    key = cache.key(*path)
+    marker = tmp_path / 'ran'
+    os.makedirs(os.path.dirname(cache.path(key)))
+    with open(cache.path(key), 'wb') as f:
+        f.write(HEADER)
+        pickle.dump(Planted(str(marker)), f)
+
+    assert cache.load(key) is None
+    assert not marker.exists()
+    compiled = cache.get(*path)
+    assert cache.misses == 1 and compiled.goals
+    assert cache.load(key) is not None
@@ -0,0 +1,107 @@
+import os
+import pickle
+import shutil
+
+import pytest
+
+import graphplan
+import snapshot
+from conftest import check_plan, example
+from engine import GraphPlanVis
+from test_graph import describe
+from test_problem_cache import Planted
+
+
+@pytest.mark.parametrize('compress', [True, False])
+def test_resumed_graph_is_the_saved_one(tmp_path, compress):
+    path = example('blocksworld', 'p04')
+    gp = GraphPlanVis()
+    gp.create_problem(*path)
+    # a paused solve leaves levels and nogoods behind
+    assert gp.solve(max_nodes=20) is None
+    assert gp.graphplan.nogoods
+    saved = str(tmp_path / 'graph.gps')
+    gp.save_snapshot(saved, compress)
+
+    resumed = GraphPlanVis()
+    resumed.load_snapshot(saved)
+    graph, other = gp.graphplan.graph, resumed.graphplan.graph
+    assert len(graph.levels) == len(other.levels) and graph.leveloff == other.leveloff
+    for level, loaded in zip(graph.levels, other.levels):
+        assert describe(graph, level) == describe(other, loaded)
+    assert gp.graphplan.nogoods.exact == resumed.graphplan.nogoods.exact
+
+    fresh = GraphPlanVis()
+    fresh.create_problem(*path)
+    plan = resumed.solve()
+    check_plan(*path, plan)
+    # the paused extraction is not saved, so the plan may differ but not its length
+    assert len(plan) == len(fresh.solve())
+
+
+def test_other_format_version_is_rejected(tmp_path):
+    gp = GraphPlanVis()
+    gp.create_problem(*example('gripper', 'p01'))
+    saved = tmp_path / 'graph.gps'
+    gp.save_snapshot(str(saved))
+    data = bytearray(saved.read_bytes())
+    data[len(snapshot.MAGIC)] = snapshot.FORMAT_VERSION - 1
+    saved.write_bytes(bytes(data))
+    with pytest.raises(snapshot.SnapshotError, match='format'):
+        snapshot.load_snapshot(str(saved))
+
+
+def test_global_outside_safe_globals_is_refused(tmp_path):
+    marker = tmp_path / 'ran'
+    saved = tmp_path / 'graph.gps'
+    saved.write_bytes(snapshot.MAGIC + bytes([snapshot.FORMAT_VERSION, 0]) +
+                      pickle.dumps(Planted(str(marker))))
+    with pytest.raises(snapshot.SnapshotError, match='posix.system|nt.system'):
+        snapshot.load_snapshot(str(saved))
+    assert not marker.exists()
+
+
+def test_corrupt_snapshot_is_rejected(tmp_path):
+    saved = tmp_path / 'graph.gps'
+    saved.write_bytes(snapshot.MAGIC + bytes([snapshot.FORMAT_VERSION, snapshot.COMPRESSED]) + b'not zlib')
+    with pytest.raises(snapshot.SnapshotError, match='corrupt'):
+        snapshot.load_snapshot(str(saved))
+
+
+def copy_problem(directory):
+    domain, problem = example('gripper', 'p01')
+    os.makedirs(str(directory))
+    paths = (str(directory / 'domain.pddl'), str(directory / 'p01.pddl'))
+    shutil.copy(domain, paths[0])
+    shutil.copy(problem, paths[1])
+    return paths
+
+
+def test_snapshots_are_keyed_by_content_and_version(tmp_path, monkeypatch):
+    domain, problem = copy_problem(tmp_path / 'problem')
+    snapshots = str(tmp_path / 'snapshots')
+    first = graphplan.solve_problem(domain, problem, snapshots=snapshots)
+    assert first['status'] == 'solved' and 'resumed_levels' not in first
+    second = graphplan.solve_problem(domain, problem, snapshots=snapshots)
+    assert second['resumed_levels'] and second['plan'] == first['plan']
+
+    # an edited problem does not resume the graph of the old one
+    with open(problem, 'a') as f:
+        f.write('; edited\n')
+    assert 'resumed_levels' not in graphplan.solve_problem(domain, problem, snapshots=snapshots)
+
+    # nor does another format version, even with its snapshot under the same key
+    monkeypatch.setattr(snapshot, 'FORMAT_VERSION', snapshot.FORMAT_VERSION + 1)
+    assert 'resumed_levels' not in graphplan.solve_problem(domain, problem, snapshots=snapshots)
+    assert len(os.listdir(snapshots)) == 3
+
+
+def test_unreadable_snapshot_falls_back_on_solving(tmp_path):
+    domain, problem = copy_problem(tmp_path / 'problem')
+    snapshots = tmp_path / 'snapshots'
+    graphplan.solve_problem(domain, problem, snapshots=str(snapshots))
+    saved, = snapshots.iterdir()
+    saved.write_bytes(snapshot.MAGIC + bytes([snapshot.FORMAT_VERSION + 1, 0]))
+    result = graphplan.solve_problem(domain, problem, snapshots=str(snapshots))
+    assert result['status'] == 'solved' and 'resumed_levels' not in result
+    snapshot.load_snapshot(str(saved))